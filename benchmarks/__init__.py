@@ -0,0 +1 @@
+"""Offline load tests of the homework bot."""
@@ -0,0 +1,225 @@
+"""Local stand-ins of the Practicum API and the Telegram Bot API."""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STATUSES = ('reviewing', 'approved', 'rejected')
+
+
+class FakeServer(ThreadingHTTPServer):
+    """Threaded HTTP server with configurable latency and error rate."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, handler, latency=0.0, error_rate=0.0, seed=None):
+        """Bind to a free local port.
+
+        Args:
+            handler: request handler class.
+            latency: delay of every answer in seconds.
+            error_rate: share of answers replaced with an error.
+            seed: seed of the random generator.
+        """
+        super().__init__(('127.0.0.1', 0), handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def url(self):
+        """Return base url of the server."""
+        host, port = self.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve in a daemon thread.
+
+        Returns:
+            the server.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def should_fail(self):
+        """Count a request and decide whether it fails.
+
+        Returns:
+            True when the answer must be an error.
+        """
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            self.errors += failed
+        return failed
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    """Base handler answering with json over keep-alive connections."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def answer(self, status, data):
+        """Send a json answer after the configured latency.
+
+        Args:
+            status: HTTP status.
+            data: json-serializable answer.
+        """
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Do not log requests."""
+
+
+class PracticumHandler(JsonHandler):
+    """Answer homework_statuses requests."""
+
+    def do_GET(self):
+        """Return homeworks of the token from the Authorization header."""
+        server = self.server
+        if server.should_fail():
+            self.answer(500, {'detail': 'Internal Server Error'})
+            return
+        token = self.headers.get('Authorization', '').partition(' ')[2]
+        query = parse_qs(urlparse(self.path).query)
+        from_date = int(query.get('from_date', ['0'])[0])
+        self.answer(200, {
+            'homeworks': server.homeworks(token, from_date),
+            'current_date': int(time.time()),
+        })
+
+
+class FakePracticum(FakeServer):
+    """Practicum API with payload_size homeworks per student.
+
+    On every request a homework of the student changes its status
+    with probability change_rate. With full_history every answer holds
+    all homeworks of the student regardless of from_date.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, payload_size=1,
+                 change_rate=0.01, full_history=True, seed=None):
+        """Create server.
+
+        Args:
+            latency: delay of every answer in seconds.
+            error_rate: share of answers with status 500.
+            payload_size: number of homeworks of every student.
+            change_rate: probability of a status change per request.
+            full_history: ignore from_date and return every homework.
+            seed: seed of the random generator.
+        """
+        super().__init__(PracticumHandler, latency, error_rate, seed)
+        self.payload_size = payload_size
+        self.change_rate = change_rate
+        self.full_history = full_history
+        self.students = {}
+
+    def homeworks(self, token, from_date):
+        """Return homeworks of a student, changing one of them sometimes.
+
+        Args:
+            token: OAuth token of the student.
+            from_date: from_date of the request.
+
+        Returns:
+            list of homeworks.
+        """
+        with self.lock:
+            homeworks = self.students.get(token)
+            if homeworks is None:
+                homeworks = self.students[token] = [
+                    {
+                        'id': index,
+                        'status': 'approved',
+                        'homework_name': f'{token}__hw{index}.zip',
+                        'reviewer_comment': 'Всё отлично! ' * 10,
+                        'date_updated': 0,
+                        'lesson_name': f'Спринт {index}',
+                    }
+                    for index in range(self.payload_size)
+                ]
+            if homeworks and self.random.random() < self.change_rate:
+                homework = self.random.choice(homeworks)
+                homework['status'] = self.random.choice(
+                    [s for s in STATUSES if s != homework['status']],
+                )
+                homework['date_updated'] = int(time.time())
+            if self.full_history:
+                return [dict(homework) for homework in homeworks]
+            return [
+                dict(homework) for homework in homeworks
+                if homework['date_updated'] >= from_date
+            ]
+
+
+class TelegramHandler(JsonHandler):
+    """Answer sendMessage requests of the Bot API."""
+
+    def do_POST(self):
+        """Accept a message or answer with flood control."""
+        length = int(self.headers.get('Content-Length', 0))
+        data = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+        if server.should_fail():
+            self.answer(429, {
+                'ok': False,
+                'error_code': 429,
+                'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': server.retry_after},
+            })
+            return
+        with server.lock:
+            server.messages += 1
+            message_id = server.messages
+        self.answer(200, {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(data.get('chat_id', 0)), 'type': 'private'},
+            'text': data.get('text', ''),
+        }})
+
+
+class FakeTelegram(FakeServer):
+    """Telegram Bot API accepting sendMessage.
+
+    error_rate is the share of answers with 429 flood control.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, retry_after=1,
+                 seed=None):
+        """Create server.
+
+        Args:
+            latency: delay of every answer in seconds.
+            error_rate: share of answers with status 429.
+            retry_after: retry_after of 429 answers in seconds.
+            seed: seed of the random generator.
+        """
+        super().__init__(TelegramHandler, latency, error_rate, seed)
+        self.retry_after = retry_after
+        self.messages = 0
+
+    @property
+    def bot_url(self):
+        """Return base_url for telegram.Bot."""
+        return f'{self.url}/bot'
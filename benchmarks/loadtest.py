@@ -0,0 +1,561 @@
+"""Load test of the bot against local fake Practicum and Telegram servers.
+
+Every scenario polls a number of students for a few cycles, saves
+their states with the status messages and waits until the outbox is
+delivered, like the main loop does, and prints one json line with
+cycle time, polls per second, latency percentiles, CPU time and peak
+RSS of the bot process. Fake servers run in a separate process, so
+their work is not counted as the work of the bot. With --workers the
+students are sharded between worker processes like WORKERS does, so
+polls per second of different numbers of workers show how the bot
+scales with cores.
+
+    python -m benchmarks.loadtest --tenants 10 1000 10000 --output bench.jsonl
+    python -m benchmarks.loadtest --tenants 10000 --workers 4
+"""
+import argparse
+import functools
+import json
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+
+from benchmarks.fake_servers import FakePracticum, FakeTelegram
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_PATH = '/api/user_api/homework_statuses/'
+
+
+def percentile(values, share):
+    """Return the nearest-rank percentile.
+
+    Args:
+        values: observed values.
+        share: percentile as a number from 0 to 1.
+
+    Returns:
+        value or None when there are no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class DiscardQueue:
+    """Outbound queue dropping every message, used to warm up."""
+
+    def put(self, message, priority=0):
+        """Drop a message.
+
+        Args:
+            message: ChatMessage.
+            priority: ignored.
+        """
+
+
+class Timings:
+    """Thread-safe list of durations of calls to a function."""
+
+    def __init__(self):
+        """Create an empty list."""
+        self.values = []
+        self.lock = threading.Lock()
+
+    def wrap(self, func):
+        """Return func recording its duration on every call.
+
+        Args:
+            func: callable to measure.
+
+        Returns:
+            wrapped callable.
+        """
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                with self.lock:
+                    self.values.append(duration)
+        return timed
+
+    def clear(self):
+        """Forget recorded durations."""
+        with self.lock:
+            self.values.clear()
+
+    def summary(self, prefix):
+        """Return count and percentiles in seconds.
+
+        Args:
+            prefix: prefix of the keys.
+
+        Returns:
+            dict of statistics.
+        """
+        return {
+            f'{prefix}_count': len(self.values),
+            f'{prefix}_p50': percentile(self.values, 0.5),
+            f'{prefix}_p99': percentile(self.values, 0.99),
+            f'{prefix}_max': max(self.values, default=None),
+        }
+
+
+def wait_delivered(store, timeout):
+    """Wait until no message due now is left in the outbox.
+
+    Args:
+        store: StateStore of the outbox.
+        timeout: longest wait in seconds.
+
+    Returns:
+        True when the outbox was delivered.
+    """
+    deadline = time.monotonic() + timeout
+    while next(store.pending(time.time()), None) is not None:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def serve(config, addresses, stop, totals):
+    """Run fake servers until stop is set.
+
+    Args:
+        config: dict of scenario settings.
+        addresses: queue receiving (practicum url, telegram bot url).
+        stop: event stopping the servers.
+        totals: queue receiving request counters of the servers.
+    """
+    practicum = FakePracticum(
+        latency=config['api_latency'],
+        error_rate=config['api_error_rate'],
+        payload_size=config['payload_size'],
+        change_rate=config['change_rate'],
+        seed=config['seed'],
+    ).start()
+    telegram = FakeTelegram(
+        latency=config['telegram_latency'],
+        error_rate=config['telegram_error_rate'],
+        seed=config['seed'],
+    ).start()
+    addresses.put((practicum.url, telegram.bot_url))
+    stop.wait()
+    practicum.stop()
+    telegram.stop()
+    totals.put({
+        'api_requests': practicum.requests,
+        'api_errors': practicum.errors,
+        'telegram_requests': telegram.requests,
+        'telegram_errors': telegram.errors,
+        'messages_delivered': telegram.messages,
+    })
+
+
+def start_servers(config):
+    """Start fake servers in a child process.
+
+    Args:
+        config: dict of scenario settings.
+
+    Returns:
+        (process, stop event, totals queue, practicum url, bot url).
+    """
+    context = multiprocessing.get_context('spawn')
+    addresses = context.Queue()
+    totals = context.Queue()
+    stop = context.Event()
+    process = context.Process(
+        target=serve, args=(config, addresses, stop, totals), daemon=True,
+    )
+    process.start()
+    practicum_url, bot_url = addresses.get(timeout=30)
+    return process, stop, totals, practicum_url, bot_url
+
+
+def run_scenario(config):
+    """Poll config['tenants'] students against fake servers.
+
+    With config['workers'] above 1 the students are split between
+    worker processes of the Supervisor, like WORKERS does, and the
+    results of the workers are added up.
+
+    Args:
+        config: dict of scenario settings, see parse_args().
+
+    Returns:
+        dict of results.
+    """
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    process, stop, totals, practicum_url, bot_url = start_servers(config)
+    try:
+        if config['workers'] > 1:
+            shards = run_sharded(config, practicum_url, bot_url)
+        else:
+            shards = [poll_shard(config, practicum_url, bot_url)]
+    finally:
+        stop.set()
+    counters = totals.get(timeout=30)
+    process.join(30)
+    return summarize(config, shards, counters)
+
+
+def poll_shard(config, practicum_url, bot_url, barrier=None):
+    """Poll the students of this process for config['cycles'] cycles.
+
+    A worker polls only the students its SHARD owns and delivers only
+    their messages.
+
+    Args:
+        config: dict of scenario settings.
+        practicum_url: url of the fake Practicum server.
+        bot_url: url of the fake Telegram bot api.
+        barrier: barrier of the workers passed after the warm-up.
+
+    Returns:
+        dict of cycles, durations of calls and resource usage.
+    """
+    import homework
+    import telegram
+    from telegram.utils.request import Request
+
+    from homework_bot.outbound import OutboundQueue
+    from homework_bot.outbox import Outbox
+    from homework_bot.storage import open_store
+    from homework_bot.tenants import TenantState, make_tenant
+
+    saved = {
+        name: getattr(homework, name)
+        for name in (
+            'ENDPOINT', 'POLL_CONCURRENCY', 'api_session', 'api_breaker',
+            'fetch_statuses',
+        )
+    }
+    breaker_gauge = dict(homework.API_BREAKER_OPEN.series)
+    level = homework.logger.level
+    api_timings = Timings()
+    send_timings = Timings()
+    try:
+        homework.logger.setLevel(config['log_level'])
+        homework.ENDPOINT = practicum_url + API_PATH
+        homework.POLL_CONCURRENCY = config['concurrency']
+        homework.open_api_session()
+        homework.fetch_statuses = api_timings.wrap(saved['fetch_statuses'])
+        bot = telegram.Bot(
+            token='123456:benchmark',
+            base_url=bot_url,
+            request=Request(con_pool_size=config['send_workers'] + 4),
+        )
+        send = send_timings.wrap(homework.send_message)
+        tenants = homework.load_registry([
+            make_tenant(f'token-{index}', 1000 + index)
+            for index in range(config['tenants'])
+        ])
+        store = open_store(config['store'])
+        outbound = OutboundQueue(
+            global_rate=config['telegram_rate'] / config['workers'],
+            chat_rate=config['telegram_rate'],
+        )
+        outbox = Outbox(
+            store, outbound,
+            {tenant.id for tenant in tenants}
+            if homework.SHARD is not None else None,
+        )
+        outbound.start(
+            lambda message: send(bot, message), config['send_workers'],
+            outbox.done,
+        )
+        stop_delivery = homework.start_delivery(outbox)
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        states = {tenant.id: TenantState(0) for tenant in tenants}
+        for _ in range(config['warmup']):
+            homework.poll_tenants(DiscardQueue(), tenants, states)
+        store.save(states)
+        api_timings.clear()
+        if barrier is not None:
+            barrier.wait()
+        cycles = []
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        started = time.monotonic()
+        for _ in range(config['cycles']):
+            start = time.perf_counter()
+            changes = homework.poll_tenants(outbox, tenants, states)
+            polled = time.perf_counter()
+            homework.save_states(outbox, states)
+            stored = time.perf_counter()
+            flushed = wait_delivered(store, config['flush_timeout'])
+            cycles.append({
+                'seconds': time.perf_counter() - start,
+                'poll_seconds': polled - start,
+                'save_seconds': stored - polled,
+                'changes': sum(filter(None, changes)),
+                'flushed': flushed,
+            })
+        finished = time.monotonic()
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        stop_delivery()
+        outbound.close(config['flush_timeout'])
+        store.close()
+    finally:
+        homework.logger.setLevel(level)
+        for name, value in saved.items():
+            setattr(homework, name, value)
+        homework.API_BREAKER_OPEN.series = breaker_gauge
+    return {
+        'cycles': cycles,
+        'api': api_timings.values,
+        'send': send_timings.values,
+        'started': started,
+        'finished': finished,
+        'cpu_user': used.ru_utime - usage.ru_utime,
+        'cpu_system': used.ru_stime - usage.ru_stime,
+        'max_rss_kb': used.ru_maxrss,
+        'rss_growth_kb': used.ru_maxrss - baseline_rss,
+    }
+
+
+def run_sharded(config, practicum_url, bot_url):
+    """Poll the students in config['workers'] processes of the Supervisor.
+
+    Every worker polls the students its shard owns on the hash ring,
+    like a worker of WORKERS does. The measured cycles of all workers
+    start together after the warm-up.
+
+    Args:
+        config: dict of scenario settings.
+        practicum_url: url of the fake Practicum server.
+        bot_url: url of the fake Telegram bot api.
+
+    Returns:
+        list of results of poll_shard() of every worker.
+
+    Raises:
+        RuntimeError: when a worker failed.
+    """
+    from homework_bot.supervisor import Supervisor
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    barrier = context.Barrier(config['workers'])
+    supervisor = Supervisor(
+        [f'worker-{index}' for index in range(config['workers'])],
+        functools.partial(
+            run_worker, config, practicum_url, bot_url, barrier, results,
+        ),
+        context=context,
+    )
+    try:
+        for shard in supervisor.shards:
+            supervisor.start(shard)
+        shards = [results.get() for _ in supervisor.shards]
+    finally:
+        supervisor.stop()
+    for result in shards:
+        if isinstance(result, Exception):
+            raise result
+    return shards
+
+
+def run_worker(config, practicum_url, bot_url, barrier, results, shard,
+               shards):
+    """Run poll_shard() in a worker process of run_sharded().
+
+    A failure is put into results as well and breaks the barrier,
+    so the other workers do not wait for this one.
+
+    Args:
+        config: dict of scenario settings.
+        practicum_url: url of the fake Practicum server.
+        bot_url: url of the fake Telegram bot api.
+        barrier: barrier of the workers passed after the warm-up.
+        results: queue receiving the results.
+        shard: name of the shard of this worker.
+        shards: names of all shards.
+    """
+    import homework
+
+    homework.SHARD, homework.SHARDS = shard, tuple(shards)
+    try:
+        results.put(poll_shard(config, practicum_url, bot_url, barrier))
+    except Exception as error:
+        barrier.abort()
+        results.put(RuntimeError(f'{shard}: {error!r}'))
+
+
+def summarize(config, shards, counters):
+    """Add up the results of the workers of a scenario.
+
+    A cycle lasts until the slowest worker finishes it.
+
+    Args:
+        config: dict of scenario settings.
+        shards: results of poll_shard() of every worker.
+        counters: request counters of the fake servers.
+
+    Returns:
+        dict of results.
+    """
+    cycles = [
+        {
+            'seconds': max(cycle['seconds'] for cycle in shard_cycles),
+            'poll_seconds': max(
+                cycle['poll_seconds'] for cycle in shard_cycles
+            ),
+            'save_seconds': max(
+                cycle['save_seconds'] for cycle in shard_cycles
+            ),
+            'changes': sum(cycle['changes'] for cycle in shard_cycles),
+            'flushed': all(cycle['flushed'] for cycle in shard_cycles),
+        }
+        for shard_cycles in zip(*(shard['cycles'] for shard in shards))
+    ]
+    cycle_seconds = [cycle['seconds'] for cycle in cycles]
+    api_timings = Timings()
+    send_timings = Timings()
+    for shard in shards:
+        api_timings.values.extend(shard['api'])
+        send_timings.values.extend(shard['send'])
+    elapsed = (
+        max(shard['finished'] for shard in shards)
+        - min(shard['started'] for shard in shards)
+    )
+    return {
+        **config,
+        'cycle_results': cycles,
+        'cycle_p50': percentile(cycle_seconds, 0.5),
+        'cycle_max': max(cycle_seconds, default=None),
+        'polls_per_second': (
+            config['tenants'] * config['cycles'] / elapsed
+            if elapsed > 0 else None
+        ),
+        **api_timings.summary('api'),
+        **send_timings.summary('send'),
+        **counters,
+        'cpu_user': sum(shard['cpu_user'] for shard in shards),
+        'cpu_system': sum(shard['cpu_system'] for shard in shards),
+        'max_rss_kb': max(shard['max_rss_kb'] for shard in shards),
+        'rss_per_tenant_kb': (
+            sum(shard['rss_growth_kb'] for shard in shards)
+            / max(config['tenants'], 1)
+        ),
+        'python': sys.version.split()[0],
+    }
+
+
+def run_isolated(config):
+    """Run a scenario in a fresh process so RSS is its own.
+
+    Args:
+        config: dict of scenario settings.
+
+    Returns:
+        dict of results.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(
+        target=put_result, args=(config, results),
+    )
+    process.start()
+    result = results.get()
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def put_result(config, results):
+    """Run a scenario and put its results or error into a queue.
+
+    Args:
+        config: dict of scenario settings.
+        results: queue receiving the results.
+    """
+    try:
+        results.put(run_scenario(config))
+    except Exception as error:
+        results.put(RuntimeError(repr(error)))
+
+
+def parse_args(argv=None):
+    """Parse command line.
+
+    Args:
+        argv: arguments, sys.argv by default.
+
+    Returns:
+        argparse.Namespace.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--tenants', type=int, nargs='+', default=[10, 1000, 10000],
+        help='numbers of students, one scenario per number',
+    )
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument(
+        '--warmup', type=int, default=1,
+        help='unmeasured cycles dropping messages, so that students '
+             'are known before the measured cycles',
+    )
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='worker processes sharing the students, like WORKERS',
+    )
+    parser.add_argument('--send-workers', type=int, default=4)
+    parser.add_argument(
+        '--telegram-rate', type=float, default=1000,
+        help='messages per second allowed by the outbound queue',
+    )
+    parser.add_argument('--api-latency', type=float, default=0.02)
+    parser.add_argument('--api-error-rate', type=float, default=0.01)
+    parser.add_argument('--telegram-latency', type=float, default=0.01)
+    parser.add_argument('--telegram-error-rate', type=float, default=0.0)
+    parser.add_argument(
+        '--payload-size', type=int, default=5,
+        help='homeworks in every answer',
+    )
+    parser.add_argument(
+        '--change-rate', type=float, default=0.01,
+        help='probability of a status change per request',
+    )
+    parser.add_argument('--flush-timeout', type=float, default=600)
+    parser.add_argument(
+        '--store', default='memory://',
+        help='STATE_STORE of the bot, e.g. sqlite:///bench.sqlite3',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log-level', default='CRITICAL')
+    parser.add_argument(
+        '--output', help='append json lines to this file as well',
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run every scenario and print its results as a json line.
+
+    Args:
+        argv: arguments, sys.argv by default.
+    """
+    args = vars(parse_args(argv))
+    output = args.pop('output')
+    for tenants in args.pop('tenants'):
+        line = json.dumps(run_isolated({**args, 'tenants': tenants}))
+        print(line, flush=True)
+        if output:
+            with open(output, 'a') as file:
+                file.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
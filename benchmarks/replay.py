@@ -0,0 +1,105 @@
+"""Benchmark of parsing and diffing against recorded API answers.
+
+The record is written by the bot with API_RECORD set. Every cycle
+polls the students through ReplaySession, without network and without
+waiting, and prints one json line with the time of checking answers.
+
+    python -m benchmarks.replay api.jsonl --tenants 1000 --cycles 5
+"""
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.loadtest import ROOT_DIR, DiscardQueue, Timings, percentile
+
+
+def run_replay(config):
+    """Poll config['tenants'] students with answers from the record.
+
+    Args:
+        config: dict of settings, see parse_args().
+
+    Returns:
+        dict of results.
+    """
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    import homework
+
+    from homework_bot.replay import ReplaySession
+    from homework_bot.tenants import TenantState, make_tenant
+
+    saved = {
+        name: getattr(homework, name)
+        for name in ('POLL_CONCURRENCY', 'api_session', 'check_answer')
+    }
+    check_timings = Timings()
+    cycle_times = []
+    try:
+        homework.POLL_CONCURRENCY = 1
+        homework.api_session = ReplaySession(config['record'], speed=0)
+        homework.check_answer = check_timings.wrap(saved['check_answer'])
+        tenants = [
+            make_tenant(f'replay-{number}', number)
+            for number in range(config['tenants'])
+        ]
+        states = {tenant.id: TenantState() for tenant in tenants}
+        outbound = DiscardQueue()
+        for _ in range(config['cycles']):
+            start = time.perf_counter()
+            homework.poll_tenants(outbound, tenants, states)
+            cycle_times.append(time.perf_counter() - start)
+    finally:
+        for name, value in saved.items():
+            setattr(homework, name, value)
+    return {
+        **config,
+        'cycle_p50': percentile(cycle_times, 0.5),
+        'cycle_max': max(cycle_times, default=None),
+        **check_timings.summary('check'),
+    }
+
+
+def parse_args(argv=None):
+    """Parse command line arguments.
+
+    Args:
+        argv: arguments, sys.argv by default.
+
+    Returns:
+        argparse.Namespace.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('record', help='file recorded with API_RECORD')
+    parser.add_argument(
+        '--tenants', type=int, default=100,
+        help='number of students polled with the recorded answers',
+    )
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument(
+        '--output', help='append the json line to this file as well',
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmark and print its result.
+
+    Args:
+        argv: arguments, sys.argv by default.
+    """
+    args = parse_args(argv)
+    line = json.dumps(run_replay({
+        'record': args.record,
+        'tenants': args.tenants,
+        'cycles': args.cycles,
+    }))
+    print(line)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as file:
+            file.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
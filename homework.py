@@ -1,23 +1,164 @@
+import argparse
 import logging
+import math
 import os
-import requests
+import signal
 import sys
-import telegram
+import threading
 import time
 
 from http import HTTPStatus
 
-from dotenv import load_dotenv
+from dotenv import dotenv_values, find_dotenv, load_dotenv
 
-load_dotenv()
+from homework_bot.breaker import OPEN, CircuitBreaker, CircuitOpenError
+from homework_bot.deadline import Budget, BudgetExceeded, DeadlineExceeded
+from homework_bot.dedup import DedupCache, error_class
+from homework_bot.diff import diff_statuses
+from homework_bot.fingerprint import fingerprint
+from homework_bot.logs import JsonFormatter, queue_logging
+from homework_bot.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    start_metrics_server,
+)
+from homework_bot.models import intern_status
+from homework_bot.outbound import (
+    ERROR_PRIORITY,
+    GLOBAL_RATE,
+    OutboundQueue,
+    SendMessageError,
+)
+from homework_bot.outbox import Outbox
+from homework_bot.reload import (
+    FileWatcher,
+    ReloadSignal,
+    diff_tenants,
+)
+from homework_bot.render import STATUS_TEMPLATES, Renderer, build_renderer
+from homework_bot.replay import RecordingSession, ReplaySession
+from homework_bot.scheduler import Scheduler
+from homework_bot.sharding import HashRing
+from homework_bot.storage import open_store
+from homework_bot.supervisor import Supervisor
+from homework_bot.tenants import (
+    ChatMessage,
+    TenantState,
+    load_tenants,
+    make_tenant,
+    shared_chats,
+    tenant_chats,
+)
+from homework_bot.tracing import NOOP_SPAN, Tracer, open_exporter
+
+ENV_FILE = find_dotenv()
+DEPLOYMENT_ENV = frozenset(os.environ)
+load_dotenv(ENV_FILE)
 
 PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TENANTS_FILE = os.getenv('TENANTS_FILE')
+POLL_CONCURRENCY = int(os.getenv('POLL_CONCURRENCY', 1))
+POOL_SIZE = int(os.getenv('POOL_SIZE', 10))
+API_RETRIES = int(os.getenv('API_RETRIES', 3))
+CONNECT_TIMEOUT = float(os.getenv('CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.getenv('READ_TIMEOUT', 10))
+POLL_DEADLINE = float(os.getenv('POLL_DEADLINE', 30))
+CYCLE_BUDGET = float(os.getenv('CYCLE_BUDGET', 300))
+BREAKER_THRESHOLD = int(os.getenv('BREAKER_THRESHOLD', 5))
+BREAKER_TIMEOUT = float(os.getenv('BREAKER_TIMEOUT', 60))
+ERROR_TTL = float(os.getenv('ERROR_TTL', 3600))
+ERROR_CACHE_SIZE = int(os.getenv('ERROR_CACHE_SIZE', 10000))
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', 1024))
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', 1))
+FLUSH_TIMEOUT = 60
+DIGEST_WINDOW = float(os.getenv('DIGEST_WINDOW', 0))
+DIGEST_BY = os.getenv('DIGEST_BY', 'chat')
+RUN_ONCE = False
+WORKERS = int(os.getenv('WORKERS', 1))
+SHARD = None
+SHARDS = ()
+STATE_STORE = os.getenv('STATE_STORE', 'sqlite:///homework_bot.sqlite3')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+API_RECORD = os.getenv('API_RECORD')
+API_REPLAY = os.getenv('API_REPLAY')
+API_REPLAY_SPEED = float(os.getenv('API_REPLAY_SPEED', 1))
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0))
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'jsonl:///traces.jsonl')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_QUEUE_POLICY = os.getenv('LOG_QUEUE_POLICY', 'drop')
 
 RETRY_PERIOD = 600  # 10 minutes
-ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
+MIN_RETRY_PERIOD = int(os.getenv('MIN_RETRY_PERIOD', 300))
+MAX_RETRY_PERIOD = int(os.getenv('MAX_RETRY_PERIOD', 3600))
+RETRY_BACKOFF = float(os.getenv('RETRY_BACKOFF', 1.5))
+RETRY_JITTER = float(os.getenv('RETRY_JITTER', 0.1))
+ENDPOINT = os.getenv(
+    'ENDPOINT', 'https://practicum.yandex.ru/api/user_api/homework_statuses/',
+)
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+RELOADABLE = (
+    'PRACTICUM_TOKEN', 'TELEGRAM_CHAT_ID', 'TENANTS_FILE', 'ENDPOINT',
+    'POLL_CONCURRENCY', 'CONNECT_TIMEOUT', 'READ_TIMEOUT',
+    'POLL_DEADLINE', 'CYCLE_BUDGET',
+    'BREAKER_THRESHOLD', 'BREAKER_TIMEOUT', 'ERROR_TTL',
+    'MIN_RETRY_PERIOD', 'MAX_RETRY_PERIOD', 'RETRY_BACKOFF', 'RETRY_JITTER',
+)
+
+api_session = None
+api_breaker = None
+error_notices = DedupCache(ERROR_TTL, ERROR_CACHE_SIZE)
+reload_signal = ReloadSignal()
+tracer = None
+
+METRICS = Registry()
+API_LATENCY = Histogram(
+    METRICS, 'homework_api_request_seconds',
+    'Duration of requests to the Practicum API.',
+)
+API_RESPONSES = Counter(
+    METRICS, 'homework_api_responses_total',
+    'Answers of the Practicum API by HTTP status.', ('status',),
+)
+DECODE_LATENCY = Histogram(
+    METRICS, 'homework_api_decode_seconds',
+    'Duration of decoding API answers from json.',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, math.inf),
+)
+SEND_LATENCY = Histogram(
+    METRICS, 'homework_telegram_send_seconds',
+    'Duration of sending Telegram messages.',
+)
+ERRORS = Counter(
+    METRICS, 'homework_errors_total',
+    'Failed polls by error type.', ('type',),
+)
+QUEUE_DEPTH = Gauge(
+    METRICS, 'homework_outbound_queue_depth',
+    'Telegram messages waiting to be sent.',
+)
+TENANTS = Gauge(METRICS, 'homework_tenants', 'Number of polled students.')
+SUPPRESSED_ERRORS = Counter(
+    METRICS, 'homework_error_notices_suppressed_total',
+    'Error notices not sent because the same error was sent recently.',
+)
+OVERRUNS = Counter(
+    METRICS, 'homework_poll_overruns_total',
+    'Polls cancelled by POLL_DEADLINE or left for the next cycle '
+    'by CYCLE_BUDGET.', ('type',),
+)
+OUTBOX_MESSAGES = Counter(
+    METRICS, 'homework_outbox_messages_total',
+    'Status messages of the outbox by result of the send.', ('result',),
+)
+API_BREAKER_OPEN = Gauge(
+    METRICS, 'homework_api_breaker_open',
+    'Whether polls of the Practicum API are suspended.',
+)
 
 
 HOMEWORK_VERDICTS = {
@@ -25,28 +166,38 @@ HOMEWORK_VERDICTS = {
     'reviewing': 'Работа взята на проверку ревьюером.',
     'rejected': 'Работа проверена: у ревьюера есть замечания.',
 }
+renderer = Renderer(
+    STATUS_TEMPLATES['ru'], HOMEWORK_VERDICTS, RENDER_CACHE_SIZE,
+)
+renderers = {}
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 handler = logging.StreamHandler(stream=sys.stdout)
-logger.addHandler(handler)
-formatter = logging.Formatter(
-    '%(asctime)s %(levelname)s %(message)s',
-)
+if LOG_FORMAT == 'json':
+    formatter = JsonFormatter()
+else:
+    formatter = logging.Formatter(
+        '%(asctime)s %(levelname)s %(message)s',
+    )
 handler.setFormatter(formatter)
+_, log_writer = queue_logging(
+    logger, handler, LOG_QUEUE_SIZE, LOG_QUEUE_POLICY,
+)
 
 
 def check_tokens():
     """Check value of inviroment variables in globals().
 
+    PRACTICUM_TOKEN and TELEGRAM_CHAT_ID are not required when
+    students are listed in TENANTS_FILE.
+
     Raises:
         ValueError: when at least one of the environment variable not able.
     """
-    environment_variables = (
-        'PRACTICUM_TOKEN',
-        'TELEGRAM_TOKEN',
-        'TELEGRAM_CHAT_ID',
-    )
+    environment_variables = ('TELEGRAM_TOKEN',)
+    if not TENANTS_FILE:
+        environment_variables += ('PRACTICUM_TOKEN', 'TELEGRAM_CHAT_ID')
     missing_list = [
         value
         for value in environment_variables
@@ -62,16 +213,28 @@ def send_message(bot, message):
 
     Args:
         bot: telegram bot.
-        message: str message.
+        message: str message, ChatMessage is sent to its own chat.
 
     Raises:
-        TelegramError: when Telegram bot cant send message.
+        SendMessageError: when Telegram bot cant send message,
+            with retry_after on flood control.
     """
+    import telegram
+
+    chat_id = TELEGRAM_CHAT_ID
+    tenant = None
+    if isinstance(message, ChatMessage):
+        chat_id = message.chat_id
+        tenant = message.key and message.key[0]
     try:
-        bot.send_message(TELEGRAM_CHAT_ID, message)
+        with SEND_LATENCY.time(), trace(
+            'send_message', root=True, tenant=tenant, chat=chat_id,
+            size=len(message),
+        ):
+            bot.send_message(chat_id, message)
     except telegram.error.TelegramError as error:
         logger.exception('Боту не удалось отправить сообщение: %s', error)
-        raise telegram.error.TelegramError(error)
+        raise SendMessageError(error, getattr(error, 'retry_after', None))
     logger.debug('Бот отправил сообщение: %s', message)
 
 
@@ -88,22 +251,149 @@ def get_api_answer(timestamp):
         AssertionError: when ENDPOINT not available.
         TypeError: if impossible to convert the response from api.
     """
+    return request_statuses(HEADERS, timestamp)
+
+
+def get_tenant_answer(tenant, state):
+    """Get a response from yandex api with the tenant's token.
+
+    With the pooled api_session the raw answer is fingerprinted first:
+    when it is the same as the previous one apart from current_date,
+    decoding and checking are skipped and only the cursor moves.
+    The ETag of an answer is sent back in If-None-Match while from_date
+    stays the same. Both are kept only for an answer that decoded, and
+    check_answer forgets them when the check fails. While api_breaker
+    is open the request is not sent.
+
+    Args:
+        tenant: polled student.
+        state: TenantState of the student.
+
+    Returns:
+        answer from api in json(), or None when it did not change.
+
+    Raises:
+        CircuitOpenError: while the API is considered unavailable.
+    """
+    headers = {'Authorization': f'OAuth {tenant.token}'}
+    if api_session is None:
+        return request_statuses(headers, state.timestamp)
+    if api_breaker is not None and not api_breaker.allow():
+        raise CircuitOpenError('API Практикума недоступен')
+    if state.etag and state.etag[0] == state.timestamp:
+        headers['If-None-Match'] = state.etag[1]
+    homework_statuses = fetch_statuses(headers, state.timestamp)
+    if homework_statuses.status_code == HTTPStatus.NOT_MODIFIED:
+        return None
+    digest, current_date = fingerprint(homework_statuses.content)
+    if digest == state.fingerprint:
+        move_cursor(state, current_date)
+        return None
+    response = decode_statuses(homework_statuses)
+    if 'ETag' in homework_statuses.headers:
+        state.etag = (state.timestamp, homework_statuses.headers['ETag'])
+    state.fingerprint = digest
+    return response
+
+
+def request_statuses(headers, timestamp):
+    """Request homework statuses from ENDPOINT.
+
+    Args:
+        headers: request headers with authorization.
+        timestamp: number of seconds since the epoch.
+
+    Returns:
+        homework_statuses.json(): answer from api in json().
+    """
+    return decode_statuses(fetch_statuses(headers, timestamp))
+
+
+def fetch_statuses(headers, timestamp):
+    """Send the request of homework statuses to ENDPOINT.
+
+    Uses the pooled api_session when it is open. Network errors and
+    5xx answers count as failures of api_breaker, any other answer
+    proves the API is alive.
+
+    Args:
+        headers: request headers with authorization.
+        timestamp: number of seconds since the epoch.
+
+    Returns:
+        response with status 200, or 304 to a conditional request.
+
+    Raises:
+        AssertionError: when ENDPOINT not available.
+    """
+    import requests
+
+    client = api_session or requests
     try:
-        homework_statuses = requests.get(
-            ENDPOINT,
-            headers=HEADERS,
-            params={'from_date': timestamp},
-        )
+        with API_LATENCY.time(), trace('get_api_answer') as api_span:
+            homework_statuses = client.get(
+                ENDPOINT,
+                headers=headers,
+                params={'from_date': timestamp},
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            )
+            if api_span is not NOOP_SPAN:
+                api_span.set(
+                    status=int(homework_statuses.status_code),
+                    payload=len(getattr(homework_statuses, 'content', b'')),
+                )
     except Exception as error:
+        API_RESPONSES.inc(status='error')
+        record_availability(False)
         message = f'{ENDPOINT} недоступен: {error}'
         logger.exception(message)
         raise AssertionError(message)
-    if homework_statuses.status_code != HTTPStatus.OK:
+    API_RESPONSES.inc(status=int(homework_statuses.status_code))
+    record_availability(
+        homework_statuses.status_code < HTTPStatus.INTERNAL_SERVER_ERROR,
+    )
+    if homework_statuses.status_code not in (
+        HTTPStatus.OK, HTTPStatus.NOT_MODIFIED,
+    ):
         message = f'Код ответа API: {homework_statuses.status_code}'
         logger.exception(message)
         raise AssertionError(message)
+    return homework_statuses
+
+
+def record_availability(success):
+    """Pass the result of a request to api_breaker and log its changes.
+
+    Args:
+        success: whether the API answered.
+    """
+    if api_breaker is None:
+        return
+    state = api_breaker.record(success)
+    if state == OPEN:
+        logger.error(
+            'API Практикума недоступен, опрос приостановлен на %s с',
+            BREAKER_TIMEOUT,
+        )
+    elif state is not None:
+        logger.info('API Практикума снова доступен')
+
+
+def decode_statuses(homework_statuses):
+    """Decode the answer of ENDPOINT.
+
+    Args:
+        homework_statuses: response of ENDPOINT.
+
+    Returns:
+        homework_statuses.json(): answer from api in json().
+
+    Raises:
+        TypeError: if impossible to convert the response from api.
+    """
     try:
-        return homework_statuses.json()
+        with DECODE_LATENCY.time():
+            return homework_statuses.json()
     except Exception as error:
         message = f'Ошибка преобразования к формату json: {error}'
         logger.exception(message)
@@ -155,54 +445,966 @@ def parse_status(homework):
         KeyError: when keys 'homework_name' or 'status' from
             the homework list are unavailable.
     """
+    return render_status(renderer, homework)
+
+
+def render_status(status_renderer, homework):
+    """Render the message about homework status.
+
+    Args:
+        status_renderer: Renderer of the student.
+        homework: homework from the API answer.
+
+    Returns:
+        message about homework status.
+
+    Raises:
+        KeyError: when keys 'homework_name' or 'status' from
+            the homework list are unavailable or the status is unknown.
+    """
     try:
         name, status = homework['homework_name'], homework['status']
     except KeyError as error:
         logger.exception('Ключ в словаре homework недоступен')
         raise KeyError(error)
     try:
-        return (
-            'Изменился статус проверки работы '
-            f'"{name}". {HOMEWORK_VERDICTS[status]}'
-        )
+        return status_renderer.render(name, status)
     except KeyError as error:
         logger.exception('Неизвестный статус домашней работы %s', error)
         raise KeyError(error)
 
 
-def main():
-    """Launch main function."""
-    check_tokens()
+def tenant_renderer(tenant):
+    """Return the renderer of the student's locale and verdicts.
+
+    Students with the same settings share one renderer and its cache.
+
+    Args:
+        tenant: polled student.
+
+    Returns:
+        Renderer.
+    """
+    if tenant.locale is None and not tenant.verdicts:
+        return renderer
+    key = (tenant.locale, tenant.verdicts)
+    if key not in renderers:
+        renderers[key] = build_renderer(
+            tenant.locale,
+            dict(tenant.verdicts),
+            HOMEWORK_VERDICTS,
+            RENDER_CACHE_SIZE,
+        )
+    return renderers[key]
+
+
+def read_registry():
+    """Read all students of the bot.
+
+    Returns:
+        tenants from TENANTS_FILE or the single student from environment.
+    """
+    if TENANTS_FILE:
+        return load_tenants(TENANTS_FILE)
+    return [make_tenant(PRACTICUM_TOKEN, TELEGRAM_CHAT_ID)]
+
+
+def load_registry(tenants=None):
+    """Load polled students.
+
+    A worker of the supervisor keeps only the students its SHARD owns
+    on the hash ring of all SHARDS.
+
+    Args:
+        tenants: all students, read_registry() when None.
+
+    Returns:
+        tenants polled by this process.
+    """
+    if tenants is None:
+        tenants = read_registry()
+    if SHARD is None:
+        return tenants
+    ring = HashRing(SHARDS)
+    return [tenant for tenant in tenants if ring.node_for(tenant.id) == SHARD]
+
+
+def route_chats(outbox, tenants):
+    """Choose the process delivering every chat shared by students.
+
+    A worker of the supervisor delivers a shared chat, such as a
+    mentor's chat, when its SHARD owns the chat on the hash ring, so
+    the messages of students of every shard are merged into one digest
+    and the chat gets one per-chat rate limit. The workers share the
+    outbox through STATE_STORE, a memory store is not shared, so each
+    worker then delivers the messages it saved.
+
+    Args:
+        outbox: Outbox of this process.
+        tenants: all students.
+    """
+    outbox.shared = shared_chats(tenants)
+    if SHARD is None or STATE_STORE.startswith('memory://'):
+        return
+    ring = HashRing(SHARDS)
+    outbox.chats = frozenset(
+        chat_id for chat_id in outbox.shared
+        if ring.node_for(f'chat:{chat_id}') == SHARD
+    )
+
+
+def reload_settings():
+    """Reread RELOADABLE settings from the environment and ENV_FILE.
+
+    Like at startup, variables of the process environment take
+    precedence over ENV_FILE. Settings missing from both keep their
+    values. Sizes of pools and queues are not reloadable: open sessions
+    and workers are kept as they are.
+
+    Raises:
+        ValueError: when a value cannot be parsed, no setting is
+            changed then.
+    """
+    global HEADERS
+    env_file = dotenv_values(ENV_FILE) if ENV_FILE else {}
+    values = {}
+    for name in RELOADABLE:
+        value = os.getenv(name)
+        if name not in DEPLOYMENT_ENV and env_file.get(name) is not None:
+            value = env_file[name]
+        if value is None:
+            continue
+        current = globals()[name]
+        try:
+            values[name] = (
+                value if current is None else type(current)(value)
+            )
+        except ValueError:
+            raise ValueError(f'Неверное значение {name}: {value!r}')
+    globals().update(values)
+    HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+    if api_breaker is not None:
+        api_breaker.threshold = BREAKER_THRESHOLD
+        api_breaker.reset_timeout = BREAKER_TIMEOUT
+    error_notices.ttl = ERROR_TTL
+
+
+def reload_registry(registry, states, store, scheduler, outbox=None):
+    """Apply the reloaded registry to the polled students.
+
+    Only added, removed and changed students are touched: new ones
+    are polled with their saved state and changed ones are rescheduled,
+    both within RETRY_JITTER * RETRY_PERIOD; removed ones are dropped.
+    Shared chats of the outbox are routed again.
+
+    Args:
+        registry: polled tenants by id.
+        states: TenantState by tenant id.
+        store: StateStore of the states.
+        scheduler: Scheduler of the polls.
+        outbox: Outbox of this process, None to leave it as it is.
+
+    Returns:
+        (added, removed, changed) numbers of students.
+    """
+    tenants = read_registry()
+    added, removed, changed = diff_tenants(registry, load_registry(tenants))
+    for tenant_id in removed:
+        scheduler.remove(tenant_id)
+        del registry[tenant_id]
+        states.pop(tenant_id, None)
+    states.update(load_states(store, added))
+    for tenant in changed:
+        if tenant.token != registry[tenant.id].token:
+            states[tenant.id].fingerprint = None
+            states[tenant.id].etag = None
+    for tenant in added + changed:
+        registry[tenant.id] = tenant
+        scheduler.add(tenant.id)
+    if outbox is not None:
+        route_chats(outbox, tenants)
+    TENANTS.set(len(registry))
+    return len(added), len(removed), len(changed)
+
+
+def reload_config(registry, states, store, scheduler, outbox=None):
+    """Reload settings and the registry without a restart.
+
+    Broken settings or a broken registry are logged and the previous
+    ones are kept.
+
+    Args:
+        registry: polled tenants by id.
+        states: TenantState by tenant id.
+        store: StateStore of the states.
+        scheduler: Scheduler of the polls.
+        outbox: Outbox of this process, None to leave it as it is.
+    """
+    try:
+        reload_settings()
+    except ValueError as error:
+        logger.error('Не удалось перечитать настройки: %s', error)
+    else:
+        scheduler.min_period = MIN_RETRY_PERIOD
+        scheduler.max_period = MAX_RETRY_PERIOD
+        scheduler.backoff = RETRY_BACKOFF
+        scheduler.jitter = RETRY_JITTER
+    try:
+        added, removed, changed = reload_registry(
+            registry, states, store, scheduler, outbox,
+        )
+    except (OSError, ValueError) as error:
+        logger.error('Не удалось перечитать реестр студентов: %s', error)
+        return
+    logger.info(
+        'Настройки перечитаны, студентов добавлено: %s, удалено: %s, '
+        'изменено: %s', added, removed, changed,
+    )
+
+
+def open_api_session():
+    """Share one keep-alive connection pool between polls of all students.
+
+    A single student polled every RETRY_PERIOD gains nothing from
+    keep-alive, so the pool is opened for the tenants registry only.
+    The polls share api_breaker as well: when the API fails for one
+    student it fails for everyone, so polls are suspended at once.
+    """
+    from homework_bot.session import build_session
+
+    global api_session, api_breaker
+    api_session = build_session(
+        max(POOL_SIZE, POLL_CONCURRENCY),
+        API_RETRIES,
+    )
+    api_breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_TIMEOUT)
+    API_BREAKER_OPEN.set_function(lambda: int(api_breaker.state == OPEN))
+
+
+def open_api_traffic():
+    """Record answers of the API to API_RECORD or replay API_REPLAY.
+
+    The recording wraps the client used so far, the replay replaces it,
+    so no request reaches ENDPOINT. Without both settings the client
+    stays as it is.
+    """
+    global api_session
+    if API_REPLAY:
+        api_session = ReplaySession(API_REPLAY, API_REPLAY_SPEED)
+        logger.info('Ответы API воспроизводятся из %s', API_REPLAY)
+    elif API_RECORD:
+        import requests
+
+        api_session = RecordingSession(api_session or requests, API_RECORD)
+        logger.info('Ответы API записываются в %s', API_RECORD)
+
+
+def trace(name, root=False, tenant=None, **attributes):
+    """Start a tracing span.
+
+    While tracing is off this only returns the shared no-op span.
+
+    Args:
+        name: stage name.
+        root: start a sampled trace when there is no current span.
+        tenant: tenant id, taken from the enclosing span by default.
+        **attributes: other attributes of the span.
+
+    Returns:
+        context manager of the span.
+    """
+    if tracer is None:
+        return NOOP_SPAN
+    return tracer.span(name, root, tenant, attributes)
+
+
+def open_tracing():
+    """Record TRACE_SAMPLE_RATE of polls and sends to TRACE_EXPORTER.
+
+    Tracing stays off when the rate is 0.
+    """
+    global tracer
+    if TRACE_SAMPLE_RATE > 0:
+        tracer = Tracer(open_exporter(TRACE_EXPORTER), TRACE_SAMPLE_RATE)
+        logger.info('Трассировка пишется в %s', TRACE_EXPORTER)
+
+
+def check_tenant(tenant, state, response):
+    """Check the API answer for one student.
+
+    Every homework of the answer is compared by its raw status,
+    messages are formatted only for the changed ones, once for all
+    chats of the student. Subscribers see the student's id before
+    the message. The state keeps interned statuses only.
+
+    Args:
+        tenant: polled student.
+        state: TenantState of the student.
+        response: answer from api.
+
+    Returns:
+        list of ChatMessage to send.
+    """
+    with trace('check_response') as check_span:
+        homeworks = check_response(response) or []
+        changed = diff_statuses(state.statuses, homeworks)
+        check_span.set(homeworks=len(homeworks), changed=len(changed))
+    if not changed:
+        logger.debug('Статус не обновлен')
+    status_renderer = tenant_renderer(tenant)
+    chats = tenant_chats(tenant)
+    messages = []
+    with trace('parse_status', messages=len(changed) * len(chats)):
+        for key, homework in changed:
+            text = render_status(status_renderer, homework)
+            subscriber_text = f'{tenant.id}: {text}'
+            messages.extend(
+                ChatMessage(
+                    text if chat_id == tenant.chat_id else subscriber_text,
+                    chat_id, (tenant.id, chat_id, key, homework.get('status')),
+                )
+                for chat_id in chats
+            )
+    for key, homework in changed:
+        state.statuses[key] = intern_status(homework['status'])
+    move_cursor(state, response.get('current_date'))
+    return messages
+
+
+def move_cursor(state, current_date):
+    """Move from_date of the next poll to current_date of the answer.
+
+    The next poll then returns only homeworks changed since this one.
+    The cursor is moved after the answer is handled, so a failed check
+    is retried with the same from_date.
+
+    Args:
+        state: TenantState of the student.
+        current_date: current_date of the handled answer.
+    """
+    if isinstance(current_date, int) and current_date > state.timestamp:
+        state.timestamp = current_date
+
+
+def check_answer(tenant, state, response):
+    """Check the answer unless it is the same as the previous one.
+
+    Args:
+        tenant: polled student.
+        state: TenantState of the student.
+        response: answer from api, None when it did not change.
+
+    Returns:
+        list of ChatMessage to send.
+    """
+    if response is None:
+        logger.debug('Ответ API не изменился')
+        return []
+    try:
+        return check_tenant(tenant, state, response)
+    except Exception:
+        forget_answer(state)
+        raise
 
-    bot = telegram.Bot(token=TELEGRAM_TOKEN)
 
+def report_error(tenant, state, error):
+    """Log the failure of one student's check.
+
+    Polls skipped by the open api_breaker are not logged one by one,
+    its opening is logged once. A notice is sent once per ERROR_TTL
+    for every student and class of error, the next one tells how many
+    times the error repeated meanwhile. The last notice is kept in the
+    state, so a restart does not send it again.
+
+    Args:
+        tenant: polled student.
+        state: TenantState of the student.
+        error: raised exception.
+
+    Returns:
+        list of ChatMessage to send, empty if the error was already sent.
+    """
+    message = f'Сбой в работе программы: {error}'
+    if isinstance(error, CircuitOpenError):
+        logger.debug(message)
+    else:
+        logger.exception(message)
+    ERRORS.inc(type=type(error).__name__)
+    notice = error_class(error)
+    repeats = error_notices.check((tenant.id, notice))
+    if repeats is None:
+        SUPPRESSED_ERRORS.inc()
+        if state.error == notice:
+            state.error_repeats += 1
+        return []
+    state.error = notice
+    state.error_sent = error_notices.clock()
+    state.error_repeats = 0
+    if repeats:
+        message += f'\nС прошлого уведомления ошибка повторилась {repeats} раз'
+    return [ChatMessage(message, tenant.chat_id)]
+
+
+def resolve_error(tenant, state):
+    """Forget the reported error after a successful poll.
+
+    Args:
+        tenant: polled student.
+        state: TenantState of the student.
+
+    Returns:
+        list with a ChatMessage telling how many times the error
+        repeated after its notice, empty if it did not repeat.
+    """
+    if not state.error:
+        return []
+    error_notices.pop((tenant.id, state.error))
+    repeats = state.error_repeats
+    state.error, state.error_sent, state.error_repeats = '', 0, 0
+    if not repeats:
+        return []
+    return [ChatMessage(
+        f'Сбой устранён, с прошлого уведомления ошибка повторилась '
+        f'{repeats} раз',
+        tenant.chat_id,
+    )]
+
+
+def poll_tenant(outbound, tenant, state):
+    """Check homework of one student and queue notifications.
+
+    Args:
+        outbound: Outbox or OutboundQueue of messages.
+        tenant: polled student.
+        state: TenantState of the student.
+
+    Returns:
+        number of changed homeworks.
+    """
+    with trace('poll', root=True, tenant=tenant.id) as poll_span:
+        try:
+            response = get_tenant_answer(tenant, state)
+            messages = check_answer(tenant, state, response)
+        except Exception as error:
+            poll_span.set(outcome='error', error=type(error).__name__)
+            for message in report_error(tenant, state, error):
+                outbound.put(message, ERROR_PRIORITY)
+            return 0
+    for message in resolve_error(tenant, state):
+        outbound.put(message, ERROR_PRIORITY)
+    for message in messages:
+        outbound.put(message)
+    return len(messages)
+
+
+def get_tenant_answer_guarded(tenant, state):
+    """Call get_tenant_answer marking the student busy meanwhile.
+
+    When the poll was abandoned before the request finished, the answer
+    is never checked, so its fingerprint and ETag are forgotten.
+
+    Args:
+        tenant: polled student.
+        state: TenantState of the student.
+
+    Returns:
+        answer from api in json(), or None when it did not change.
+    """
+    state.busy = True
+    try:
+        return get_tenant_answer(tenant, state)
+    finally:
+        state.busy = False
+        if state.overran:
+            forget_answer(state)
+
+
+def forget_answer(state):
+    """Make the next answer of a student checked in full.
+
+    Args:
+        state: TenantState of the student.
+    """
+    state.fingerprint = None
+    state.etag = None
+
+
+async def get_tenant_answer_async(tenant, state):
+    """Awaitable get_tenant_answer running in the loop's thread pool.
+
+    The request is abandoned after POLL_DEADLINE seconds or when the
+    poll is cancelled; its thread finishes in the background.
+
+    Args:
+        tenant: polled student.
+        state: TenantState of the student.
+
+    Returns:
+        answer from api in json(), or None when it did not change.
+
+    Raises:
+        DeadlineExceeded: when the answer took longer than POLL_DEADLINE
+            or the previous request of the student is still running.
+    """
+    import asyncio
+
+    from homework_bot.engine import in_thread
+
+    if state.busy:
+        raise DeadlineExceeded('Предыдущий запрос студента ещё выполняется')
+    state.overran = False
+    try:
+        return await asyncio.wait_for(
+            in_thread(get_tenant_answer_guarded, tenant, state),
+            POLL_DEADLINE or None,
+        )
+    except asyncio.TimeoutError:
+        state.overran = True
+        forget_answer(state)
+        raise DeadlineExceeded(
+            f'Ответ API не получен за {POLL_DEADLINE} с',
+        ) from None
+    except asyncio.CancelledError:
+        state.overran = True
+        forget_answer(state)
+        raise
+
+
+async def poll_tenant_async(outbound, tenant, state):
+    """Awaitable poll_tenant.
+
+    A poll over its deadline is not reported to the student.
+
+    Args:
+        outbound: Outbox or OutboundQueue of messages.
+        tenant: polled student.
+        state: TenantState of the student.
+
+    Returns:
+        number of changed homeworks.
+    """
+    with trace('poll', root=True, tenant=tenant.id) as poll_span:
+        try:
+            response = await get_tenant_answer_async(tenant, state)
+            messages = check_answer(tenant, state, response)
+        except DeadlineExceeded:
+            raise
+        except Exception as error:
+            poll_span.set(outcome='error', error=type(error).__name__)
+            for message in report_error(tenant, state, error):
+                outbound.put(message, ERROR_PRIORITY)
+            return 0
+    for message in resolve_error(tenant, state):
+        outbound.put(message, ERROR_PRIORITY)
+    for message in messages:
+        outbound.put(message)
+    return len(messages)
+
+
+async def poll_tenants_async(outbound, tenants, states):
+    """Poll students concurrently, at most POLL_CONCURRENCY at once.
+
+    Polls still running when CYCLE_BUDGET runs out are cancelled.
+
+    Args:
+        outbound: Outbox or OutboundQueue of messages.
+        tenants: polled students.
+        states: TenantState by tenant id.
+
+    Returns:
+        list of poll_tenant results or raised exceptions.
+    """
+    from homework_bot.engine import run_bounded
+
+    return await run_bounded(
+        lambda tenant: poll_tenant_async(outbound, tenant, states[tenant.id]),
+        tenants,
+        POLL_CONCURRENCY,
+        CYCLE_BUDGET or None,
+    )
+
+
+def poll_tenants_sequentially(outbound, tenants, states):
+    """Poll students one by one until CYCLE_BUDGET runs out.
+
+    A single request is not interrupted here, it is bounded only by
+    CONNECT_TIMEOUT and READ_TIMEOUT.
+
+    Args:
+        outbound: Outbox or OutboundQueue of messages.
+        tenants: polled students.
+        states: TenantState by tenant id.
+
+    Returns:
+        list of poll_tenant results or raised exceptions.
+    """
+    budget = Budget(CYCLE_BUDGET)
+    results = []
+    for tenant in tenants:
+        if budget.expired():
+            results.append(BudgetExceeded(f'Не хватило {CYCLE_BUDGET} с'))
+            continue
+        try:
+            results.append(poll_tenant(outbound, tenant, states[tenant.id]))
+        except Exception as error:
+            results.append(error)
+    return results
+
+
+def poll_tenants(outbound, tenants, states):
+    """Poll every student once.
+
+    Students are polled one by one, or concurrently in an event loop
+    when POLL_CONCURRENCY is greater than one. Polls over POLL_DEADLINE
+    count as polls without changes, students not polled within
+    CYCLE_BUDGET get None and are left for the next cycle.
+
+    Args:
+        outbound: Outbox or OutboundQueue of messages.
+        tenants: polled students.
+        states: TenantState by tenant id.
+
+    Returns:
+        list of numbers of changed homeworks in the order of tenants.
+    """
+    if POLL_CONCURRENCY > 1:
+        from homework_bot.engine import run_cycle
+
+        results = run_cycle(
+            poll_tenants_async(outbound, tenants, states),
+            POLL_CONCURRENCY,
+        )
+    else:
+        results = poll_tenants_sequentially(outbound, tenants, states)
+    changes = []
+    overruns = {DeadlineExceeded: 0, BudgetExceeded: 0}
+    for result in results:
+        if type(result) in overruns:
+            overruns[type(result)] += 1
+            OVERRUNS.inc(type=type(result).__name__)
+            result = None if isinstance(result, BudgetExceeded) else 0
+        elif isinstance(result, Exception):
+            logger.error('Не удалось опросить студента: %s', result)
+            ERRORS.inc(type=type(result).__name__)
+            result = 0
+        changes.append(result)
+    if any(overruns.values()):
+        logger.warning(
+            'Опросов дольше %s с: %s, отложено до следующего цикла: %s',
+            POLL_DEADLINE, overruns[DeadlineExceeded],
+            overruns[BudgetExceeded],
+        )
+    return changes
+
+
+def poll_due(outbound, registry, states, scheduler):
+    """Poll students whose time has come and plan their next polls.
+
+    Students left over by CYCLE_BUDGET keep their turn and are polled
+    first in the next cycle.
+
+    Args:
+        outbound: Outbox or OutboundQueue of messages.
+        registry: dict of polled students by id.
+        states: TenantState by tenant id.
+        scheduler: Scheduler of the polls.
+    """
+    tenants = [registry[tenant_id] for tenant_id in scheduler.pop_due()]
+    changes = poll_tenants(outbound, tenants, states)
+    for tenant, changed in zip(tenants, changes):
+        if changed is None:
+            scheduler.restore(tenant.id)
+        else:
+            scheduler.reschedule(
+                tenant.id, states[tenant.id].statuses, changed,
+            )
+
+
+def load_states(store, tenants):
+    """Restore states of students saved before the restart.
+
+    Error notices sent before the restart keep suppressing repeats.
+
+    Args:
+        store: StateStore.
+        tenants: polled students.
+
+    Returns:
+        dict of TenantState by tenant id, new students start from now.
+    """
+    states = store.load([tenant.id for tenant in tenants])
     timestamp = int(time.time())
-    current_status = ''
-    current_error = ''
-    response = get_api_answer(timestamp)
+    for tenant in tenants:
+        state = states.setdefault(tenant.id, TenantState(timestamp))
+        if state.error:
+            error_notices.seed(
+                (tenant.id, state.error), state.error_sent,
+                state.error_repeats,
+            )
+    return states
 
+
+def save_states(store, states):
+    """Persist states of students once per cycle.
+
+    Args:
+        store: StateStore, or Outbox saving its new messages along.
+        states: dict of TenantState by tenant id.
+    """
+    try:
+        store.save(states)
+    except Exception as error:
+        logger.exception('Не удалось сохранить состояние: %s', error)
+
+
+def acknowledge_outbox(outbox):
+    """Acknowledge sent messages of the outbox and count them.
+
+    Args:
+        outbox: Outbox of status messages.
+
+    Returns:
+        False when the store could not be updated.
+    """
+    try:
+        delivered, retried, dropped = outbox.acknowledge()
+    except Exception as error:
+        logger.exception('Не удалось отметить доставку: %s', error)
+        return False
+    OUTBOX_MESSAGES.inc(delivered, result='delivered')
+    OUTBOX_MESSAGES.inc(retried, result='retried')
+    OUTBOX_MESSAGES.inc(dropped, result='dropped')
+    if retried:
+        logger.warning('Сообщений отложено для повторной отправки: %s',
+                       retried)
+    if dropped:
+        logger.error('Сообщений не доставлено после всех попыток: %s',
+                     dropped)
+    return True
+
+
+def deliver_outbox(outbox, outbound):
+    """Send due messages of the outbox batch by batch and wait for them.
+
+    Every batch is waited for up to FLUSH_TIMEOUT and acknowledged
+    before the next one is taken. Used before exiting with RUN_ONCE,
+    otherwise the outbox is delivered by run_delivery().
+
+    Args:
+        outbox: Outbox of status messages.
+        outbound: OutboundQueue sending them.
+    """
     while True:
-        homework = check_response(response)
+        taken = outbox.take()
+        flushed = outbound.flush(FLUSH_TIMEOUT)
+        if not acknowledge_outbox(outbox):
+            return
+        if taken < outbox.batch_size or not flushed:
+            return
+
+
+def run_delivery(outbox, stop):
+    """Deliver the outbox until stop is set.
+
+    Runs in its own thread, so polls never wait for Telegram: due
+    messages are handed to the OutboundQueue while fewer than a batch
+    are being sent, and acknowledged as soon as they are sent.
+
+    Args:
+        outbox: Outbox of status messages.
+        stop: threading.Event stopping the delivery.
+    """
+    while not stop.is_set():
+        outbox.wakeup.clear()
+        acknowledge_outbox(outbox)
         try:
-            if homework:
-                homework_status = parse_status(homework[0])
-                if current_status == homework_status:
-                    logger.debug(homework_status)
-                else:
-                    current_status = homework_status
-                    send_message(bot, homework_status)
-            else:
-                send_message(bot, 'Статус не обновлён.')
-                logger.debug('Статус не обновлен')
+            outbox.take()
         except Exception as error:
-            message = f'Сбой в работе программы: {error}'
-            logger.exception(message)
-            if current_error != str(error):
-                current_error = str(error)
-                send_message(bot, message)
-        finally:
-            time.sleep(RETRY_PERIOD)
+            logger.exception('Не удалось прочитать исходящие: %s', error)
+            outbox.wakeup.wait(outbox.backoff)
+            continue
+        outbox.wakeup.wait(outbox.pause(RETRY_PERIOD))
+
+
+def start_delivery(outbox):
+    """Start run_delivery() in a daemon thread.
+
+    Args:
+        outbox: Outbox of status messages.
+
+    Returns:
+        function stopping the delivery.
+    """
+    stop = threading.Event()
+    threading.Thread(
+        target=run_delivery, args=(outbox, stop), name='outbox', daemon=True,
+    ).start()
+
+    def stop_delivery():
+        stop.set()
+        outbox.wakeup.set()
+
+    return stop_delivery
+
+
+def main():
+    """Launch main function.
+
+    With RUN_ONCE every student is polled a single time, with the
+    first polls spread like after any start, messages are sent and
+    the state is saved before returning, so the bot can be started by
+    cron or a serverless scheduler. Settings and the
+    registry are reloaded on SIGHUP or when TENANTS_FILE or ENV_FILE
+    changes.
+    """
+    check_tokens()
+
+    import telegram
+
+    bot = telegram.Bot(token=TELEGRAM_TOKEN)
+
+    everyone = read_registry()
+    tenants = load_registry(everyone)
+    if TENANTS_FILE:
+        open_api_session()
+    open_api_traffic()
+    open_tracing()
+    store = open_store(STATE_STORE)
+    states = load_states(store, tenants)
+    registry = {tenant.id: tenant for tenant in tenants}
+    scheduler = Scheduler(
+        RETRY_PERIOD, MIN_RETRY_PERIOD, MAX_RETRY_PERIOD,
+        backoff=RETRY_BACKOFF, jitter=RETRY_JITTER,
+    )
+    for tenant in tenants:
+        scheduler.add(tenant.id, spread=not RUN_ONCE)
+    logger.debug('Отслеживаем студентов: %s', len(tenants))
+
+    outbound = OutboundQueue(GLOBAL_RATE / max(len(SHARDS), 1))
+    outbox = Outbox(
+        store, outbound, registry if SHARD is not None else None,
+        window=DIGEST_WINDOW, group_by=DIGEST_BY,
+    )
+    route_chats(outbox, everyone)
+    outbound.start(
+        lambda message: send_message(bot, message), SEND_WORKERS, outbox.done,
+    )
+    TENANTS.set(len(tenants))
+    QUEUE_DEPTH.set_function(lambda: len(outbound))
+    if METRICS_PORT:
+        shard_index = SHARDS.index(SHARD) if SHARD is not None else 0
+        start_metrics_server(METRICS, METRICS_PORT + shard_index)
+    watcher = FileWatcher([path for path in (TENANTS_FILE, ENV_FILE) if path])
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, reload_signal.handle)
+    if not RUN_ONCE:
+        start_delivery(outbox)
+
+    while True:
+        if reload_signal.pop() | watcher.changed():
+            reload_config(registry, states, store, scheduler, outbox)
+        poll_due(outbox, registry, states, scheduler)
+        save_states(outbox, states)
+        if RUN_ONCE and not scheduler.unpolled:
+            deliver_outbox(outbox, outbound)
+            outbound.close(FLUSH_TIMEOUT)
+            return
+        pause = scheduler.pause(RETRY_PERIOD)
+        if reload_signal.wait(pause):
+            logger.debug('Получен SIGHUP')
+
+
+def run_worker(shard, shards):
+    """Run main() in a worker process for one shard of students.
+
+    The process of a worker exits without atexit handlers, so the log
+    queue is written out here.
+
+    Args:
+        shard: name of the shard of this worker.
+        shards: names of all shards.
+    """
+    global SHARD, SHARDS
+    SHARD, SHARDS = shard, tuple(shards)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    logger.debug('Запущен обработчик %s', shard)
+    try:
+        main()
+    finally:
+        if tracer is not None:
+            tracer.close()
+        log_writer.close()
+
+
+def supervise():
+    """Split students between WORKERS processes and keep them running.
+
+    Students are assigned to workers by consistent hashing of their
+    ids, so a restarted worker gets the same students, and changing
+    the number of workers moves only a part of them. The Telegram
+    rate limit of the bot is divided between the workers. SIGHUP is
+    passed on to the workers. The bot exits with code 1 if a worker
+    kept crashing right after its start and was given up.
+    """
+    check_tokens()
+    supervisor = Supervisor(
+        [f'worker-{index}' for index in range(WORKERS)], run_worker,
+    )
+
+    def stop(signum, frame):
+        supervisor.stopping = True
+
+    def restarted(shard, exitcode):
+        logger.error(
+            'Обработчик %s завершился с кодом %s и перезапущен',
+            shard, exitcode,
+        )
+
+    def given_up(shard, exitcode):
+        logger.critical(
+            'Обработчик %s падает сразу после запуска (код %s), '
+            'перезапуски прекращены',
+            shard, exitcode,
+        )
+
+    signal.signal(signal.SIGTERM, stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(
+            signal.SIGHUP,
+            lambda signum, frame: supervisor.send_signal(signum),
+        )
+    try:
+        supervisor.run(on_restart=restarted, on_give_up=given_up)
+    finally:
+        supervisor.stop()
+    if supervisor.failed:
+        sys.exit(1)
+
+
+def parse_args(argv=None):
+    """Parse command line.
+
+    Args:
+        argv: arguments, sys.argv by default.
+
+    Returns:
+        argparse.Namespace.
+    """
+    parser = argparse.ArgumentParser(
+        description='Telegram bot notifying about homework reviews.',
+    )
+    parser.add_argument(
+        '--once', action='store_true',
+        help='poll every student once, send messages and exit',
+    )
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
-    main()
+    RUN_ONCE = parse_args().once
+    if WORKERS > 1:
+        supervise()
+    else:
+        main()
@@ -0,0 +1 @@
+"""Building blocks of the homework bot shared by all polled students."""
@@ -0,0 +1,80 @@
+"""Circuit breaker shared by the polls of all students."""
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """The call was refused because the breaker is open."""
+
+
+class CircuitBreaker:
+    """Stop calling an endpoint after it failed several times in a row.
+
+    Closed: every call goes through and consecutive failures are
+    counted. Open: calls are refused until reset_timeout has passed.
+    Half-open: a single probe call goes through, its success closes
+    the breaker and its failure opens it again.
+    """
+
+    def __init__(self, threshold, reset_timeout, clock=time.monotonic):
+        """Create a closed breaker.
+
+        Args:
+            threshold: consecutive failures that open the breaker.
+            reset_timeout: seconds the breaker stays open before a probe.
+            clock: monotonic clock in seconds.
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Decide whether a call may go through.
+
+        Returns:
+            True for every call while closed and for one probe call
+            once the open breaker has waited reset_timeout.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self.probing = False
+            if self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def record(self, success):
+        """Record the result of an allowed call.
+
+        Args:
+            success: whether the endpoint answered properly.
+
+        Returns:
+            new state when the call changed it, otherwise None.
+        """
+        with self.lock:
+            previous = self.state
+            if success:
+                self.failures = 0
+                self.state = CLOSED
+            else:
+                self.failures += 1
+                if self.state == HALF_OPEN or self.failures >= self.threshold:
+                    self.state = OPEN
+                    self.opened_at = self.clock()
+            self.probing = False
+            return self.state if self.state != previous else None
@@ -0,0 +1,44 @@
+"""Time limits of polls and of whole polling cycles."""
+import math
+import time
+
+
+class DeadlineExceeded(Exception):
+    """A poll did not finish within its deadline."""
+
+
+class BudgetExceeded(Exception):
+    """The cycle ran out of time before an item was done."""
+
+
+class Budget:
+    """Time left for a cycle."""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        """Start the budget.
+
+        Args:
+            seconds: length of the budget, 0 or None for no limit.
+            clock: monotonic clock in seconds.
+        """
+        self.seconds = seconds or None
+        self.clock = clock
+        self.ends = clock() + seconds if seconds else math.inf
+
+    def remaining(self):
+        """Return seconds left, never negative.
+
+        Returns:
+            float, None for an unlimited budget.
+        """
+        if self.seconds is None:
+            return None
+        return max(self.ends - self.clock(), 0)
+
+    def expired(self):
+        """Check the budget.
+
+        Returns:
+            True when no time is left.
+        """
+        return self.clock() >= self.ends
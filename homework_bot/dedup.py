@@ -0,0 +1,109 @@
+"""Bounded cache of recently sent error notices."""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+VOLATILE = re.compile(r'0x[0-9a-fA-F]+|\d+')
+
+
+def error_class(error):
+    """Return the class of an error for deduplication.
+
+    Numbers in the text, such as status codes, ports or object
+    addresses, are dropped: a 502 and a 503 of the same request are
+    the same failure for the user.
+
+    Args:
+        error: raised exception.
+
+    Returns:
+        str naming the error.
+    """
+    return '{}: {}'.format(
+        type(error).__name__, VOLATILE.sub('#', str(error)),
+    )
+
+
+class DedupCache:
+    """Remember sent notices for ttl seconds, at most max_size of them.
+
+    Every key holds the time its notice was sent and the number of
+    repeats suppressed since. The least recently seen key is evicted
+    when the cache is full, so memory does not grow with the number
+    of students or distinct errors. Times are taken from the wall
+    clock, so notices saved before a restart can be seeded back.
+    """
+
+    def __init__(self, ttl, max_size, clock=time.time):
+        """Create an empty cache.
+
+        Args:
+            ttl: seconds a notice suppresses its repeats.
+            max_size: maximum number of remembered keys.
+            clock: wall clock in seconds.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Return number of remembered keys."""
+        return len(self.entries)
+
+    def check(self, key):
+        """Register an occurrence of key.
+
+        Args:
+            key: hashable key of the notice.
+
+        Returns:
+            None when a notice for key was sent less than ttl ago,
+            otherwise the number of repeats suppressed since the
+            previous notice, which should be sent now.
+        """
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                if now - entry[0] < self.ttl:
+                    entry[1] += 1
+                    return None
+                repeats = entry[1]
+                entry[:] = [now, 0]
+                return repeats
+            self.entries[key] = [now, 0]
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            return 0
+
+    def seed(self, key, sent, repeats=0):
+        """Remember a notice sent before the cache was created.
+
+        Args:
+            key: hashable key of the notice.
+            sent: time the notice was sent.
+            repeats: repeats suppressed since.
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = [sent, repeats]
+                if len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+
+    def pop(self, key):
+        """Forget a notice.
+
+        Args:
+            key: hashable key of the notice.
+
+        Returns:
+            number of repeats suppressed since the notice,
+            None when the key was not remembered.
+        """
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        return None if entry is None else entry[1]
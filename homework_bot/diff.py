@@ -0,0 +1,35 @@
+"""Detect homeworks whose status changed since the previous poll."""
+
+
+def homework_key(homework):
+    """Return the key a homework is tracked by.
+
+    Args:
+        homework: homework from the API answer.
+
+    Returns:
+        str id of the homework, or its name when there is no id.
+    """
+    return str(homework.get('id', homework.get('homework_name')))
+
+
+def diff_statuses(known, homeworks):
+    """Find homeworks with a raw status different from the known one.
+
+    The whole list is compared in one pass without formatting messages.
+    known is not modified: the caller commits new statuses after
+    the changes are handled.
+
+    Args:
+        known: dict of last seen status by homework key.
+        homeworks: homeworks from the API answer.
+
+    Returns:
+        list of (key, homework) pairs for changed homeworks.
+    """
+    changed = []
+    for homework in homeworks:
+        key = homework_key(homework)
+        if known.get(key) != homework.get('status'):
+            changed.append((key, homework))
+    return changed
@@ -0,0 +1,88 @@
+"""Asyncio helpers to poll many tenants concurrently."""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from homework_bot.deadline import BudgetExceeded
+
+
+async def run_bounded(func, items, concurrency, budget=None):
+    """Await func(item) for every item with limited concurrency.
+
+    Items still running or waiting when the budget runs out are
+    cancelled and get BudgetExceeded as their result.
+
+    Args:
+        func: coroutine function of one argument.
+        items: iterable of arguments.
+        concurrency: maximum number of coroutines awaited at once.
+        budget: seconds for all items, None for no limit.
+
+    Returns:
+        list of results or exceptions in the order of items.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    if not tasks:
+        return []
+    _, pending = await asyncio.wait(tasks, timeout=budget)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    return [
+        BudgetExceeded(f'Не хватило {budget} с на цикл') if task in pending
+        else task.exception() or task.result()
+        for task in tasks
+    ]
+
+
+async def in_thread(func, *args):
+    """Run blocking func in the default executor of the running loop.
+
+    func runs in a copy of the current context, so context variables
+    such as the current tracing span reach the thread.
+
+    Args:
+        func: blocking callable.
+        *args: arguments of func.
+
+    Returns:
+        result of func.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        None, functools.partial(context.run, func, *args),
+    )
+
+
+def run_cycle(coroutine, concurrency):
+    """Run one polling cycle in a fresh event loop.
+
+    Blocking calls made through in_thread use a thread pool
+    of the same size as the concurrency limit. The cycle does not wait
+    for calls abandoned by cancelled coroutines: their threads finish
+    in the background and queued calls are dropped.
+
+    Args:
+        coroutine: coroutine of the cycle.
+        concurrency: size of the thread pool.
+
+    Returns:
+        result of the coroutine.
+    """
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(executor)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
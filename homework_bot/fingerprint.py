@@ -0,0 +1,28 @@
+"""Fingerprints of raw API answers to skip decoding unchanged ones."""
+import hashlib
+import re
+
+CURRENT_DATE = re.compile(rb'"current_date"\s*:\s*(\d+)')
+
+
+def fingerprint(body):
+    """Hash a raw answer leaving out its current_date.
+
+    current_date is the server time and differs in every answer,
+    so it would make every fingerprint unique.
+
+    Args:
+        body: raw answer bytes.
+
+    Returns:
+        (digest, current_date), current_date is None when not found.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    match = CURRENT_DATE.search(body)
+    if match is None:
+        digest.update(body)
+        return digest.digest(), None
+    view = memoryview(body)
+    digest.update(view[:match.start()])
+    digest.update(view[match.end():])
+    return digest.digest(), int(match.group(1))
@@ -0,0 +1,181 @@
+"""Logging through a bounded queue drained by a background thread."""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+DROP = 'drop'
+SAMPLE = 'sample'
+POLICIES = (DROP, SAMPLE)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Put records into a bounded queue without ever blocking.
+
+    With the drop policy records are dropped while the queue is full.
+    With the sample policy, once the queue is half full, only every
+    sample_rate-th record below WARNING is queued. The number of dropped
+    records is logged as soon as the queue has room again.
+    Tracebacks are formatted by the writer thread, not by the caller.
+    """
+
+    def __init__(self, size, policy=DROP, sample_rate=10):
+        """Create handler with its queue.
+
+        Args:
+            size: maximum number of queued records.
+            policy: DROP or SAMPLE.
+            sample_rate: every sample_rate-th record is kept by SAMPLE.
+
+        Raises:
+            ValueError: when the policy is unknown.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f'Неизвестная политика очереди логов {policy}')
+        super().__init__(queue.Queue(size))
+        self.size = size
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.sampled = 0
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Merge message and arguments, keep exc_info for the writer.
+
+        Args:
+            record: LogRecord.
+
+        Returns:
+            copy of the record.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def emit(self, record):
+        """Queue a record unless the policy drops it.
+
+        Args:
+            record: LogRecord.
+        """
+        if self.skip(record):
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            summary = logging.makeLogRecord({
+                'name': record.name,
+                'levelno': logging.WARNING,
+                'levelname': logging.getLevelName(logging.WARNING),
+                'msg': f'Пропущено сообщений лога: {dropped}',
+            })
+            if not self.put(summary):
+                self.dropped += dropped
+        try:
+            prepared = self.prepare(record)
+        except Exception:
+            self.handleError(record)
+            return
+        if not self.put(prepared):
+            self.dropped += 1
+
+    def skip(self, record):
+        """Decide whether the sample policy drops a record.
+
+        Args:
+            record: LogRecord.
+
+        Returns:
+            True when the record must not be queued.
+        """
+        if self.policy != SAMPLE or record.levelno >= logging.WARNING:
+            return False
+        if self.queue.qsize() * 2 < self.size:
+            return False
+        self.sampled += 1
+        return self.sampled % self.sample_rate != 0
+
+    def put(self, record):
+        """Put a record without blocking.
+
+        Args:
+            record: LogRecord.
+
+        Returns:
+            False when the queue is full.
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            return False
+        return True
+
+
+class LogWriter(QueueListener):
+    """Thread writing queued records to the real handlers."""
+
+    def enqueue_sentinel(self):
+        """Wait for room in the queue to stop the thread."""
+        self.queue.put(self._sentinel)
+
+    def close(self):
+        """Write the queued records and stop the thread if it runs."""
+        if self._thread is not None:
+            self.stop()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as a single line of json."""
+
+    def format(self, record):
+        """Format a record.
+
+        Args:
+            record: LogRecord.
+
+        Returns:
+            json object with time, level, logger, message and, for
+            exceptions, the traceback.
+        """
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def queue_logging(logger, handler, size, policy=DROP):
+    """Send records of a logger to handler through a bounded queue.
+
+    The writer thread is started again in forked children and drains
+    the queue at exit.
+
+    Args:
+        logger: Logger.
+        handler: Handler doing the blocking output.
+        size: maximum number of queued records.
+        policy: DROP or SAMPLE.
+
+    Returns:
+        (BoundedQueueHandler, LogWriter).
+    """
+    queue_handler = BoundedQueueHandler(size, policy)
+    writer = LogWriter(queue_handler.queue, handler)
+    logger.addHandler(queue_handler)
+    writer.start()
+
+    def restart():
+        queue_handler.queue = writer.queue = queue.Queue(size)
+        writer.start()
+
+    os.register_at_fork(after_in_child=restart)
+    atexit.register(writer.close)
+    return queue_handler, writer
@@ -0,0 +1,305 @@
+"""Metrics in the Prometheus text format and an HTTP endpoint for them."""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf,
+)
+
+
+class Metric:
+    """Named metric with labeled series."""
+
+    kind = 'untyped'
+
+    def __init__(self, registry, name, documentation, labels=()):
+        """Create metric and add it to the registry.
+
+        Args:
+            registry: Registry the metric is exported from.
+            name: metric name.
+            documentation: HELP text.
+            labels: names of the labels.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def key(self, labels):
+        """Return series key for label values.
+
+        Args:
+            labels: dict of label values.
+
+        Returns:
+            tuple of label values in the order of label names.
+        """
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def format_labels(self, key, extra=()):
+        """Format label pairs of a series.
+
+        Args:
+            key: series key.
+            extra: additional (name, value) pairs.
+
+        Returns:
+            '{name="value",...}' or empty string.
+        """
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(
+            '{}="{}"'.format(name, escape(value))
+            for name, value in pairs
+        ) + '}'
+
+    def samples(self):
+        """Yield (suffix, labels, value) of every sample.
+
+        Yields:
+            samples of the metric.
+        """
+        with self.lock:
+            series = dict(self.series)
+        for key, value in series.items():
+            yield '', self.format_labels(key), value
+
+    def render(self):
+        """Render the metric in the Prometheus text format.
+
+        Returns:
+            list of lines.
+        """
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically growing count."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter.
+
+        Args:
+            amount: increment.
+            **labels: label values.
+        """
+        key = self.key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        """Set the value.
+
+        Args:
+            value: new value.
+            **labels: label values.
+        """
+        with self.lock:
+            self.series[self.key(labels)] = value
+
+    def set_function(self, func):
+        """Read the unlabeled value from func on every scrape.
+
+        Args:
+            func: callable without arguments returning a number.
+        """
+        with self.lock:
+            self.series[()] = func
+
+    def samples(self):
+        """Yield (suffix, labels, value) of every sample.
+
+        Yields:
+            samples of the metric.
+        """
+        for suffix, labels, value in super().samples():
+            yield suffix, labels, value() if callable(value) else value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        """Create histogram and add it to the registry.
+
+        Args:
+            registry: Registry the metric is exported from.
+            name: metric name.
+            documentation: HELP text.
+            labels: names of the labels.
+            buckets: sorted upper bounds, the last one is infinity.
+        """
+        super().__init__(registry, name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        """Record an observation.
+
+        Args:
+            value: observed value.
+            **labels: label values.
+        """
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.series.get(
+                key, ([0] * len(self.buckets), 0),
+            )
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self.series[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block in seconds.
+
+        Args:
+            **labels: label values.
+
+        Yields:
+            None.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        """Yield (suffix, labels, value) of every sample.
+
+        Yields:
+            samples of the metric.
+        """
+        with self.lock:
+            series = {
+                key: (list(counts), total)
+                for key, (counts, total) in self.series.items()
+            }
+        for key, (counts, total) in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = self.format_labels(key, [('le', format_value(bound))])
+                yield '_bucket', labels, cumulative
+            yield '_sum', self.format_labels(key), total
+            yield '_count', self.format_labels(key), cumulative
+
+
+class Registry:
+    """Collection of exported metrics."""
+
+    def __init__(self):
+        """Create an empty registry."""
+        self.metrics = []
+
+    def register(self, metric):
+        """Add a metric.
+
+        Args:
+            metric: Metric.
+        """
+        self.metrics.append(metric)
+
+    def render(self):
+        """Render all metrics in the Prometheus text format.
+
+        Returns:
+            str exposition.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    """Escape a label value.
+
+    Args:
+        value: str value.
+
+    Returns:
+        value with escaped backslashes, quotes and newlines.
+    """
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+def format_value(value):
+    """Format a sample value.
+
+    Args:
+        value: number.
+
+    Returns:
+        str value, infinity as +Inf.
+    """
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+def start_metrics_server(registry, port, host='0.0.0.0'):
+    """Serve metrics on http://host:port/metrics in a daemon thread.
+
+    Args:
+        registry: Registry to export.
+        port: TCP port.
+        host: interface to listen on.
+
+    Returns:
+        running ThreadingHTTPServer.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            """Answer with the metrics exposition."""
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header(
+                'Content-Type', 'text/plain; version=0.0.4; charset=utf-8',
+            )
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            """Do not log scrapes."""
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,32 @@
+"""Shared objects of homework statuses kept in tenant states."""
+import enum
+import sys
+
+
+class Status(str, enum.Enum):
+    """Known homework statuses, shared by every state that holds them."""
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+    REVIEWING = 'reviewing'
+    APPROVED = 'approved'
+    REJECTED = 'rejected'
+
+
+STATUSES = {status.value: status for status in Status}
+
+
+def intern_status(status):
+    """Return the shared object of a status.
+
+    Args:
+        status: status from the API or the store.
+
+    Returns:
+        Status member, an interned str for unknown statuses,
+        the value itself when it is not a str.
+    """
+    if not isinstance(status, str):
+        return status
+    return STATUSES.get(status) or sys.intern(str(status))
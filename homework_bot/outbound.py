@@ -0,0 +1,243 @@
+"""Rate-limited queue of outgoing Telegram messages."""
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from homework_bot.ratelimit import TokenBucket
+
+STATUS_PRIORITY = 0
+ERROR_PRIORITY = 1
+
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+MAX_RETRIES = 5
+MAX_IDLE_BUCKETS = 1000
+
+
+class SendMessageError(Exception):
+    """Telegram did not accept a message."""
+
+    def __init__(self, error, retry_after=None):
+        """Create error.
+
+        Args:
+            error: original error.
+            retry_after: seconds Telegram asked to wait, if any.
+        """
+        super().__init__(error)
+        self.retry_after = retry_after
+
+
+class OutboundQueue:
+    """Queue of messages drained by background workers.
+
+    Messages leave in priority order: status changes go before error
+    notices. Telegram limits are kept with token buckets: one for the
+    whole bot and one per chat. A chat that got a 429 answer is held
+    for retry_after seconds and its message is queued again.
+    put() never blocks, so pollers never wait for Telegram.
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE,
+                 clock=time.monotonic):
+        """Create an empty queue.
+
+        Args:
+            global_rate: messages per second for the whole bot.
+            chat_rate: messages per second for one chat.
+            clock: monotonic clock in seconds.
+        """
+        self.clock = clock
+        self.chat_rate = chat_rate
+        self.global_bucket = TokenBucket(global_rate, global_rate, clock())
+        self.chat_buckets = {}
+        self.heap = []
+        self.counter = itertools.count()
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.workers = []
+        self.closed = False
+        self.done = None
+
+    def __len__(self):
+        """Return number of messages waiting to be sent."""
+        return len(self.heap) + self.in_flight
+
+    def put(self, message, priority=STATUS_PRIORITY):
+        """Queue a message.
+
+        Args:
+            message: ChatMessage.
+            priority: STATUS_PRIORITY or ERROR_PRIORITY.
+        """
+        with self.condition:
+            heapq.heappush(
+                self.heap, (priority, next(self.counter), 0, message),
+            )
+            self.condition.notify()
+
+    def start(self, sender, workers=1, done=None):
+        """Start background workers draining the queue.
+
+        Args:
+            sender: callable sending one message, raises SendMessageError.
+            workers: number of worker threads.
+            done: callable(message, error) called once a message is sent,
+                with error None, or given up.
+        """
+        self.done = done
+        for _ in range(workers):
+            worker = threading.Thread(
+                target=self.drain, args=(sender,), daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def flush(self, timeout):
+        """Wait until the queue is empty.
+
+        Args:
+            timeout: longest wait in seconds.
+
+        Returns:
+            True when every message was handled.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not len(self), timeout)
+
+    def close(self, timeout):
+        """Flush the queue and stop the workers.
+
+        Args:
+            timeout: longest wait for the flush in seconds.
+        """
+        self.flush(timeout)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def drain(self, sender):
+        """Send messages until the queue is closed.
+
+        Args:
+            sender: callable sending one message.
+        """
+        while True:
+            entry = self.take()
+            if entry is None:
+                return
+            self.send(sender, entry)
+
+    def take(self):
+        """Wait for a message that may be sent now.
+
+        Returns:
+            queue entry, or None when the queue is closed.
+        """
+        with self.condition:
+            while not self.closed:
+                now = self.clock()
+                entry, wait = self.pop_ready(now)
+                if entry is not None:
+                    self.global_bucket.take(now)
+                    self.bucket(entry[3].chat_id, now).take(now)
+                    self.in_flight += 1
+                    return entry
+                self.condition.wait(None if wait == math.inf else wait)
+            return None
+
+    def pop_ready(self, now):
+        """Pop the most important message allowed by rate limits.
+
+        Args:
+            now: current monotonic time.
+
+        Returns:
+            (entry, 0) or (None, seconds to wait).
+        """
+        wait = self.global_bucket.delay(now)
+        if wait or not self.heap:
+            return None, wait if self.heap else math.inf
+        skipped = []
+        entry = None
+        wait = math.inf
+        while self.heap:
+            candidate = heapq.heappop(self.heap)
+            delay = self.bucket(candidate[3].chat_id, now).delay(now)
+            if not delay:
+                entry = candidate
+                break
+            wait = min(wait, delay)
+            skipped.append(candidate)
+        for candidate in skipped:
+            heapq.heappush(self.heap, candidate)
+        return entry, 0 if entry else wait
+
+    def send(self, sender, entry):
+        """Send one message and queue it again on flood control.
+
+        The done callback is called before the message stops counting
+        as queued, so flush() returns only after it.
+
+        Args:
+            sender: callable sending one message.
+            entry: queue entry.
+        """
+        priority, order, retries, message = entry
+        error = None
+        requeued = False
+        try:
+            sender(message)
+        except SendMessageError as send_error:
+            error = send_error
+            if error.retry_after is not None and retries < MAX_RETRIES:
+                with self.condition:
+                    now = self.clock()
+                    self.bucket(message.chat_id, now).block(
+                        error.retry_after, now,
+                    )
+                    heapq.heappush(
+                        self.heap, (priority, order, retries + 1, message),
+                    )
+                requeued = True
+        except Exception as send_error:
+            # The sender logs its own failures, the worker keeps going.
+            error = send_error
+        finally:
+            if self.done is not None and not requeued:
+                self.done(message, error)
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+
+    def bucket(self, chat_id, now):
+        """Return the rate limiter of a chat.
+
+        Args:
+            chat_id: Telegram chat id.
+            now: current monotonic time.
+
+        Returns:
+            TokenBucket of the chat.
+        """
+        if chat_id not in self.chat_buckets:
+            if len(self.chat_buckets) >= MAX_IDLE_BUCKETS:
+                self.prune(now)
+            self.chat_buckets[chat_id] = TokenBucket(
+                self.chat_rate, 1, now,
+            )
+        return self.chat_buckets[chat_id]
+
+    def prune(self, now):
+        """Forget rate limiters of chats that are idle.
+
+        Args:
+            now: current monotonic time.
+        """
+        self.chat_buckets = {
+            chat_id: bucket
+            for chat_id, bucket in self.chat_buckets.items()
+            if not bucket.is_idle(now)
+        }
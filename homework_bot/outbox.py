@@ -0,0 +1,326 @@
+"""Durable outbox of status messages kept in the state store."""
+import math
+import threading
+import time
+
+from homework_bot.outbound import STATUS_PRIORITY
+from homework_bot.tenants import ChatMessage
+
+BATCH_SIZE = 100
+BACKOFF = 5
+MAX_BACKOFF = 3600
+MAX_ATTEMPTS = 10
+MESSAGE_LIMIT = 4096
+SHARED_PERIOD = 5
+
+BY_CHAT = 'chat'
+BY_TENANT = 'tenant'
+GROUPINGS = (BY_CHAT, BY_TENANT)
+
+
+class Outbox:
+    """Status messages saved with the states and delivered from the store.
+
+    Polls put messages here instead of the OutboundQueue. They are
+    written to the store in the same transaction as the new statuses,
+    so a status is never saved without its message. Saved messages are
+    handed to the OutboundQueue, at most batch_size of them at a time,
+    and removed from the store once sent; a failed message is retried
+    with exponential backoff and dropped after max_attempts. Delivery
+    may run in its own thread: wakeup is set when there is something
+    to take or acknowledge. A pending message is stored once per
+    (student, chat, homework, status), so the same change detected
+    again before delivery is not sent twice. Messages without a key,
+    such as error notices, go straight to the OutboundQueue.
+
+    With a window, messages of a chat (or of a student in a chat) are
+    held until window seconds after the first of them and then sent
+    as one digest; of several statuses of a homework only the last one
+    is sent. Without a window, messages due at once to a shared chat,
+    such as a mentor's chat, are still sent as one digest. When chats
+    is set, a shared chat is delivered only by the process owning it,
+    whichever process saved its messages.
+    """
+
+    def __init__(self, store, outbound, owned=None, batch_size=BATCH_SIZE,
+                 backoff=BACKOFF, max_backoff=MAX_BACKOFF,
+                 max_attempts=MAX_ATTEMPTS, window=0, group_by=BY_CHAT,
+                 clock=time.time):
+        """Create outbox.
+
+        Args:
+            store: StateStore keeping the messages.
+            outbound: OutboundQueue sending them.
+            owned: container of tenant ids delivered by this process,
+                None for every tenant.
+            batch_size: messages handed to the queue at once.
+            backoff: delay before the first retry in seconds.
+            max_backoff: longest delay between retries in seconds.
+            max_attempts: failed sends before a message is dropped.
+            window: seconds to collect a digest, 0 sends every message.
+            group_by: BY_CHAT or BY_TENANT, what a digest is made for.
+            clock: wall clock in seconds.
+
+        Raises:
+            ValueError: when group_by is unknown.
+        """
+        if group_by not in GROUPINGS:
+            raise ValueError(f'Неизвестная группировка сводок {group_by}')
+        self.store = store
+        self.outbound = outbound
+        self.owned = owned
+        self.batch_size = batch_size
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.window = window
+        self.group_by = group_by
+        self.shared = frozenset()
+        self.chats = None
+        self.clock = clock
+        self.new = []
+        self.windows = {}
+        self.retries = set()
+        self.in_flight = {}
+        self.sending = 0
+        self.digests = {}
+        self.results = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def put(self, message, priority=STATUS_PRIORITY):
+        """Keep a status message until save(), queue other messages.
+
+        Args:
+            message: ChatMessage.
+            priority: priority in the OutboundQueue.
+        """
+        if message.key is None:
+            self.outbound.put(message, priority)
+        else:
+            self.new.append(message)
+
+    def group(self, key):
+        """Return what messages are merged by.
+
+        Args:
+            key: (tenant id, chat id, homework, status) of a message.
+
+        Returns:
+            the key itself without a window, unless the chat is shared,
+            else the chat or the student in the chat.
+        """
+        if not self.window:
+            return key[1] if key[1] in self.shared else key
+        if self.group_by == BY_CHAT:
+            return key[1]
+        return key[:2]
+
+    def save(self, states):
+        """Save states with the new messages.
+
+        The messages are kept for the next save if this one fails.
+
+        Args:
+            states: dict of TenantState by tenant id.
+        """
+        now = self.clock()
+        with self.lock:
+            rows = [
+                (message.key, str(message), self.due(message.key, now))
+                for message in self.new
+            ]
+        self.store.save(states, rows)
+        self.new = []
+        if rows:
+            self.wakeup.set()
+
+    def due(self, key, now):
+        """Return when a new message is sent.
+
+        Args:
+            key: key of the message.
+            now: current time.
+
+        Returns:
+            now, or the end of the open window of its digest.
+        """
+        if not self.window:
+            return now
+        group = self.group(key)
+        ends = self.windows.get(group, 0)
+        if ends <= now:
+            ends = self.windows[group] = now + self.window
+        return ends
+
+    def take(self):
+        """Queue due messages until batch_size of them are being sent.
+
+        Returns:
+            number of queued messages.
+        """
+        now = self.clock()
+        with self.lock:
+            self.windows = {
+                group: ends
+                for group, ends in self.windows.items() if ends > now
+            }
+        room = self.batch_size - self.sending
+        if room <= 0:
+            return 0
+        taken = 0
+        for rows in self.collect(now, room).values():
+            attempts = {key: row_attempts for key, _, row_attempts in rows}
+            for text, keys in merge(rows):
+                for key in keys:
+                    self.in_flight[key] = attempts[key]
+                if len(keys) > 1:
+                    self.digests[keys[0]] = keys
+                self.outbound.put(
+                    ChatMessage(text, keys[0][1], keys[0]), STATUS_PRIORITY,
+                )
+                taken += 1
+        self.sending += taken
+        return taken
+
+    def collect(self, now, room):
+        """Collect due messages that are not being sent yet.
+
+        Args:
+            now: current time.
+            room: most digests, or messages without a window, to collect.
+
+        Returns:
+            dict of pending rows by what they are merged by.
+        """
+        groups = {}
+        for row in self.store.pending(now):
+            key = row[0]
+            if key in self.in_flight or not self.delivers(key):
+                continue
+            group = self.group(key)
+            if group not in groups and len(groups) >= room:
+                if not self.window:
+                    break
+                continue
+            groups.setdefault(group, []).append(row)
+        return groups
+
+    def delivers(self, key):
+        """Tell whether this process delivers a message.
+
+        Args:
+            key: (tenant id, chat id, homework, status) of a message.
+
+        Returns:
+            True for a shared chat among chats, or for an owned student
+            unless the chat is shared and delivered by another process.
+        """
+        if self.chats is not None and key[1] in self.shared:
+            return key[1] in self.chats
+        return self.owned is None or key[0] in self.owned
+
+    def done(self, message, error):
+        """Remember the result of a send, called by OutboundQueue.
+
+        Args:
+            message: ChatMessage.
+            error: exception of a failed send, None on success.
+        """
+        if message.key is not None:
+            with self.lock:
+                self.results[message.key] = error
+            self.wakeup.set()
+
+    def acknowledge(self):
+        """Remove sent messages from the store and reschedule failed ones.
+
+        Returns:
+            (delivered, retried, dropped) numbers of sent messages,
+            a digest counts once.
+        """
+        with self.lock:
+            results, self.results = self.results, {}
+        delivered = []
+        retried = []
+        counts = [0, 0, 0]
+        now = self.clock()
+        for message_key, error in results.items():
+            keys = self.digests.get(message_key, [message_key])
+            attempts = max(self.in_flight.get(key, 0) for key in keys) + 1
+            if error is None:
+                delivered.extend(keys)
+                counts[0] += 1
+            elif attempts >= self.max_attempts:
+                delivered.extend(keys)
+                counts[2] += 1
+            else:
+                delay = min(
+                    self.backoff * 2 ** (attempts - 1), self.max_backoff,
+                )
+                retried.extend((key, attempts, now + delay) for key in keys)
+                counts[1] += 1
+        try:
+            self.store.acknowledge(delivered, retried)
+        except Exception:
+            with self.lock:
+                self.results = {**results, **self.results}
+            raise
+        for message_key in results:
+            for key in self.digests.pop(message_key, [message_key]):
+                self.in_flight.pop(key, None)
+        self.sending = max(self.sending - len(results), 0)
+        with self.lock:
+            self.retries.update(due for _, _, due in retried)
+        return tuple(counts)
+
+    def pause(self, longest):
+        """Return how long to sleep until a digest or a retry is due.
+
+        A process delivering shared chats wakes every SHARED_PERIOD
+        seconds to take the messages other processes saved for them.
+
+        Args:
+            longest: upper bound of the pause.
+
+        Returns:
+            whole seconds to sleep.
+        """
+        now = self.clock()
+        with self.lock:
+            self.retries = {due for due in self.retries if due > now}
+            moments = [*self.windows.values(), *self.retries]
+        delay = min(moments, default=math.inf) - now
+        if self.chats:
+            delay = min(delay, SHARED_PERIOD)
+        return max(0, math.ceil(min(longest, delay)))
+
+
+def merge(rows, limit=MESSAGE_LIMIT):
+    """Merge pending messages of one digest.
+
+    Of several statuses of a homework only the last one is kept,
+    the superseded ones are delivered along with it without being sent.
+
+    Args:
+        rows: (key, text, attempts) in the order they were detected.
+        limit: longest message text.
+
+    Returns:
+        list of (text, keys): messages no longer than limit, unless a
+        single status is longer, with the keys of the rows they cover.
+    """
+    latest = {}
+    for key, text, _ in rows:
+        homework = key[:3]
+        superseded = latest.pop(homework, (None, []))[1]
+        latest[homework] = (text, superseded + [key])
+    messages = []
+    for text, keys in latest.values():
+        keys = keys[::-1]
+        if messages and len(messages[-1][0]) + 1 + len(text) <= limit:
+            last_text, last_keys = messages[-1]
+            messages[-1] = (f'{last_text}\n{text}', last_keys + keys)
+        else:
+            messages.append((text, keys))
+    return messages
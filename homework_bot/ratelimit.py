@@ -0,0 +1,76 @@
+"""Token bucket rate limiter."""
+
+
+class TokenBucket:
+    """Allow rate events per second with bursts of up to capacity."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate, capacity, now):
+        """Create a full bucket.
+
+        Args:
+            rate: tokens added per second.
+            capacity: maximum number of tokens.
+            now: current monotonic time.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = now
+
+    def refill(self, now):
+        """Add tokens accumulated since the last update.
+
+        Args:
+            now: current monotonic time.
+        """
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate,
+        )
+        self.updated = now
+
+    def delay(self, now):
+        """Return seconds until a token is available.
+
+        Args:
+            now: current monotonic time.
+
+        Returns:
+            0 when a token can be taken right now.
+        """
+        self.refill(now)
+        wait = 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now, 0)
+
+    def take(self, now):
+        """Take one token.
+
+        Args:
+            now: current monotonic time.
+        """
+        self.refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds, now):
+        """Hold the bucket empty for some time, e.g. after a 429 answer.
+
+        Args:
+            seconds: how long to hold.
+            now: current monotonic time.
+        """
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def is_idle(self, now):
+        """Check the bucket is full and not blocked.
+
+        Args:
+            now: current monotonic time.
+
+        Returns:
+            True when forgetting the bucket changes nothing.
+        """
+        self.refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
@@ -0,0 +1,113 @@
+"""Triggers of configuration reload: SIGHUP and changed files."""
+import os
+import threading
+
+
+class ReloadSignal:
+    """Remember SIGHUP until the main loop handles it.
+
+    The handler only sets an event. The main loop sleeps by waiting
+    for it, so a signal wakes the loop up and the reload does not wait
+    for the next cycle.
+    """
+
+    def __init__(self):
+        """Create a signal that was not received yet."""
+        self.event = threading.Event()
+
+    def handle(self, signum, frame):
+        """Signal handler.
+
+        Args:
+            signum: signal number.
+            frame: interrupted frame.
+        """
+        self.event.set()
+
+    def wait(self, timeout):
+        """Sleep until the timeout or a signal.
+
+        Args:
+            timeout: longest sleep in seconds.
+
+        Returns:
+            True when a signal was received.
+        """
+        return self.event.wait(timeout)
+
+    def pop(self):
+        """Return whether a reload was requested and reset the flag.
+
+        Returns:
+            True once after every received signal.
+        """
+        if not self.event.is_set():
+            return False
+        self.event.clear()
+        return True
+
+
+class FileWatcher:
+    """Detect changes of files by their modification time."""
+
+    def __init__(self, paths):
+        """Remember current modification times.
+
+        Args:
+            paths: watched paths.
+        """
+        self.mtimes = {path: mtime(path) for path in paths}
+
+    def changed(self):
+        """Check the files.
+
+        Returns:
+            True when any file changed, appeared or disappeared since
+            the previous check.
+        """
+        changed = False
+        for path, previous in self.mtimes.items():
+            current = mtime(path)
+            if current != previous:
+                self.mtimes[path] = current
+                changed = True
+        return changed
+
+
+def mtime(path):
+    """Return modification time of a file.
+
+    Args:
+        path: path to the file.
+
+    Returns:
+        mtime in nanoseconds, None when there is no file.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def diff_tenants(registry, tenants):
+    """Compare the loaded registry with the polled students.
+
+    Args:
+        registry: polled tenants by id.
+        tenants: tenants loaded from the registry again.
+
+    Returns:
+        (added, removed, changed): lists of new tenants, ids of
+        removed ones and new versions of changed ones.
+    """
+    loaded = {tenant.id: tenant for tenant in tenants}
+    added = [
+        tenant for tenant_id, tenant in loaded.items()
+        if tenant_id not in registry
+    ]
+    removed = [tenant_id for tenant_id in registry if tenant_id not in loaded]
+    changed = [
+        tenant for tenant_id, tenant in loaded.items()
+        if tenant_id in registry and registry[tenant_id] != tenant
+    ]
+    return added, removed, changed
@@ -0,0 +1,82 @@
+"""Messages about changed homework statuses."""
+from functools import lru_cache
+
+DEFAULT_LOCALE = 'ru'
+
+STATUS_TEMPLATES = {
+    'ru': 'Изменился статус проверки работы "{name}". {verdict}',
+    'en': 'The review status of "{name}" has changed. {verdict}',
+}
+
+VERDICTS = {
+    'en': {
+        'approved': 'The reviewer liked everything. Hooray!',
+        'reviewing': 'The reviewer has started reviewing the work.',
+        'rejected': 'The reviewer left some remarks.',
+    },
+}
+
+
+class Renderer:
+    """Render status messages from templates compiled per verdict.
+
+    The template is split around {name} once for every verdict, so
+    rendering is a single join, and rendered messages are kept in an
+    LRU cache by (homework name, status).
+    """
+
+    def __init__(self, template, verdicts, cache_size=1024):
+        """Compile templates.
+
+        Args:
+            template: str.format template with {name} and {verdict}.
+            verdicts: dict of verdict by homework status.
+            cache_size: maximum number of cached messages.
+        """
+        head, _, tail = template.partition('{name}')
+        self.parts = {
+            status: (
+                head.replace('{verdict}', verdict),
+                tail.replace('{verdict}', verdict),
+            )
+            for status, verdict in verdicts.items()
+        }
+        self.render = lru_cache(maxsize=cache_size)(self.format)
+
+    def format(self, name, status):
+        """Render a message without the cache.
+
+        Args:
+            name: homework name.
+            status: homework status.
+
+        Returns:
+            message text.
+
+        Raises:
+            KeyError: when status has no verdict.
+        """
+        head, tail = self.parts[status]
+        return ''.join((head, name, tail))
+
+
+def build_renderer(locale, verdicts, default_verdicts, cache_size=1024):
+    """Build a renderer for a locale with overridden verdicts.
+
+    Args:
+        locale: key of STATUS_TEMPLATES, None for DEFAULT_LOCALE.
+        verdicts: dict of verdicts replacing the locale ones.
+        default_verdicts: verdicts of DEFAULT_LOCALE.
+        cache_size: maximum number of cached messages.
+
+    Returns:
+        Renderer.
+
+    Raises:
+        KeyError: when the locale is unknown.
+    """
+    locale = locale or DEFAULT_LOCALE
+    base = VERDICTS.get(locale, default_verdicts)
+    return Renderer(
+        STATUS_TEMPLATES[locale], {**base, **verdicts}, cache_size,
+    )
@@ -0,0 +1,204 @@
+"""Recording of Practicum API traffic and its replay."""
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+from homework_bot.tenants import tenant_id
+
+
+def token_key(headers):
+    """Return the redacted key of the token of a request.
+
+    Args:
+        headers: request headers with authorization.
+
+    Returns:
+        tenant_id of the OAuth token.
+    """
+    return tenant_id(headers.get('Authorization', '').partition(' ')[2])
+
+
+class RecordingSession:
+    """Client appending every request and answer to a json lines file.
+
+    Tokens are not written, only their hashes.
+    """
+
+    def __init__(self, client, path, clock=time.time):
+        """Open the record file for appending.
+
+        Args:
+            client: requests or requests.Session sending the requests.
+            path: path to the record file.
+            clock: wall clock in seconds.
+        """
+        self.client = client
+        self.clock = clock
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        """Send a request and record it.
+
+        Args:
+            url: requested url.
+            headers: request headers.
+            params: query parameters.
+            **kwargs: other arguments of the client.
+
+        Returns:
+            response of the client.
+        """
+        record = {
+            'at': self.clock(),
+            'tenant': token_key(headers or {}),
+            'params': params or {},
+        }
+        try:
+            response = self.client.get(
+                url, headers=headers, params=params, **kwargs,
+            )
+        except Exception as error:
+            record['error'] = repr(error)
+            self.write(record)
+            raise
+        record['status'] = int(response.status_code)
+        etag = getattr(response, 'headers', {}).get('ETag')
+        if etag is not None:
+            record['etag'] = etag
+        record['body'] = response.content.decode('utf-8', 'replace')
+        self.write(record)
+        return response
+
+    def write(self, record):
+        """Append a record.
+
+        Args:
+            record: dict of the request and its answer.
+        """
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        """Close the record file."""
+        self.file.close()
+
+
+class ReplayResponse:
+    """Recorded answer with the interface of requests.Response."""
+
+    def __init__(self, record):
+        """Create response.
+
+        Args:
+            record: recorded dict.
+        """
+        self.status_code = record['status']
+        self.content = record.get('body', '').encode('utf-8')
+        self.headers = {}
+        if 'etag' in record:
+            self.headers['ETag'] = record['etag']
+        self.reason = ''
+
+    @property
+    def text(self):
+        """Return the body as str."""
+        return self.content.decode('utf-8')
+
+    def json(self):
+        """Decode the body.
+
+        Returns:
+            decoded json.
+        """
+        return json.loads(self.content)
+
+
+class ReplaySession:
+    """Client answering with recorded answers instead of the API.
+
+    A student gets the answers recorded for its token in their order,
+    students missing from the record get the answers of all students
+    in the recorded order. Answers are paced like in the record,
+    speed times faster; speed 0 answers without waiting. The record
+    starts over when it runs out, from then on without waiting.
+    """
+
+    def __init__(self, path, speed=1.0, clock=time.monotonic,
+                 sleep=time.sleep):
+        """Load the record.
+
+        Args:
+            path: path to the record file.
+            speed: replay speed, 0 for no waiting.
+            clock: monotonic clock in seconds.
+            sleep: function sleeping for the given seconds.
+
+        Raises:
+            ValueError: when the record is empty.
+        """
+        with open(path, encoding='utf-8') as file:
+            self.records = [json.loads(line) for line in file if line.strip()]
+        if not self.records:
+            raise ValueError(f'В записи {path} нет ни одного ответа')
+        self.speed = speed
+        self.clock = clock
+        self.sleep = sleep
+        self.started = None
+        self.first = self.records[0]['at']
+        self.by_tenant = defaultdict(list)
+        for record in self.records:
+            self.by_tenant[record['tenant']].append(record)
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def next_record(self, tenant):
+        """Take the next record for a student.
+
+        Args:
+            tenant: redacted key of the student's token.
+
+        Returns:
+            recorded dict.
+        """
+        with self.lock:
+            if tenant not in self.by_tenant:
+                tenant = None
+            queue = self.queues.get(tenant)
+            if not queue:
+                queue = self.queues[tenant] = deque(
+                    self.by_tenant[tenant] if tenant else self.records,
+                )
+            if self.started is None:
+                self.started = self.clock()
+            return queue.popleft()
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        """Answer like the API did in the record.
+
+        Args:
+            url: requested url, ignored.
+            headers: request headers.
+            params: query parameters, ignored.
+            **kwargs: other arguments of the client, ignored.
+
+        Returns:
+            ReplayResponse.
+
+        Raises:
+            ConnectionError: when the recorded request failed.
+        """
+        record = self.next_record(token_key(headers or {}))
+        if self.speed:
+            delay = (
+                self.started + (record['at'] - self.first) / self.speed
+                - self.clock()
+            )
+            if delay > 0:
+                self.sleep(delay)
+        if 'error' in record:
+            raise ConnectionError(record['error'])
+        return ReplayResponse(record)
@@ -0,0 +1,141 @@
+"""Adaptive schedule of tenant polls."""
+import math
+import random
+import time
+
+PENDING_STATUSES = frozenset(['reviewing'])
+
+
+class Scheduler:
+    """Decide when every tenant is polled next.
+
+    Tenants with homework on review are polled every min_period,
+    tenants with a fresh change every period, and every poll without
+    changes stretches the interval by backoff up to max_period.
+    Intervals are jittered by up to jitter * interval, so tenants
+    started together drift apart, and the first polls of tenants added
+    to a non-empty schedule are spread over jitter * period, so a
+    restart does not poll everyone at once. Jittered intervals stay
+    within min_period and max_period.
+    """
+
+    def __init__(self, period, min_period, max_period, backoff=1.5,
+                 jitter=0.1, clock=time.monotonic, rng=None):
+        """Create an empty schedule.
+
+        Args:
+            period: interval after a change.
+            min_period: interval while a homework is on review.
+            max_period: longest interval for dormant tenants.
+            backoff: interval multiplier after a poll without changes.
+            jitter: maximum random share added to the interval.
+            clock: monotonic clock in seconds.
+            rng: random.Random used for jitter.
+        """
+        self.period = period
+        self.min_period = min_period
+        self.max_period = max_period
+        self.backoff = backoff
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.due = {}
+        self.intervals = {}
+        self.popped = {}
+        self.unpolled = set()
+
+    def add(self, tenant_id, spread=True):
+        """Schedule the first poll of a tenant.
+
+        The first tenant of the schedule is polled right away, the
+        others within jitter * period unless spread is off.
+
+        Args:
+            tenant_id: id of the tenant.
+            spread: whether to delay the first poll by jitter.
+        """
+        delay = 0
+        if spread and self.due:
+            delay = self.jitter * self.period * self.rng.random()
+        self.due[tenant_id] = self.clock() + delay
+        self.intervals.setdefault(tenant_id, self.period)
+        self.unpolled.add(tenant_id)
+
+    def remove(self, tenant_id):
+        """Stop polling a tenant.
+
+        Args:
+            tenant_id: id of the tenant.
+        """
+        self.due.pop(tenant_id, None)
+        self.intervals.pop(tenant_id, None)
+        self.unpolled.discard(tenant_id)
+
+    def pop_due(self):
+        """Return tenants whose poll time has come.
+
+        Returns:
+            list of tenant ids, the longest waiting first; they stay
+            unscheduled until rescheduled or restored.
+        """
+        now = self.clock()
+        self.popped = {
+            tenant_id: moment for tenant_id, moment in self.due.items()
+            if moment <= now
+        }
+        due = sorted(self.popped, key=self.popped.get)
+        for tenant_id in due:
+            self.due[tenant_id] = math.inf
+        return due
+
+    def restore(self, tenant_id):
+        """Put back a tenant that was popped but not polled.
+
+        It keeps its poll time, so the next pop_due returns it before
+        the tenants that became due later.
+
+        Args:
+            tenant_id: id of the tenant.
+        """
+        if tenant_id in self.due:
+            self.due[tenant_id] = self.popped.get(tenant_id, self.clock())
+
+    def reschedule(self, tenant_id, statuses, changed):
+        """Schedule the next poll of a tenant after the current one.
+
+        Args:
+            tenant_id: id of the tenant.
+            statuses: dict of last seen status by homework key.
+            changed: whether the poll found changes.
+
+        Returns:
+            interval to the next poll in seconds.
+        """
+        if tenant_id not in self.due:
+            return None
+        if PENDING_STATUSES.intersection(statuses.values()):
+            interval = self.min_period
+        elif changed:
+            interval = self.period
+        else:
+            interval = self.intervals[tenant_id] * self.backoff
+        interval = min(max(interval, self.min_period), self.max_period)
+        self.intervals[tenant_id] = interval
+        spread = self.jitter * interval
+        low = max(min(interval, self.max_period - spread), self.min_period)
+        interval = min(low + spread * self.rng.random(), self.max_period)
+        self.due[tenant_id] = self.clock() + interval
+        self.unpolled.discard(tenant_id)
+        return interval
+
+    def pause(self, longest):
+        """Return how long to sleep until the next due poll.
+
+        Args:
+            longest: upper bound of the pause.
+
+        Returns:
+            whole seconds to sleep.
+        """
+        delay = min(self.due.values(), default=math.inf) - self.clock()
+        return max(0, math.ceil(min(longest, delay)))
@@ -0,0 +1,42 @@
+"""Long-lived HTTP session with a connection pool for the Practicum API."""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (502, 503, 504)
+
+
+def build_session(pool_size, retries, backoff=0.5):
+    """Create a keep-alive session shared by all polls.
+
+    Connections are reused between requests, so TCP and TLS handshakes
+    are paid once per pooled connection instead of once per poll.
+
+    Args:
+        pool_size: maximum number of kept-alive connections.
+        retries: number of retries on connection errors and 5xx.
+        backoff: backoff factor between retries, seconds.
+
+    Returns:
+        configured requests.Session.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+        pool_block=False,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -0,0 +1,85 @@
+"""Consistent hashing of tenants onto worker processes."""
+import bisect
+import hashlib
+
+REPLICAS = 100
+
+
+def position(key):
+    """Return the position of a key on the ring.
+
+    Args:
+        key: str key.
+
+    Returns:
+        64-bit int.
+    """
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HashRing:
+    """Ring of nodes, a key belongs to the next node clockwise.
+
+    Every node is placed on the ring replicas times, so keys are spread
+    evenly and adding or removing one of N nodes moves only about 1/N
+    of the keys.
+    """
+
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        """Create ring.
+
+        Args:
+            nodes: names of the nodes.
+            replicas: points of every node on the ring.
+        """
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        """Return number of nodes."""
+        return len(set(self.owners.values()))
+
+    def add(self, node):
+        """Place a node on the ring.
+
+        Args:
+            node: name of the node.
+        """
+        for replica in range(self.replicas):
+            point = position(f'{node}#{replica}')
+            if point not in self.owners:
+                bisect.insort(self.points, point)
+            self.owners[point] = node
+
+    def remove(self, node):
+        """Take a node off the ring.
+
+        Args:
+            node: name of the node.
+        """
+        for replica in range(self.replicas):
+            point = position(f'{node}#{replica}')
+            if self.owners.get(point) == node:
+                del self.owners[point]
+                del self.points[bisect.bisect_left(self.points, point)]
+
+    def node_for(self, key):
+        """Return the node owning a key.
+
+        Args:
+            key: str key, e.g. tenant id.
+
+        Returns:
+            name of the node.
+
+        Raises:
+            LookupError: when the ring is empty.
+        """
+        if not self.points:
+            raise LookupError('На кольце нет ни одного узла')
+        index = bisect.bisect(self.points, position(key)) % len(self.points)
+        return self.owners[self.points[index]]
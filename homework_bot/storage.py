@@ -0,0 +1,360 @@
+"""Persistent storage of tenants state between restarts."""
+import sqlite3
+import threading
+
+from homework_bot.models import intern_status
+from homework_bot.tenants import TenantState
+
+
+class StateStore:
+    """Base store: keeps nothing, every restart starts from scratch."""
+
+    def load(self, tenant_ids):
+        """Load saved states.
+
+        Args:
+            tenant_ids: ids of the polled tenants.
+
+        Returns:
+            dict of TenantState by id for tenants found in the store.
+        """
+        return {}
+
+    def save(self, states, messages=()):
+        """Save states of all tenants and new outbox messages in one batch.
+
+        Args:
+            states: dict of TenantState by tenant id.
+            messages: outbox rows (key, text, due), a message whose key
+                is already pending is not added again.
+        """
+
+    def pending(self, now):
+        """Iterate over outbox messages due for delivery.
+
+        Args:
+            now: current time in seconds since the epoch.
+
+        Returns:
+            iterator of (key, text, attempts), the longest due first,
+            messages due at once in the order they were added.
+        """
+        return iter(())
+
+    def acknowledge(self, delivered, retried):
+        """Remove delivered messages and postpone failed ones.
+
+        Args:
+            delivered: keys of delivered or dropped messages.
+            retried: (key, attempts, due) of messages to retry.
+        """
+
+    def close(self):
+        """Release resources of the store."""
+
+
+class MemoryStore(StateStore):
+    """Store keeping snapshots in memory, for tests and one-off runs."""
+
+    def __init__(self):
+        """Create an empty store."""
+        self.rows = {}
+        self.outbox = {}
+        self.lock = threading.Lock()
+
+    def load(self, tenant_ids):
+        """Load saved states.
+
+        Args:
+            tenant_ids: ids of the polled tenants.
+
+        Returns:
+            dict of TenantState by id for tenants found in the store.
+        """
+        states = {}
+        for tenant_id in tenant_ids:
+            if tenant_id in self.rows:
+                timestamp, error, statuses, *notice = self.rows[tenant_id]
+                states[tenant_id] = TenantState(
+                    timestamp, dict(statuses), error, *notice,
+                )
+        return states
+
+    def save(self, states, messages=()):
+        """Save states of all tenants and new outbox messages in one batch.
+
+        Args:
+            states: dict of TenantState by tenant id.
+            messages: outbox rows (key, text, due), a message whose key
+                is already pending is not added again.
+        """
+        rows = {
+            tenant_id: snapshot(state) for tenant_id, state in states.items()
+        }
+        with self.lock:
+            self.rows.update(rows)
+            for key, text, due in messages:
+                self.outbox.setdefault(key, (text, 0, due))
+
+    def pending(self, now):
+        """Iterate over outbox messages due for delivery.
+
+        Args:
+            now: current time in seconds since the epoch.
+
+        Returns:
+            iterator of (key, text, attempts), the longest due first,
+            messages due at once in the order they were added.
+        """
+        with self.lock:
+            rows = [
+                (key, text, attempts, due)
+                for key, (text, attempts, due) in self.outbox.items()
+                if due <= now
+            ]
+        rows.sort(key=lambda row: row[3])
+        return iter([row[:3] for row in rows])
+
+    def acknowledge(self, delivered, retried):
+        """Remove delivered messages and postpone failed ones.
+
+        Args:
+            delivered: keys of delivered or dropped messages.
+            retried: (key, attempts, due) of messages to retry.
+        """
+        with self.lock:
+            for key in delivered:
+                self.outbox.pop(key, None)
+            for key, attempts, due in retried:
+                if key in self.outbox:
+                    self.outbox[key] = (self.outbox[key][0], attempts, due)
+
+
+class SQLiteStore(StateStore):
+    """Store in a SQLite database in WAL mode.
+
+    Only the tenants and homeworks changed since the previous save
+    are written, all of them and the new outbox messages in a single
+    transaction. The connection is shared by the poll loop and the
+    delivery of the outbox, so its transactions are serialized.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS tenants ('
+        'id TEXT PRIMARY KEY, '
+        'timestamp INTEGER NOT NULL, '
+        'error TEXT NOT NULL, '
+        'error_sent REAL NOT NULL DEFAULT 0, '
+        'error_repeats INTEGER NOT NULL DEFAULT 0)',
+        'CREATE TABLE IF NOT EXISTS homeworks ('
+        'tenant_id TEXT NOT NULL, '
+        'homework TEXT NOT NULL, '
+        'status TEXT, '
+        'PRIMARY KEY (tenant_id, homework))',
+        'CREATE TABLE IF NOT EXISTS outbox ('
+        'tenant_id TEXT NOT NULL, '
+        'chat_id TEXT NOT NULL, '
+        'homework TEXT NOT NULL, '
+        'status TEXT, '
+        'text TEXT NOT NULL, '
+        'attempts INTEGER NOT NULL DEFAULT 0, '
+        'due REAL NOT NULL, '
+        'PRIMARY KEY (tenant_id, chat_id, homework, status))',
+        'CREATE INDEX IF NOT EXISTS outbox_due ON outbox (due)',
+    )
+    COLUMNS = (
+        ('tenants', 'error_sent', 'REAL NOT NULL DEFAULT 0'),
+        ('tenants', 'error_repeats', 'INTEGER NOT NULL DEFAULT 0'),
+    )
+
+    def __init__(self, path):
+        """Open the database and create the schema.
+
+        Args:
+            path: path to the database file.
+        """
+        self.connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False,
+        )
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in self.SCHEMA:
+            self.connection.execute(statement)
+        for table, column, definition in self.COLUMNS:
+            columns = {
+                row[1] for row in
+                self.connection.execute(f'PRAGMA table_info({table})')
+            }
+            if column not in columns:
+                self.connection.execute(
+                    f'ALTER TABLE {table} ADD COLUMN {column} {definition}',
+                )
+        self.connection.commit()
+        self.saved = {}
+        self.lock = threading.Lock()
+
+    def load(self, tenant_ids):
+        """Load saved states.
+
+        Args:
+            tenant_ids: ids of the polled tenants.
+
+        Returns:
+            dict of TenantState by id for tenants found in the store.
+        """
+        wanted = set(tenant_ids)
+        states = {}
+        rows = self.connection.execute(
+            'SELECT id, timestamp, error, error_sent, error_repeats '
+            'FROM tenants',
+        )
+        for tenant_id, timestamp, error, sent, repeats in rows:
+            if tenant_id in wanted:
+                states[tenant_id] = TenantState(
+                    timestamp, {}, error, sent, repeats,
+                )
+        rows = self.connection.execute(
+            'SELECT tenant_id, homework, status FROM homeworks',
+        )
+        for tenant_id, homework, status in rows:
+            if tenant_id in states:
+                states[tenant_id].statuses[homework] = intern_status(status)
+        for tenant_id, state in states.items():
+            self.saved[tenant_id] = snapshot(state)
+        return states
+
+    def save(self, states, messages=()):
+        """Save changed states and new outbox messages in one transaction.
+
+        Args:
+            states: dict of TenantState by tenant id.
+            messages: outbox rows (key, text, due), a message whose key
+                is already pending is not added again.
+        """
+        changed = {}
+        homeworks = []
+        for tenant_id, state in states.items():
+            row = snapshot(state)
+            saved = self.saved.get(tenant_id)
+            if saved == row:
+                continue
+            changed[tenant_id] = row
+            saved_statuses = saved[2] if saved else {}
+            homeworks.extend(
+                (tenant_id, homework, status)
+                for homework, status in row[2].items()
+                if saved_statuses.get(homework, ()) != status
+            )
+        messages = [(*key, text, due) for key, text, due in messages]
+        if not changed and not messages:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO tenants '
+                '(id, timestamp, error, error_sent, error_repeats) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [
+                    (tenant_id, timestamp, error, *notice)
+                    for tenant_id, (timestamp, error, _, *notice)
+                    in changed.items()
+                ],
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO homeworks VALUES (?, ?, ?)',
+                homeworks,
+            )
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO outbox '
+                '(tenant_id, chat_id, homework, status, text, due) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                messages,
+            )
+        self.saved.update(changed)
+
+    def pending(self, now):
+        """Iterate over outbox messages due for delivery.
+
+        Args:
+            now: current time in seconds since the epoch.
+
+        Returns:
+            iterator of (key, text, attempts), the longest due first,
+            messages due at once in the order they were added.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT tenant_id, chat_id, homework, status, text, attempts '
+                'FROM outbox WHERE due <= ? ORDER BY due, rowid',
+                (now,),
+            ).fetchall()
+        return iter([(tuple(row[:4]), row[4], row[5]) for row in rows])
+
+    def acknowledge(self, delivered, retried):
+        """Remove delivered messages and postpone failed ones.
+
+        Args:
+            delivered: keys of delivered or dropped messages.
+            retried: (key, attempts, due) of messages to retry.
+        """
+        if not delivered and not retried:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'DELETE FROM outbox WHERE tenant_id = ? AND chat_id = ? '
+                'AND homework = ? AND status IS ?',
+                delivered,
+            )
+            self.connection.executemany(
+                'UPDATE outbox SET attempts = ?, due = ? '
+                'WHERE tenant_id = ? AND chat_id = ? '
+                'AND homework = ? AND status IS ?',
+                [(attempts, due, *key) for key, attempts, due in retried],
+            )
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+
+STORES = {
+    'memory': lambda path: MemoryStore(),
+    'sqlite': SQLiteStore,
+}
+
+
+def snapshot(state):
+    """Return persisted fields of a state.
+
+    Args:
+        state: TenantState.
+
+    Returns:
+        tuple of the fields with a copy of homework statuses.
+    """
+    return (
+        state.timestamp, state.error, dict(state.statuses),
+        state.error_sent, state.error_repeats,
+    )
+
+
+def open_store(url):
+    """Open a store by url.
+
+    'sqlite:///relative/file.sqlite3' or 'sqlite:////absolute/path'
+    opens SQLiteStore, 'memory://' opens MemoryStore.
+
+    Args:
+        url: store url.
+
+    Returns:
+        StateStore.
+
+    Raises:
+        ValueError: when the store kind is unknown.
+    """
+    kind, _, path = url.partition('://')
+    if kind not in STORES:
+        raise ValueError(f'Неизвестное хранилище состояния: {url}')
+    if path.startswith('/'):
+        path = path[1:]
+    return STORES[kind](path)
@@ -0,0 +1,147 @@
+"""Supervisor of worker processes, one per shard of tenants."""
+import multiprocessing
+import os
+import time
+
+BACKOFF = 1
+MAX_BACKOFF = 300
+MAX_FAILURES = 5
+MIN_UPTIME = 60
+
+
+class Supervisor:
+    """Fork a worker for every shard and restart the crashed ones.
+
+    A worker is started as target(shard, shards). It restarts with the
+    same shard, so it polls the same tenants as before the crash.
+    A worker that exits with code 0 is not restarted. A worker that
+    crashes within min_uptime of its start is restarted after backoff
+    seconds, doubled on every such crash in a row up to max_backoff;
+    after max_failures of them it is given up, since it would only
+    crash again, for example on a broken registry.
+    """
+
+    def __init__(self, shards, target, context=None, backoff=BACKOFF,
+                 max_backoff=MAX_BACKOFF, max_failures=MAX_FAILURES,
+                 min_uptime=MIN_UPTIME, clock=time.monotonic):
+        """Create supervisor.
+
+        Args:
+            shards: names of the shards.
+            target: function run in every worker.
+            context: multiprocessing context, fork by default.
+            backoff: delay before restarting after the first crash.
+            max_backoff: longest delay before a restart in seconds.
+            max_failures: crashes in a row before a worker is given up.
+            min_uptime: seconds a worker runs to count as started well.
+            clock: monotonic clock in seconds.
+        """
+        self.shards = list(shards)
+        self.target = target
+        self.context = context or multiprocessing.get_context('fork')
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_failures = max_failures
+        self.min_uptime = min_uptime
+        self.clock = clock
+        self.processes = {}
+        self.started = {}
+        self.restarts = dict.fromkeys(self.shards, 0)
+        self.failures = dict.fromkeys(self.shards, 0)
+        self.waiting = {}
+        self.failed = {}
+        self.stopping = False
+
+    def start(self, shard):
+        """Start the worker of a shard.
+
+        Args:
+            shard: name of the shard.
+        """
+        process = self.context.Process(
+            target=self.target, args=(shard, self.shards), name=shard,
+        )
+        process.start()
+        self.processes[shard] = process
+        self.started[shard] = self.clock()
+
+    def check(self):
+        """Schedule restarts of workers that died with an error.
+
+        Returns:
+            (restarted, given_up): lists of (shard, exit code) of
+            workers restarted now and of workers given up.
+        """
+        now = self.clock()
+        given_up = []
+        for shard, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            del self.processes[shard]
+            if process.exitcode == 0 or self.stopping:
+                continue
+            if now - self.started[shard] >= self.min_uptime:
+                self.failures[shard] = 0
+            self.failures[shard] += 1
+            if self.failures[shard] > self.max_failures:
+                self.failed[shard] = process.exitcode
+                given_up.append((shard, process.exitcode))
+                continue
+            delay = min(
+                self.backoff * 2 ** (self.failures[shard] - 1),
+                self.max_backoff,
+            )
+            self.waiting[shard] = (now + delay, process.exitcode)
+        restarted = []
+        for shard, (due, exitcode) in list(self.waiting.items()):
+            if due <= now and not self.stopping:
+                del self.waiting[shard]
+                self.restarts[shard] += 1
+                restarted.append((shard, exitcode))
+                self.start(shard)
+        return restarted, given_up
+
+    def run(self, interval=1, on_restart=None, on_give_up=None):
+        """Start every worker and watch them until all exit or stop().
+
+        Args:
+            interval: seconds between checks.
+            on_restart: callable(shard, exit code) called on restarts.
+            on_give_up: callable(shard, exit code) called when a worker
+                is not restarted any more.
+        """
+        for shard in self.shards:
+            self.start(shard)
+        while (self.processes or self.waiting) and not self.stopping:
+            time.sleep(interval)
+            restarted, given_up = self.check()
+            for shard, exitcode in restarted:
+                if on_restart is not None:
+                    on_restart(shard, exitcode)
+            for shard, exitcode in given_up:
+                if on_give_up is not None:
+                    on_give_up(shard, exitcode)
+
+    def send_signal(self, signum):
+        """Send a signal to every running worker.
+
+        Args:
+            signum: signal number.
+        """
+        for process in list(self.processes.values()):
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    def stop(self, timeout=10):
+        """Terminate every worker and wait for them.
+
+        Args:
+            timeout: seconds to wait for every worker.
+        """
+        self.stopping = True
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(timeout)
+        self.processes.clear()
@@ -0,0 +1,191 @@
+"""Registry of students (tenants) polled by a single bot process."""
+import hashlib
+import json
+from collections import namedtuple
+
+from homework_bot.render import STATUS_TEMPLATES
+
+Tenant = namedtuple(
+    'Tenant', ('id', 'token', 'chat_id', 'locale', 'verdicts', 'subscribers'),
+    defaults=(None, (), ()),
+)
+
+
+class TenantState:
+    """Polling state of one tenant kept between cycles.
+
+    busy is set while a request of the tenant runs in a thread,
+    overran when its poll was abandoned before the request finished.
+    """
+
+    __slots__ = (
+        'timestamp', 'statuses', 'error', 'error_sent', 'error_repeats',
+        'fingerprint', 'etag', 'busy', 'overran',
+    )
+
+    def __init__(self, timestamp=0, statuses=None, error='', error_sent=0,
+                 error_repeats=0):
+        """Create state.
+
+        Args:
+            timestamp: from_date passed to the API.
+            statuses: dict of last seen status by homework key.
+            error: class of the last error reported to the chat.
+            error_sent: time its notice was sent.
+            error_repeats: repeats of the error suppressed since.
+        """
+        self.timestamp = timestamp
+        self.statuses = statuses if statuses is not None else {}
+        self.error = error
+        self.error_sent = error_sent
+        self.error_repeats = error_repeats
+        self.fingerprint = None
+        self.etag = None
+        self.busy = False
+        self.overran = False
+
+
+class ChatMessage(str):
+    """Message text addressed to a specific Telegram chat."""
+
+    __slots__ = ('chat_id', 'key')
+
+    def __new__(cls, text, chat_id, key=None):
+        """Create message.
+
+        Args:
+            text: message text.
+            chat_id: id of the chat the message is addressed to.
+            key: (tenant id, chat id, homework, status) of a status
+                message kept in the outbox, None for other messages.
+
+        Returns:
+            new ChatMessage.
+        """
+        message = super().__new__(cls, text)
+        message.chat_id = chat_id
+        message.key = key
+        return message
+
+
+def tenant_id(token):
+    """Return a stable identifier of a token that is safe to log.
+
+    Args:
+        token: Practicum OAuth token.
+
+    Returns:
+        first 12 hex digits of the token sha256.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()[:12]
+
+
+def make_tenant(token, chat_id, name=None, locale=None, verdicts=None,
+                subscribers=None):
+    """Build a tenant.
+
+    Args:
+        token: Practicum OAuth token.
+        chat_id: Telegram chat for notifications.
+        name: optional human-readable id, token hash by default.
+        locale: language of messages, key of STATUS_TEMPLATES.
+        verdicts: dict of custom verdicts by homework status, kept
+            as sorted pairs so the tenant stays hashable.
+        subscribers: other chats getting the status changes, such as
+            the mentor's chat or the cohort group; a single chat id
+            is accepted too.
+
+    Returns:
+        Tenant.
+
+    Raises:
+        ValueError: when the locale is unknown.
+    """
+    if locale is not None and locale not in STATUS_TEMPLATES:
+        raise ValueError(f'Неизвестный язык сообщений {locale}')
+    verdicts = tuple(sorted(
+        (str(status), str(verdict))
+        for status, verdict in (verdicts or {}).items()
+    ))
+    chat_id = str(chat_id)
+    if isinstance(subscribers, (str, int)):
+        subscribers = [subscribers]
+    subscribers = tuple(dict.fromkeys(
+        str(subscriber) for subscriber in subscribers or ()
+        if str(subscriber) != chat_id
+    ))
+    return Tenant(
+        str(name or tenant_id(token)), token, chat_id, locale, verdicts,
+        subscribers,
+    )
+
+
+def tenant_chats(tenant):
+    """Return every chat getting the status changes of a tenant.
+
+    Args:
+        tenant: Tenant.
+
+    Returns:
+        tuple of chat ids, the tenant's own chat first.
+    """
+    return (tenant.chat_id, *tenant.subscribers)
+
+
+def shared_chats(tenants):
+    """Find chats getting the status changes of several tenants.
+
+    Args:
+        tenants: iterable of Tenant.
+
+    Returns:
+        frozenset of chat ids.
+    """
+    seen = set()
+    shared = set()
+    for tenant in tenants:
+        for chat_id in tenant_chats(tenant):
+            if chat_id in seen:
+                shared.add(chat_id)
+            seen.add(chat_id)
+    return frozenset(shared)
+
+
+def load_tenants(path):
+    """Load tenants from a JSON registry file.
+
+    The file looks like
+    {"tenants": [{"token": "...", "chat_id": 123, "name": "ivanov",
+    "locale": "en", "verdicts": {"approved": "..."},
+    "subscribers": [456, -100789]}]},
+    "name", "locale", "verdicts" and "subscribers" are optional.
+
+    Args:
+        path: path to the registry file.
+
+    Returns:
+        list of tenants.
+
+    Raises:
+        ValueError: when the file is malformed or ids are duplicated.
+    """
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+    try:
+        tenants = [
+            make_tenant(
+                item['token'],
+                item['chat_id'],
+                item.get('name'),
+                item.get('locale'),
+                item.get('verdicts'),
+                item.get('subscribers'),
+            )
+            for item in data['tenants']
+        ]
+    except (KeyError, TypeError, AttributeError, ValueError) as error:
+        raise ValueError(f'Некорректный реестр студентов {path}: {error}')
+    ids = [tenant.id for tenant in tenants]
+    if len(ids) != len(set(ids)):
+        raise ValueError(f'Повторяющиеся студенты в реестре {path}')
+    return tenants
@@ -0,0 +1,270 @@
+"""Tracing spans of polls and sends with pluggable exporters."""
+import atexit
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class NoopSpan:
+    """Span that records nothing, used while tracing is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        """Enter the span.
+
+        Returns:
+            the span itself.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        """Leave the span without recording it."""
+
+    def set(self, **attributes):
+        """Ignore attributes.
+
+        Args:
+            **attributes: attributes of the span.
+        """
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Span:
+    """Timed stage of a trace, exported when it ends.
+
+    Child spans take the trace id and the tenant of the span they
+    are started in.
+    """
+
+    __slots__ = (
+        'tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'tenant',
+        'attributes', 'start', 'token',
+    )
+
+    def __init__(self, tracer, name, trace_id, parent_id, tenant,
+                 attributes):
+        """Create span.
+
+        Args:
+            tracer: Tracer exporting the span.
+            name: stage name.
+            trace_id: id of the trace.
+            parent_id: id of the enclosing span, None for the root.
+            tenant: tenant id the stage works for.
+            attributes: dict of other attributes.
+        """
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = tracer.new_id()
+        self.parent_id = parent_id
+        self.tenant = tenant
+        self.attributes = attributes
+        self.start = None
+        self.token = None
+
+    def __enter__(self):
+        """Start timing and make the span current.
+
+        Returns:
+            the span itself.
+        """
+        self.token = current_span.set(self)
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        """Stop timing, restore the previous span and export this one."""
+        duration = self.tracer.clock() - self.start
+        current_span.reset(self.token)
+        record = {
+            'trace': self.trace_id,
+            'span': self.span_id,
+            'parent': self.parent_id,
+            'name': self.name,
+            'tenant': self.tenant,
+            'start': self.start,
+            'duration': duration,
+            'outcome': 'ok' if exc_type is None else 'error',
+            **self.attributes,
+        }
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        self.tracer.exporter.export(record)
+
+    def set(self, **attributes):
+        """Add attributes, such as payload size, to the span.
+
+        Args:
+            **attributes: attributes of the span.
+        """
+        self.attributes.update(attributes)
+
+
+class Tracer:
+    """Start spans of sampled traces.
+
+    Whether a trace is recorded is decided once at its root span, with
+    probability sample_rate; spans inside an unsampled trace are no-ops.
+    """
+
+    def __init__(self, exporter, sample_rate=1.0, clock=time.time,
+                 rng=random.random):
+        """Create tracer.
+
+        Args:
+            exporter: Exporter of ended spans.
+            sample_rate: share of traces recorded, from 0 to 1.
+            clock: wall clock in seconds.
+            rng: function returning a random float in [0, 1).
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.clock = clock
+        self.rng = rng
+
+    def new_id(self):
+        """Return a random id of a span or a trace.
+
+        Returns:
+            16 hex digits.
+        """
+        return os.urandom(8).hex()
+
+    def span(self, name, root=False, tenant=None, attributes=None):
+        """Start a span inside the current one.
+
+        Args:
+            name: stage name.
+            root: start a new sampled trace when there is no current span.
+            tenant: tenant id, taken from the parent by default.
+            attributes: dict of other attributes.
+
+        Returns:
+            Span, or NOOP_SPAN when the trace is not recorded.
+        """
+        parent = current_span.get()
+        if parent is not None:
+            return Span(
+                self, name, parent.trace_id, parent.span_id,
+                tenant or parent.tenant, attributes or {},
+            )
+        if not root or self.rng() >= self.sample_rate:
+            return NOOP_SPAN
+        return Span(self, name, self.new_id(), None, tenant, attributes or {})
+
+    def close(self):
+        """Close the exporter."""
+        self.exporter.close()
+
+
+class Exporter:
+    """Base exporter: drops every span."""
+
+    def export(self, record):
+        """Export an ended span.
+
+        Args:
+            record: dict of the span.
+        """
+
+    def close(self):
+        """Write out buffered spans and release resources."""
+
+
+class MemoryExporter(Exporter):
+    """Exporter keeping spans in a list, for tests."""
+
+    def __init__(self):
+        """Create an empty list."""
+        self.records = []
+
+    def export(self, record):
+        """Keep an ended span.
+
+        Args:
+            record: dict of the span.
+        """
+        self.records.append(record)
+
+
+class JsonlExporter(Exporter):
+    """Exporter appending spans to a file as json lines.
+
+    Lines are buffered and written every buffer_size spans and on close.
+    """
+
+    def __init__(self, path, buffer_size=100):
+        """Open the file for appending.
+
+        Args:
+            path: path to the file.
+            buffer_size: spans written at once.
+        """
+        self.file = open(path, 'a', encoding='utf-8')
+        self.buffer_size = buffer_size
+        self.lines = []
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def export(self, record):
+        """Buffer an ended span.
+
+        Args:
+            record: dict of the span.
+        """
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self.lock:
+            self.lines.append(line)
+            if len(self.lines) >= self.buffer_size:
+                self.write()
+
+    def write(self):
+        """Write buffered lines, the lock must be held."""
+        if self.lines and not self.file.closed:
+            self.file.write('\n'.join(self.lines) + '\n')
+            self.file.flush()
+        self.lines = []
+
+    def close(self):
+        """Write buffered lines and close the file."""
+        with self.lock:
+            self.write()
+            self.file.close()
+
+
+EXPORTERS = {
+    'jsonl': JsonlExporter,
+    'memory': lambda path: MemoryExporter(),
+}
+
+
+def open_exporter(url):
+    """Open an exporter by url.
+
+    'jsonl:///relative/file.jsonl' or 'jsonl:////absolute/path' appends
+    spans to a file, 'memory://' keeps them in a list.
+
+    Args:
+        url: exporter url.
+
+    Returns:
+        Exporter.
+
+    Raises:
+        ValueError: when the exporter kind is unknown.
+    """
+    kind, _, path = url.partition('://')
+    if kind not in EXPORTERS:
+        raise ValueError(f'Неизвестный экспортёр трассировки: {url}')
+    if path.startswith('/'):
+        path = path[1:]
+    return EXPORTERS[kind](path)
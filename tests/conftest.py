@@ -2,6 +2,8 @@ import sys
 import os
 
 
+os.environ.setdefault('STATE_STORE', 'memory://')
+
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_dir)
 
@@ -0,0 +1,41 @@
+from benchmarks.loadtest import parse_args, percentile, run_scenario
+
+
+class TestLoadTest:
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert percentile(values, 0.99) == 99
+        assert percentile(values, 0.5) == 50
+        assert percentile([], 0.99) is None
+
+    def test_smoke(self, homework_module):
+        config = vars(parse_args([
+            '--cycles', '1', '--warmup', '0', '--concurrency', '5',
+            '--api-latency', '0', '--telegram-latency', '0',
+            '--api-error-rate', '0', '--payload-size', '2',
+        ]))
+        del config['output'], config['tenants']
+        breaker_gauge = dict(homework_module.API_BREAKER_OPEN.series)
+        result = run_scenario({**config, 'tenants': 10})
+        assert result['api_requests'] == result['api_count'] == 10
+        assert result['messages_delivered'] == result['send_count'] == 20
+        assert result['cycle_results'][0]['flushed']
+        assert result['max_rss_kb'] > 0
+        assert homework_module.api_session is None
+        assert homework_module.api_breaker is None
+        assert homework_module.API_BREAKER_OPEN.series == breaker_gauge
+
+    def test_sharded_smoke(self, homework_module):
+        config = vars(parse_args([
+            '--cycles', '1', '--warmup', '0', '--concurrency', '5',
+            '--workers', '2', '--api-latency', '0', '--telegram-latency',
+            '0', '--api-error-rate', '0', '--payload-size', '2',
+        ]))
+        del config['output'], config['tenants']
+        result = run_scenario({**config, 'tenants': 10})
+        assert result['api_requests'] == result['api_count'] == 10
+        assert result['messages_delivered'] == result['send_count'] == 20
+        assert result['cycle_results'][0]['flushed']
+        assert result['polls_per_second'] > 0
+        assert homework_module.SHARD is None
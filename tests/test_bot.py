@@ -550,22 +550,25 @@ class TestHomework:
 
         main_source = inspect.getsource(homework_module.main)
         time_sleep_pattern = re.compile(
-            r'(\# *)?(time\.sleep\( *[\w\d=_\-\'\"]* *\))'
+            r'(\# *)?(reload_signal\.wait\( *[\w\d=_\-\'\"]* *\))'
         )
         search_result = re.search(time_sleep_pattern, main_source)
         is_commented = search_result[1] is None if search_result else False
         assert search_result and is_commented, (
-            'Убедитесь, что в `main()` применена функция `time.sleep()`.'
+            'Убедитесь, что в `main()` применена функция '
+            '`reload_signal.wait()`.'
         )
 
         def sleep_to_interrupt(secs):
             assert secs == self.RETRY_PERIOD, (
                 'Убедитесь, что повторный запрос к API домашки отправляется '
-                'через 10 минут: `time.sleep(RETRY_PERIOD)`.'
+                'через 10 минут: `reload_signal.wait(RETRY_PERIOD)`.'
             )
             raise utils.BreakInfiniteLoop('break')
 
-        monkeypatch.setattr(time, 'sleep', sleep_to_interrupt)
+        monkeypatch.setattr(
+            homework_module.reload_signal, 'wait', sleep_to_interrupt,
+        )
 
         def mock_telegram_bot(random_message=random_message, *args, **kwargs):
             return utils.MockTelegramBot(*args,
@@ -743,10 +746,15 @@ class TestHomework:
             try:
                 homework_module.main()
             except utils.BreakInfiniteLoop:
-                log_record = [
-                    record.message for record in caplog.records
-                    if self.HOMEWORK_VERDICTS[hw_status] in record.message
-                ]
+                # Статусы отправляются отдельным потоком доставки.
+                deadline = time.monotonic() + 5
+                log_record = []
+                while not log_record and time.monotonic() < deadline:
+                    log_record = [
+                        record.message for record in caplog.records
+                        if self.HOMEWORK_VERDICTS[hw_status] in record.message
+                    ]
+                    time.sleep(0.01)
                 assert log_record, (
                     'Убедитесь, что при изменении статуса домашней работы '
                     'бот отправляет в Telegram сообщение с вердиктом '
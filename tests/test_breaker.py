@@ -0,0 +1,85 @@
+import utils
+from homework_bot.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+)
+from homework_bot.dedup import DedupCache
+from homework_bot.tenants import TenantState, make_tenant
+
+
+class MockSession:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        return utils.MockResponseGET(http_status=self.status_code)
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_threshold(self):
+        clock = utils.FakeClock()
+        breaker = CircuitBreaker(3, 60, clock=clock)
+        assert breaker.record(False) is None
+        assert breaker.record(True) is None
+        assert [breaker.record(False) for _ in range(3)] == [None, None, OPEN]
+        assert not breaker.allow()
+
+    def test_single_probe_decides(self):
+        clock = utils.FakeClock()
+        breaker = CircuitBreaker(1, 60, clock=clock)
+        breaker.record(False)
+        clock.now += 60
+        assert breaker.allow()
+        assert breaker.state == HALF_OPEN
+        assert not breaker.allow()
+        assert breaker.record(False) == OPEN
+        assert not breaker.allow()
+        clock.now += 60
+        assert breaker.allow()
+        assert breaker.record(True) == CLOSED
+        assert breaker.allow() and breaker.allow()
+
+
+class TestPollsBehindBreaker:
+
+    def test_open_breaker_skips_polls(self, monkeypatch, homework_module):
+        session = MockSession(502)
+        breaker = CircuitBreaker(2, 60, clock=utils.FakeClock())
+        monkeypatch.setattr(homework_module, 'api_session', session)
+        monkeypatch.setattr(homework_module, 'api_breaker', breaker)
+        monkeypatch.setattr(
+            homework_module, 'error_notices', DedupCache(3600, 100),
+        )
+        tenants = [make_tenant(f'token-{index}', index) for index in range(5)]
+        states = {tenant.id: TenantState() for tenant in tenants}
+        outbound = utils.MockOutboundQueue()
+        for _ in range(3):
+            for tenant in tenants:
+                homework_module.poll_tenant(outbound, tenant, states[tenant.id])
+        assert session.calls == 2
+        notices = [
+            message for message in outbound.messages
+            if 'API Практикума недоступен' in message
+        ]
+        assert sorted(message.chat_id for message in notices) == [
+            str(index) for index in range(5)
+        ]
+
+    def test_client_errors_keep_breaker_closed(self, monkeypatch,
+                                               homework_module):
+        session = MockSession(401)
+        breaker = CircuitBreaker(1, 60, clock=utils.FakeClock())
+        monkeypatch.setattr(homework_module, 'api_session', session)
+        monkeypatch.setattr(homework_module, 'api_breaker', breaker)
+        tenant = make_tenant('token', 1)
+        outbound = utils.MockOutboundQueue()
+        for _ in range(3):
+            homework_module.poll_tenant(outbound, tenant, TenantState())
+        assert session.calls == 3
+        assert breaker.state == CLOSED
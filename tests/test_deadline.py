@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import utils
+from homework_bot.deadline import Budget, BudgetExceeded, DeadlineExceeded
+from homework_bot.engine import in_thread, run_bounded, run_cycle
+from homework_bot.scheduler import Scheduler
+from homework_bot.tenants import TenantState, make_tenant
+
+
+def answer(tenant):
+    return {'homeworks': [
+        {'homework_name': tenant.token, 'status': 'reviewing'},
+    ]}
+
+
+class TestDeadline:
+
+    def test_budget(self):
+        now = [0.0]
+        budget = Budget(10, clock=lambda: now[0])
+        now[0] = 4
+        assert budget.remaining() == 6 and not budget.expired()
+        now[0] = 12
+        assert budget.remaining() == 0 and budget.expired()
+        assert Budget(0).remaining() is None
+        assert not Budget(0).expired()
+
+    def test_run_bounded_cancels_over_budget(self):
+        async def job(item):
+            await asyncio.sleep(item)
+            return item
+
+        results = asyncio.run(run_bounded(job, [0, 0, 5, 5], 3, budget=0.1))
+        assert results[:2] == [0, 0]
+        assert all(
+            isinstance(result, BudgetExceeded) for result in results[2:]
+        )
+
+    def test_run_cycle_does_not_wait_for_abandoned_threads(self):
+        release = threading.Event()
+
+        async def cycle():
+            try:
+                await asyncio.wait_for(in_thread(release.wait, 5), 0.05)
+            except asyncio.TimeoutError:
+                return 'abandoned'
+
+        start = time.monotonic()
+        assert run_cycle(cycle(), 2) == 'abandoned'
+        assert time.monotonic() - start < 1
+        release.set()
+
+    def test_slow_tenant_overruns(self, monkeypatch, homework_module):
+        tenants = [make_tenant(f'token-{i}', i) for i in range(4)]
+        states = {tenant.id: TenantState() for tenant in tenants}
+        outbound = utils.MockOutboundQueue()
+        release = threading.Event()
+
+        def mock_get_tenant_answer(tenant, state):
+            if tenant is tenants[1]:
+                release.wait(5)
+                state.fingerprint = 'stale'
+            return answer(tenant)
+
+        monkeypatch.setattr(homework_module, 'POLL_CONCURRENCY', 4)
+        monkeypatch.setattr(homework_module, 'POLL_DEADLINE', 0.05)
+        monkeypatch.setattr(
+            homework_module, 'get_tenant_answer', mock_get_tenant_answer,
+        )
+        overruns = homework_module.OVERRUNS
+        before = overruns.series.get(('DeadlineExceeded',), 0)
+        changes = homework_module.poll_tenants(outbound, tenants, states)
+        assert changes == [1, 0, 1, 1]
+        slow = states[tenants[1].id]
+        assert slow.busy and slow.overran and not slow.statuses
+        assert len(outbound.messages) == 3
+        changes = homework_module.poll_tenants(outbound, tenants[1:2], states)
+        assert changes == [0]
+        assert overruns.series[('DeadlineExceeded',)] == before + 2
+        release.set()
+        for _ in range(100):
+            if not slow.busy:
+                break
+            time.sleep(0.01)
+        assert not slow.busy and slow.fingerprint is None
+
+    def test_cycle_budget_leaves_tenants_for_next_cycle(
+            self, monkeypatch, homework_module):
+        tenants = [make_tenant(f'token-{i}', i) for i in range(5)]
+        registry = {tenant.id: tenant for tenant in tenants}
+        states = {tenant.id: TenantState() for tenant in tenants}
+        outbound = utils.MockOutboundQueue()
+        scheduler = Scheduler(600, 300, 3600, jitter=0)
+        for tenant in tenants:
+            scheduler.add(tenant.id)
+
+        def mock_get_tenant_answer(tenant, state):
+            time.sleep(0.04)
+            return answer(tenant)
+
+        monkeypatch.setattr(homework_module, 'CYCLE_BUDGET', 0.1)
+        monkeypatch.setattr(
+            homework_module, 'get_tenant_answer', mock_get_tenant_answer,
+        )
+        homework_module.poll_due(outbound, registry, states, scheduler)
+        polled = len(outbound.messages)
+        assert 0 < polled < 5
+        left = [tenant.id for tenant in tenants[polled:]]
+        assert scheduler.pop_due() == left
+
+    def test_deadline_not_reported_to_student(self, homework_module):
+        state = TenantState()
+        state.busy = True
+        tenant = make_tenant('token', 1)
+        outbound = utils.MockOutboundQueue()
+        coroutine = homework_module.poll_tenant_async(outbound, tenant, state)
+        try:
+            asyncio.run(coroutine)
+        except DeadlineExceeded:
+            pass
+        assert outbound.messages == []
@@ -0,0 +1,134 @@
+import utils
+from homework_bot.dedup import DedupCache, error_class
+from homework_bot.storage import MemoryStore
+from homework_bot.tenants import TenantState, make_tenant
+
+
+class TestDedupCache:
+
+    def test_repeats_counted_within_ttl(self):
+        clock = utils.FakeClock()
+        cache = DedupCache(60, 10, clock=clock)
+        assert cache.check('a') == 0
+        assert cache.check('a') is None
+        assert cache.check('a') is None
+        clock.now += 60
+        assert cache.check('a') == 2
+        assert cache.check('a') is None
+
+    def test_least_recently_seen_evicted(self):
+        cache = DedupCache(60, 2, clock=utils.FakeClock())
+        cache.check('a')
+        cache.check('b')
+        cache.check('a')
+        cache.check('c')
+        assert len(cache) == 2
+        assert cache.check('a') is None
+        assert cache.check('b') == 0
+
+    def test_seed_and_pop(self):
+        clock = utils.FakeClock()
+        cache = DedupCache(60, 10, clock=clock)
+        cache.seed('a', clock.now - 30, 2)
+        assert cache.check('a') is None
+        assert cache.pop('a') == 3
+        assert cache.pop('a') is None
+        cache.seed('b', clock.now - 60)
+        assert cache.check('b') == 0
+
+    def test_error_class_ignores_numbers(self):
+        assert error_class(AssertionError('Код ответа API: 502')) == (
+            error_class(AssertionError('Код ответа API: 503'))
+        )
+        assert error_class(AssertionError('x')) != error_class(TypeError('x'))
+
+
+class TestErrorNotices:
+
+    def test_alternating_errors_sent_once(self, monkeypatch, homework_module):
+        clock = utils.FakeClock()
+        monkeypatch.setattr(
+            homework_module, 'error_notices',
+            DedupCache(3600, 100, clock=clock),
+        )
+        errors = [
+            AssertionError('Код ответа API: 502'),
+            TypeError('Ошибка преобразования к формату json'),
+        ]
+        tenant = make_tenant('token', 1)
+        state = TenantState()
+        messages = []
+        for _ in range(3):
+            for error in errors:
+                messages += homework_module.report_error(tenant, state, error)
+        assert len(messages) == 2
+        clock.now += 3600
+        messages = homework_module.report_error(tenant, state, errors[0])
+        assert 'повторилась 2 раз' in messages[0]
+        assert messages[0].chat_id == '1'
+
+    def test_tenants_deduplicated_separately(self, monkeypatch,
+                                             homework_module):
+        monkeypatch.setattr(
+            homework_module, 'error_notices', DedupCache(3600, 100),
+        )
+        outbound = utils.MockOutboundQueue()
+        error = AssertionError('Код ответа API: 502')
+        for chat_id in (1, 2, 1):
+            tenant = make_tenant(f'token-{chat_id}', chat_id)
+            for message in homework_module.report_error(
+                tenant, TenantState(), error,
+            ):
+                outbound.put(message)
+        assert [message.chat_id for message in outbound.messages] == [
+            '1', '2',
+        ]
+
+    def test_notice_not_repeated_after_restart(self, monkeypatch,
+                                               homework_module):
+        clock = utils.FakeClock()
+        monkeypatch.setattr(
+            homework_module, 'error_notices',
+            DedupCache(3600, 100, clock=clock),
+        )
+        tenant = make_tenant('token', 1)
+        store = MemoryStore()
+        states = homework_module.load_states(store, [tenant])
+        error = AssertionError('Код ответа API: 502')
+        assert homework_module.report_error(tenant, states[tenant.id], error)
+        homework_module.report_error(tenant, states[tenant.id], error)
+        store.save(states)
+
+        monkeypatch.setattr(
+            homework_module, 'error_notices',
+            DedupCache(3600, 100, clock=clock),
+        )
+        states = homework_module.load_states(store, [tenant])
+        clock.now += 60
+        assert not homework_module.report_error(
+            tenant, states[tenant.id], error,
+        )
+        clock.now += 3600
+        messages = homework_module.report_error(
+            tenant, states[tenant.id], error,
+        )
+        assert 'повторилась 2 раз' in messages[0]
+
+    def test_summary_sent_when_error_stops(self, monkeypatch,
+                                           homework_module):
+        monkeypatch.setattr(
+            homework_module, 'error_notices',
+            DedupCache(3600, 100, clock=utils.FakeClock()),
+        )
+        tenant = make_tenant('token', 1)
+        state = TenantState()
+        error = TypeError('Ошибка преобразования к формату json')
+        for _ in range(3):
+            homework_module.report_error(tenant, state, error)
+        messages = homework_module.resolve_error(tenant, state)
+        assert 'повторилась 2 раз' in messages[0]
+        assert messages[0].chat_id == '1'
+        assert not state.error
+        assert homework_module.resolve_error(tenant, state) == []
+        homework_module.report_error(tenant, state, error)
+        assert homework_module.resolve_error(tenant, state) == []
@@ -0,0 +1,58 @@
+from homework_bot.diff import diff_statuses, homework_key
+from homework_bot.tenants import TenantState, make_tenant
+
+
+class TestDiff:
+
+    def test_homework_key(self):
+        assert homework_key({'id': 7, 'homework_name': 'hw'}) == '7'
+        assert homework_key({'homework_name': 'hw'}) == 'hw'
+
+    def test_diff_whole_list(self):
+        known = {'1': 'reviewing', '2': 'approved'}
+        homeworks = [
+            {'id': 1, 'homework_name': 'first', 'status': 'approved'},
+            {'id': 2, 'homework_name': 'second', 'status': 'approved'},
+            {'id': 3, 'homework_name': 'third', 'status': 'reviewing'},
+        ]
+        changed = diff_statuses(known, homeworks)
+        assert [key for key, _ in changed] == ['1', '3']
+        assert known == {'1': 'reviewing', '2': 'approved'}
+
+    def test_render_only_for_changes(self, monkeypatch, homework_module):
+        parsed = []
+        render_status = homework_module.render_status
+
+        def mock_render_status(status_renderer, homework):
+            parsed.append(homework['id'])
+            return render_status(status_renderer, homework)
+
+        monkeypatch.setattr(
+            homework_module, 'render_status', mock_render_status,
+        )
+        tenant = make_tenant('token', 1)
+        state = TenantState(statuses={'1': 'reviewing'})
+        response = {'homeworks': [
+            {'id': 1, 'homework_name': 'first', 'status': 'reviewing'},
+            {'id': 2, 'homework_name': 'second', 'status': 'approved'},
+        ], 'current_date': 10}
+        messages = homework_module.check_tenant(tenant, state, response)
+        assert parsed == [2]
+        assert len(messages) == 1 and '"second"' in messages[0]
+        assert state.statuses == {'1': 'reviewing', '2': 'approved'}
+        assert homework_module.check_tenant(tenant, state, response) == []
+        assert parsed == [2]
+
+    def test_failed_render_keeps_statuses(self, homework_module):
+        tenant = make_tenant('token', 1)
+        state = TenantState()
+        response = {'homeworks': [
+            {'id': 1, 'homework_name': 'first', 'status': 'approved'},
+            {'id': 2, 'homework_name': 'second', 'status': 'unknown'},
+        ], 'current_date': 10}
+        try:
+            homework_module.check_tenant(tenant, state, response)
+        except KeyError:
+            pass
+        assert state.statuses == {}
+        assert state.timestamp == 0
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import utils
+from homework_bot.engine import in_thread, run_bounded, run_cycle
+from homework_bot.tenants import TenantState, make_tenant
+
+
+class TestEngine:
+
+    def test_run_bounded_limits_concurrency(self):
+        in_flight = []
+        peak = []
+
+        async def job(item):
+            in_flight.append(item)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.001)
+            in_flight.remove(item)
+            if item == 3:
+                raise ValueError(item)
+            return item * 2
+
+        results = asyncio.run(run_bounded(job, range(10), 3))
+        assert max(peak) == 3
+        assert results[:3] == [0, 2, 4]
+        assert isinstance(results[3], ValueError)
+
+    def test_run_cycle_uses_thread_pool(self):
+        async def cycle():
+            return await in_thread(threading.current_thread)
+
+        thread = run_cycle(cycle(), 2)
+        assert thread is not threading.main_thread()
+
+    def test_poll_tenants_concurrently(self, monkeypatch, homework_module):
+        tenants = [make_tenant(f'token-{i}', i) for i in range(20)]
+        states = {tenant.id: TenantState() for tenant in tenants}
+        outbound = utils.MockOutboundQueue()
+
+        def mock_get_tenant_answer(tenant, state):
+            return {'homeworks': [
+                {'homework_name': tenant.token, 'status': 'reviewing'},
+            ]}
+
+        monkeypatch.setattr(homework_module, 'POLL_CONCURRENCY', 5)
+        monkeypatch.setattr(
+            homework_module, 'get_tenant_answer', mock_get_tenant_answer,
+        )
+        changes = homework_module.poll_tenants(outbound, tenants, states)
+        assert changes == [1] * 20
+        sent = [message.chat_id for message in outbound.messages]
+        assert sorted(sent, key=int) == [str(i) for i in range(20)]
+        assert all(state.statuses for state in states.values())
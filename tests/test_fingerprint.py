@@ -0,0 +1,102 @@
+import json
+from http import HTTPStatus
+
+import utils
+from homework_bot.fingerprint import fingerprint
+from homework_bot.tenants import TenantState, make_tenant
+
+
+def answer(current_date, status='reviewing'):
+    return {
+        'homeworks': [{'id': 1, 'homework_name': 'hw', 'status': status}],
+        'current_date': current_date,
+    }
+
+
+class TestFingerprint:
+
+    def test_current_date_ignored(self):
+        first, first_date = fingerprint(json.dumps(answer(100)).encode())
+        second, second_date = fingerprint(json.dumps(answer(200)).encode())
+        changed, _ = fingerprint(json.dumps(answer(200, 'approved')).encode())
+        assert first == second != changed
+        assert (first_date, second_date) == (100, 200)
+        assert fingerprint(b'[]')[1] is None
+
+    def test_unchanged_answer_not_decoded(self, monkeypatch, homework_module):
+        responses = [
+            utils.MockJSONResponse(answer(100)),
+            utils.MockJSONResponse(answer(200)),
+            utils.MockJSONResponse(answer(300, 'approved')),
+        ]
+        monkeypatch.setattr(
+            homework_module, 'api_session', utils.MockAPISession(responses),
+        )
+        tenant = make_tenant('token', 1)
+        state = TenantState(timestamp=50)
+        results = [
+            homework_module.get_tenant_answer(tenant, state)
+            for _ in responses
+        ]
+        assert [response.decoded for response in responses] == [1, 0, 1]
+        assert results[1] is None
+        assert state.timestamp == 200
+
+    def test_conditional_request(self, monkeypatch, homework_module):
+        session = utils.MockAPISession([
+            utils.MockJSONResponse(answer(100), headers={'ETag': '"v1"'}),
+            utils.MockJSONResponse({}, status_code=HTTPStatus.NOT_MODIFIED),
+        ])
+        monkeypatch.setattr(homework_module, 'api_session', session)
+        tenant = make_tenant('token', 1)
+        state = TenantState(timestamp=50)
+        assert homework_module.get_tenant_answer(tenant, state)
+        assert homework_module.get_tenant_answer(tenant, state) is None
+        assert 'If-None-Match' not in session.requests[0][0]
+        assert session.requests[1][0]['If-None-Match'] == '"v1"'
+
+    def test_failed_check_forgets_fingerprint(self, monkeypatch,
+                                              homework_module):
+        responses = [
+            utils.MockJSONResponse(answer(100, 'unknown')),
+            utils.MockJSONResponse(answer(200, 'unknown')),
+        ]
+        monkeypatch.setattr(
+            homework_module, 'api_session', utils.MockAPISession(responses),
+        )
+        tenant = make_tenant('token', 1)
+        state = TenantState(timestamp=50)
+        errors = []
+        for _ in responses:
+            try:
+                homework_module.check_answer(
+                    tenant,
+                    state,
+                    homework_module.get_tenant_answer(tenant, state),
+                )
+            except KeyError as error:
+                errors.append(error)
+        assert len(errors) == 2
+        assert state.timestamp == 50
+
+    def test_undecodable_answer_checked_again(self, monkeypatch,
+                                              homework_module):
+        responses = []
+        for _ in range(2):
+            response = utils.MockJSONResponse(answer(100), headers={'ETag': '"v1"'})
+            response.content = b'{"homeworks": ['
+            responses.append(response)
+        session = utils.MockAPISession(responses)
+        monkeypatch.setattr(homework_module, 'api_session', session)
+        tenant = make_tenant('token', 1)
+        state = TenantState(timestamp=50)
+        errors = []
+        for _ in responses:
+            try:
+                homework_module.get_tenant_answer(tenant, state)
+            except TypeError as error:
+                errors.append(error)
+        assert len(errors) == 2
+        assert state.timestamp == 50
+        assert state.fingerprint is None and state.etag is None
+        assert 'If-None-Match' not in session.requests[1][0]
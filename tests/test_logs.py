@@ -0,0 +1,103 @@
+import json
+import logging
+import sys
+import time
+
+import pytest
+
+from homework_bot.logs import (
+    SAMPLE,
+    BoundedQueueHandler,
+    JsonFormatter,
+    queue_logging,
+)
+
+
+def make_record(message, level=logging.INFO, args=None, exc_info=None):
+    return logging.LogRecord(
+        'test', level, __file__, 1, message, args, exc_info,
+    )
+
+
+class SlowHandler(logging.Handler):
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.messages = []
+
+    def emit(self, record):
+        time.sleep(self.delay)
+        self.messages.append(self.format(record))
+
+
+class TestBoundedQueueHandler:
+
+    def test_drops_when_full_and_reports(self):
+        handler = BoundedQueueHandler(2)
+        for index in range(5):
+            handler.emit(make_record('message %s', args=(index,)))
+        assert handler.queue.qsize() == 2 and handler.dropped == 3
+        assert handler.queue.get().msg == 'message 0'
+        handler.queue.get()
+        handler.emit(make_record('after'))
+        summary = handler.queue.get()
+        assert summary.levelno == logging.WARNING
+        assert summary.msg.endswith(': 3')
+        assert handler.queue.get().msg == 'after'
+
+    def test_sample_policy_keeps_warnings(self):
+        handler = BoundedQueueHandler(20, SAMPLE, sample_rate=5)
+        for _ in range(30):
+            handler.emit(make_record('debug', logging.DEBUG))
+        handler.emit(make_record('warning', logging.WARNING))
+        messages = [
+            handler.queue.get().msg for _ in range(handler.queue.qsize())
+        ]
+        assert messages.count('debug') == 10 + 4
+        assert len(messages) == 14 + 4 + 1
+        assert messages[-1] == 'warning'
+
+    def test_traceback_left_to_writer(self):
+        handler = BoundedQueueHandler(1)
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            handler.emit(make_record('failed', exc_info=sys.exc_info()))
+        record = handler.queue.get()
+        assert record.exc_info[0] is ZeroDivisionError
+        assert record.exc_text is None
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            BoundedQueueHandler(1, 'block')
+
+
+class TestQueueLogging:
+
+    def test_logging_does_not_wait_for_output(self):
+        logger = logging.getLogger('test_logs.slow')
+        logger.propagate = False
+        output = SlowHandler(0.05)
+        queue_handler, writer = queue_logging(logger, output, 100)
+        try:
+            start = time.perf_counter()
+            for index in range(10):
+                logger.warning('message %s', index)
+            assert time.perf_counter() - start < 0.05
+        finally:
+            writer.close()
+            logger.removeHandler(queue_handler)
+        assert output.messages == [f'message {index}' for index in range(10)]
+        assert writer._thread is None
+
+    def test_json_formatter(self):
+        try:
+            raise KeyError('homework_name')
+        except KeyError:
+            record = make_record('Ключ %s', args=('homework_name',),
+                                 exc_info=sys.exc_info())
+        data = json.loads(JsonFormatter().format(record))
+        assert data['message'] == 'Ключ homework_name'
+        assert data['level'] == 'INFO'
+        assert 'KeyError' in data['exc_info']
@@ -0,0 +1,68 @@
+import math
+import urllib.request
+
+import requests
+
+import utils
+from homework_bot.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    start_metrics_server,
+)
+
+
+class TestMetrics:
+
+    def test_render(self):
+        registry = Registry()
+        counter = Counter(registry, 'calls_total', 'Calls.', ('status',))
+        gauge = Gauge(registry, 'depth', 'Depth.')
+        histogram = Histogram(
+            registry, 'latency_seconds', 'Latency.', buckets=(0.1, 1, math.inf),
+        )
+        counter.inc(status=200)
+        counter.inc(2, status=200)
+        counter.inc(status='a"b')
+        gauge.set_function(lambda: 7)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        text = registry.render()
+        assert '# TYPE calls_total counter' in text
+        assert 'calls_total{status="200"} 3' in text
+        assert 'calls_total{status="a\\"b"} 1' in text
+        assert 'depth 7' in text
+        assert 'latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{le="1"} 2' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+        assert 'latency_seconds_count 3' in text
+        assert 'latency_seconds_sum 5.55' in text
+
+    def test_server(self):
+        registry = Registry()
+        Counter(registry, 'up_total', 'Up.').inc()
+        server = start_metrics_server(registry, 0, host='127.0.0.1')
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(
+                f'http://127.0.0.1:{port}/metrics',
+            ) as response:
+                assert b'up_total 1' in response.read()
+        finally:
+            server.shutdown()
+
+    def test_api_calls_counted(self, monkeypatch, homework_module):
+        def mock_get(*args, **kwargs):
+            return utils.MockResponseGET(http_status=500)
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        responses = homework_module.API_RESPONSES
+        before = responses.series.get(('500',), 0)
+        count = sum(homework_module.API_LATENCY.series.get((), ([], 0))[0])
+        try:
+            homework_module.get_api_answer(0)
+        except AssertionError:
+            pass
+        assert responses.series[('500',)] == before + 1
+        assert sum(homework_module.API_LATENCY.series[()][0]) == count + 1
@@ -0,0 +1,75 @@
+import gc
+import tracemalloc
+
+import pytest
+
+from homework_bot.models import Status, intern_status
+from homework_bot.storage import SQLiteStore
+from homework_bot.tenants import TenantState, make_tenant
+
+MEMORY_PER_TENANT = 3 * 1024
+
+
+def api_homework(number, status='approved'):
+    return {
+        'id': number,
+        'homework_name': f'student__hw{number}.zip',
+        'status': status,
+        'reviewer_comment': 'Хорошая работа, но есть замечания. ' * 10,
+        'lesson_name': f'Урок {number}',
+        'date_updated': '2026-10-01T10:00:00Z',
+    }
+
+
+class TestModels:
+
+    def test_statuses_interned(self):
+        status = ''.join(['appr', 'oved'])
+        assert intern_status(status) is Status.APPROVED
+        assert intern_status(status) == 'approved'
+        assert f'{intern_status(status)}' == 'approved'
+        unknown = intern_status(''.join(['unkn', 'own']))
+        assert unknown is intern_status(''.join(['un', 'known']))
+        assert intern_status(None) is None
+
+    def test_states_share_status_objects(self, homework_module):
+        states = [TenantState(), TenantState()]
+        for number, state in enumerate(states):
+            homework_module.check_tenant(
+                make_tenant(f'token-{number}', number), state,
+                {'homeworks': [api_homework(number)]},
+            )
+        first, second = (
+            next(iter(state.statuses.values())) for state in states
+        )
+        assert first is second is Status.APPROVED
+
+    def test_store_interns_statuses(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        SQLiteStore(path).save({'a': TenantState(1, {'1': Status.REJECTED})})
+        state = SQLiteStore(path).load(['a'])['a']
+        assert state.statuses['1'] is Status.REJECTED
+
+    def test_memory_per_tenant(self, homework_module):
+        tenants = [make_tenant(f'token-{number}', number)
+                   for number in range(1000)]
+        gc.collect()
+        tracemalloc.start()
+        try:
+            states = {}
+            for tenant in tenants:
+                state = TenantState()
+                homework_module.check_tenant(tenant, state, {
+                    'homeworks': [
+                        api_homework(number, 'reviewing' if number % 2
+                                     else 'approved')
+                        for number in range(20)
+                    ],
+                    'current_date': 10 ** 9,
+                })
+                states[tenant.id] = state
+            gc.collect()
+            used, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert used / len(tenants) < MEMORY_PER_TENANT
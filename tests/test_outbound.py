@@ -0,0 +1,116 @@
+import logging
+import threading
+
+import pytest
+import telegram
+
+import utils
+from homework_bot.outbound import (
+    ERROR_PRIORITY,
+    OutboundQueue,
+    SendMessageError,
+)
+from homework_bot.ratelimit import TokenBucket
+from homework_bot.tenants import ChatMessage
+
+
+class TestTokenBucket:
+
+    def test_rate_and_burst(self):
+        bucket = TokenBucket(rate=2, capacity=2, now=0)
+        for _ in range(2):
+            assert bucket.delay(0) == 0
+            bucket.take(0)
+        assert bucket.delay(0) == pytest.approx(0.5)
+        assert bucket.delay(0.5) == 0
+
+    def test_block(self):
+        bucket = TokenBucket(rate=1, capacity=1, now=0)
+        bucket.block(10, now=0)
+        assert bucket.delay(5) == 5
+        assert not bucket.is_idle(5)
+        assert bucket.is_idle(10)
+
+
+class TestOutboundQueue:
+
+    def test_priority_and_chat_limit(self):
+        clock = utils.FakeClock(0.0)
+        queue = OutboundQueue(global_rate=30, chat_rate=1, clock=clock)
+        queue.put(ChatMessage('error', 1), ERROR_PRIORITY)
+        queue.put(ChatMessage('first', 1))
+        queue.put(ChatMessage('second', 1))
+        queue.put(ChatMessage('other chat', 2))
+
+        entry, wait = queue.pop_ready(clock())
+        assert entry[3] == 'first'
+        queue.bucket(1, clock()).take(clock())
+        entry, wait = queue.pop_ready(clock())
+        assert entry[3] == 'other chat'
+        queue.bucket(2, clock()).take(clock())
+        assert queue.pop_ready(clock()) == (None, 1)
+        clock.now = 1
+        entry, _ = queue.pop_ready(clock())
+        assert entry[3] == 'second'
+
+    def test_global_limit(self):
+        clock = utils.FakeClock(0.0)
+        queue = OutboundQueue(global_rate=2, chat_rate=100, clock=clock)
+        for chat_id in range(3):
+            queue.put(ChatMessage('text', chat_id))
+        for _ in range(2):
+            entry, _ = queue.pop_ready(clock())
+            queue.global_bucket.take(clock())
+        assert queue.pop_ready(clock()) == (None, 0.5)
+
+    def test_workers_send_and_retry_after(self):
+        sent = []
+        attempts = []
+
+        def sender(message):
+            attempts.append(message)
+            if len(attempts) == 1:
+                raise SendMessageError('flood', retry_after=0.01)
+            sent.append(message)
+
+        results = []
+        queue = OutboundQueue(global_rate=1000, chat_rate=1000)
+        queue.start(
+            sender, workers=2,
+            done=lambda message, error: results.append((message, error)),
+        )
+        queue.put(ChatMessage('hello', 1))
+        queue.put(ChatMessage('world', 2))
+        assert queue.flush(5)
+        queue.close(1)
+        assert sorted(sent) == ['hello', 'world']
+        assert len(attempts) == 3
+        assert sorted(results) == [('hello', None), ('world', None)]
+        assert len(queue) == 0
+
+    def test_put_never_blocks(self):
+        release = threading.Event()
+        queue = OutboundQueue(global_rate=1000)
+        queue.start(lambda message: release.wait(5))
+        for chat_id in range(100):
+            queue.put(ChatMessage('text', chat_id))
+        assert len(queue) == 100
+        assert not queue.flush(0.01)
+        release.set()
+        queue.close(5)
+
+
+class TestSendMessage:
+
+    def test_retry_after_passed(self, monkeypatch, caplog,
+                                homework_module):
+        bot = utils.MockTelegramBot()
+
+        def flood(chat_id=None, text=None, **kwargs):
+            raise telegram.error.RetryAfter(3)
+
+        monkeypatch.setattr(bot, 'send_message', flood)
+        with caplog.at_level(logging.ERROR):
+            with pytest.raises(SendMessageError) as error:
+                homework_module.send_message(bot, ChatMessage('text', 1))
+        assert error.value.retry_after == 3
@@ -0,0 +1,287 @@
+import threading
+import time
+
+import pytest
+
+import utils
+from homework_bot.outbound import (
+    ERROR_PRIORITY,
+    OutboundQueue,
+    SendMessageError,
+)
+from homework_bot.outbox import BY_TENANT, Outbox, merge
+from homework_bot.storage import MemoryStore, SQLiteStore
+from homework_bot.tenants import ChatMessage, TenantState
+
+
+def status_message(homework, status='approved', tenant='a', chat='1'):
+    return ChatMessage(
+        f'{homework} {status}', chat, (tenant, chat, homework, status),
+    )
+
+
+class TestOutboxStore:
+
+    @pytest.mark.parametrize('make_store', [
+        lambda path: MemoryStore(),
+        lambda path: SQLiteStore(str(path / 'state.sqlite3')),
+    ])
+    def test_pending_messages(self, tmp_path, make_store):
+        store = make_store(tmp_path)
+        first = ('a', '1', 'hw1', 'approved')
+        second = ('a', '1', 'hw2', None)
+        store.save({}, [(first, 'first', 10), (second, 'second', 5)])
+        store.save({}, [(first, 'again', 1)])
+        assert list(store.pending(7)) == [(second, 'second', 0)]
+        assert list(store.pending(10)) == [
+            (second, 'second', 0), (first, 'first', 0),
+        ]
+        store.acknowledge([second], [(first, 1, 20)])
+        assert list(store.pending(10)) == []
+        assert list(store.pending(20)) == [(first, 'first', 1)]
+
+    def test_messages_saved_with_states(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        store = SQLiteStore(path)
+        outbox = Outbox(store, utils.MockOutboundQueue())
+        outbox.put(status_message('hw1'))
+        outbox.save({'a': TenantState(100, {'hw1': 'approved'})})
+        store.close()
+        restarted = SQLiteStore(path)
+        assert restarted.load(['a'])['a'].statuses == {'hw1': 'approved'}
+        assert [row[1] for row in restarted.pending(time.time())] == [
+            'hw1 approved',
+        ]
+
+
+class TestOutbox:
+
+    def test_messages_sent_after_save(self):
+        outbound = utils.MockOutboundQueue()
+        outbox = Outbox(MemoryStore(), outbound)
+        notice = ChatMessage('error', '1')
+        outbox.put(status_message('hw1'))
+        outbox.put(notice, ERROR_PRIORITY)
+        assert outbound.messages == [notice]
+        assert outbox.take() == 0
+        outbox.save({})
+        assert outbox.take() == 1
+        assert outbox.take() == 0
+        message = outbound.messages[1]
+        assert message == 'hw1 approved' and message.chat_id == '1'
+        outbox.done(message, None)
+        assert outbox.acknowledge() == (1, 0, 0)
+        assert list(outbox.store.pending(outbox.clock())) == []
+
+    def test_failed_messages_backoff(self):
+        clock = utils.FakeClock()
+        outbound = utils.MockOutboundQueue()
+        outbox = Outbox(
+            MemoryStore(), outbound, backoff=5, max_attempts=3, clock=clock,
+        )
+        outbox.put(status_message('hw1'))
+        outbox.save({})
+        for delay in (5, 10):
+            assert outbox.take() == 1
+            outbox.done(outbound.messages[-1], SendMessageError('blocked'))
+            assert outbox.acknowledge() == (0, 1, 0)
+            clock.now += delay - 1
+            assert outbox.take() == 0
+            clock.now += 1
+        assert outbox.take() == 1
+        outbox.done(outbound.messages[-1], SendMessageError('blocked'))
+        assert outbox.acknowledge() == (0, 0, 1)
+        clock.now += 3600
+        assert outbox.take() == 0
+
+    def test_shared_chat_delivered_by_its_owner(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite3')
+        outbounds = [utils.MockOutboundQueue() for _ in range(2)]
+        outboxes = [
+            Outbox(SQLiteStore(path), outbound, owned={tenant})
+            for outbound, tenant in zip(outbounds, 'ab')
+        ]
+        for outbox, tenant, chats in zip(outboxes, 'ab', (['mentor'], [])):
+            outbox.shared = frozenset(['mentor'])
+            outbox.chats = frozenset(chats)
+            outbox.put(status_message('hw1', tenant=tenant, chat=tenant))
+            outbox.put(status_message('hw1', tenant=tenant, chat='mentor'))
+            outbox.save({})
+        assert [outbox.take() for outbox in outboxes] == [2, 1]
+        assert sorted(outbounds[0].messages) == [
+            'hw1 approved', 'hw1 approved\nhw1 approved',
+        ]
+        assert [message.chat_id for message in outbounds[1].messages] == [
+            'b',
+        ]
+        assert outboxes[0].pause(600) == 5
+        assert outboxes[1].pause(600) == 600
+
+    def test_batches_and_owned_tenants(self):
+        outbound = utils.MockOutboundQueue()
+        outbox = Outbox(
+            MemoryStore(), outbound, owned={'a'}, batch_size=2,
+        )
+        for homework in ('hw1', 'hw2', 'hw3'):
+            outbox.put(status_message(homework))
+        outbox.put(status_message('hw4', tenant='b'))
+        outbox.save({})
+        assert outbox.take() == 2
+        assert outbox.take() == 0
+        for message in outbound.messages:
+            outbox.done(message, None)
+        outbox.acknowledge()
+        assert outbox.take() == 1
+        assert outbox.take() == 0
+        assert sorted(outbound.messages) == [
+            'hw1 approved', 'hw2 approved', 'hw3 approved',
+        ]
+
+    def test_failed_send_retried_not_lost(self, homework_module):
+        attempts = []
+
+        def sender(message):
+            attempts.append(message)
+            if len(attempts) == 1:
+                raise SendMessageError('network')
+
+        clock = utils.FakeClock()
+        outbound = OutboundQueue(global_rate=1000, chat_rate=1000)
+        outbox = Outbox(MemoryStore(), outbound, clock=clock)
+        outbound.start(sender, done=outbox.done)
+        outbox.put(status_message('hw1'))
+        outbox.save({})
+        homework_module.deliver_outbox(outbox, outbound)
+        assert len(attempts) == 1
+        clock.now += outbox.backoff
+        homework_module.deliver_outbox(outbox, outbound)
+        outbound.close(1)
+        assert attempts == ['hw1 approved'] * 2
+        assert list(outbox.store.pending(clock.now + 3600)) == []
+
+    def test_delivered_in_background(self, homework_module):
+        release = threading.Event()
+        sent = []
+
+        def sender(message):
+            release.wait(5)
+            sent.append(message)
+
+        store = MemoryStore()
+        outbound = OutboundQueue(global_rate=1000, chat_rate=1000)
+        outbox = Outbox(store, outbound, batch_size=2)
+        outbound.start(sender, done=outbox.done)
+        homework_module.start_delivery(outbox)
+        for homework in ('hw1', 'hw2', 'hw3'):
+            outbox.put(status_message(homework, chat=homework))
+        start = time.monotonic()
+        outbox.save({})
+        assert time.monotonic() - start < 1
+        release.set()
+        for _ in range(200):
+            if not list(store.pending(time.time())):
+                break
+            time.sleep(0.01)
+        outbound.close(1)
+        assert sorted(sent) == ['hw1 approved', 'hw2 approved', 'hw3 approved']
+        assert list(store.pending(time.time())) == []
+
+
+class TestDigest:
+
+    def make_outbox(self, clock, **kwargs):
+        outbound = utils.MockOutboundQueue()
+        return Outbox(
+            MemoryStore(), outbound, window=60, clock=clock, **kwargs,
+        ), outbound
+
+    def test_window_merges_and_drops_superseded(self):
+        clock = utils.FakeClock()
+        outbox, outbound = self.make_outbox(clock)
+        outbox.put(status_message('hw1', 'reviewing'))
+        outbox.save({})
+        clock.now += 30
+        assert outbox.pause(600) == 30
+        outbox.put(status_message('hw1', 'approved'))
+        outbox.put(status_message('hw2', 'rejected', tenant='b'))
+        outbox.save({})
+        assert outbox.take() == 0
+        clock.now += 30
+        assert outbox.take() == 1
+        digest = outbound.messages[0]
+        assert digest == 'hw1 approved\nhw2 rejected'
+        assert digest.chat_id == '1'
+        outbox.done(digest, None)
+        assert outbox.acknowledge() == (1, 0, 0)
+        assert list(outbox.store.pending(clock.now)) == []
+
+    def test_window_reopens_after_delivery(self):
+        clock = utils.FakeClock()
+        outbox, outbound = self.make_outbox(clock)
+        outbox.put(status_message('hw1'))
+        outbox.save({})
+        clock.now += 60
+        outbox.take()
+        outbox.put(status_message('hw2'))
+        outbox.save({})
+        assert outbox.take() == 0
+        assert outbox.pause(600) == 60
+
+    def test_digest_per_tenant(self):
+        clock = utils.FakeClock()
+        outbox, outbound = self.make_outbox(clock, group_by=BY_TENANT)
+        outbox.put(status_message('hw1', tenant='a'))
+        outbox.put(status_message('hw2', tenant='a'))
+        outbox.put(status_message('hw3', tenant='b'))
+        outbox.save({})
+        clock.now += 60
+        assert outbox.take() == 2
+        assert sorted(outbound.messages) == [
+            'hw1 approved\nhw2 approved', 'hw3 approved',
+        ]
+
+    def test_failed_digest_retried_whole(self):
+        clock = utils.FakeClock()
+        outbox, outbound = self.make_outbox(clock)
+        outbox.put(status_message('hw1'))
+        outbox.put(status_message('hw2'))
+        outbox.save({})
+        clock.now += 60
+        outbox.take()
+        outbox.done(outbound.messages[0], SendMessageError('network'))
+        assert outbox.acknowledge() == (0, 1, 0)
+        assert outbox.pause(600) == outbox.backoff
+        clock.now += outbox.backoff
+        assert outbox.take() == 1
+        assert outbound.messages[1] == outbound.messages[0]
+
+    def test_merge_splits_long_digests(self):
+        rows = [
+            (('a', '1', f'hw{number}', 'approved'), 'x' * 40, 0)
+            for number in range(5)
+        ]
+        messages = merge(rows, limit=100)
+        assert [len(text) for text, _ in messages] == [81, 81, 40]
+        assert sum(len(keys) for _, keys in messages) == 5
+
+    def test_unknown_grouping(self):
+        with pytest.raises(ValueError):
+            Outbox(MemoryStore(), utils.MockOutboundQueue(), group_by='x')
+
+    def test_shared_chat_batched_without_window(self):
+        outbound = utils.MockOutboundQueue()
+        outbox = Outbox(MemoryStore(), outbound)
+        outbox.shared = frozenset(['mentor'])
+        for tenant in ('a', 'b'):
+            outbox.put(status_message('hw1', tenant=tenant))
+            outbox.put(status_message('hw1', tenant=tenant, chat='mentor'))
+        outbox.save({})
+        assert outbox.take() == 3
+        mentor = [
+            message for message in outbound.messages
+            if message.chat_id == 'mentor'
+        ]
+        assert mentor == ['hw1 approved\nhw1 approved']
+        outbox.done(mentor[0], None)
+        assert outbox.acknowledge() == (1, 0, 0)
+        assert len(list(outbox.store.pending(outbox.clock()))) == 2
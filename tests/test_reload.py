@@ -0,0 +1,161 @@
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from homework_bot.reload import (
+    FileWatcher,
+    ReloadSignal,
+    diff_tenants,
+)
+from homework_bot.scheduler import Scheduler
+from homework_bot.storage import MemoryStore
+from homework_bot.tenants import TenantState, make_tenant
+
+
+def write_registry(path, tenants):
+    path.write_text(json.dumps({'tenants': tenants}))
+
+
+class TestReloadTriggers:
+
+    def test_file_watcher(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        watcher = FileWatcher([str(path)])
+        assert not watcher.changed()
+        path.write_text('{}')
+        assert watcher.changed()
+        assert not watcher.changed()
+        os.utime(path, ns=(0, 0))
+        assert watcher.changed()
+
+    @pytest.mark.skipif(
+        not hasattr(signal, 'SIGHUP'), reason='no SIGHUP on this platform',
+    )
+    def test_sighup_interrupts_sleep(self):
+        reload_signal = ReloadSignal()
+        previous = signal.signal(signal.SIGHUP, reload_signal.handle)
+        try:
+            threading.Timer(
+                0.1, os.kill, (os.getpid(), signal.SIGHUP),
+            ).start()
+            start = time.monotonic()
+            assert reload_signal.wait(5)
+            assert time.monotonic() - start < 4
+            reload_signal.handle(signal.SIGHUP, None)
+        finally:
+            signal.signal(signal.SIGHUP, previous)
+        assert reload_signal.pop()
+        assert not reload_signal.pop()
+
+    def test_diff_tenants(self):
+        first, second = make_tenant('token-1', 1), make_tenant('token-2', 2)
+        registry = {first.id: first, second.id: second}
+        third = make_tenant('token-3', 3)
+        moved = make_tenant('token-2', 20)
+        assert diff_tenants(registry, [moved, third]) == (
+            [third], [first.id], [moved],
+        )
+
+
+class TestReloadConfig:
+
+    def test_only_affected_tenants_rescheduled(self, monkeypatch, tmp_path,
+                                               homework_module):
+        path = tmp_path / 'tenants.json'
+        write_registry(path, [
+            {'token': 'token-1', 'chat_id': 1, 'name': 'first'},
+            {'token': 'token-2', 'chat_id': 2, 'name': 'second'},
+            {'token': 'token-3', 'chat_id': 3, 'name': 'third'},
+        ])
+        monkeypatch.setattr(homework_module, 'TENANTS_FILE', str(path))
+        registry = {
+            tenant.id: tenant for tenant in homework_module.load_registry()
+        }
+        states = {tenant_id: TenantState(100) for tenant_id in registry}
+        states['second'].fingerprint = b'digest'
+        scheduler = Scheduler(600, 300, 3600, jitter=0)
+        for tenant_id in registry:
+            scheduler.add(tenant_id)
+        scheduler.pop_due()
+        for tenant_id in registry:
+            scheduler.reschedule(tenant_id, {}, False)
+        store = MemoryStore()
+        store.save({'fourth': TenantState(200, {'1': 'approved'})})
+        write_registry(path, [
+            {'token': 'token-2b', 'chat_id': 2, 'name': 'second'},
+            {'token': 'token-3', 'chat_id': 3, 'name': 'third'},
+            {'token': 'token-4', 'chat_id': 4, 'name': 'fourth'},
+        ])
+        assert homework_module.reload_registry(
+            registry, states, store, scheduler,
+        ) == (1, 1, 1)
+        assert sorted(registry) == ['fourth', 'second', 'third']
+        assert sorted(states) == ['fourth', 'second', 'third']
+        assert states['fourth'].statuses == {'1': 'approved'}
+        assert states['second'].fingerprint is None
+        assert registry['second'].token == 'token-2b'
+        assert sorted(scheduler.pop_due()) == ['fourth', 'second']
+
+    def test_broken_registry_kept(self, monkeypatch, tmp_path,
+                                  homework_module):
+        path = tmp_path / 'tenants.json'
+        write_registry(path, [{'token': 'token-1', 'chat_id': 1}])
+        monkeypatch.setattr(homework_module, 'TENANTS_FILE', str(path))
+        monkeypatch.setattr(homework_module, 'ENV_FILE', '')
+        for name in homework_module.RELOADABLE + ('HEADERS',):
+            monkeypatch.setattr(
+                homework_module, name, getattr(homework_module, name),
+            )
+        registry = {
+            tenant.id: tenant for tenant in homework_module.load_registry()
+        }
+        path.write_text('{"tenants": [{"chat_id": 1}]}')
+        monkeypatch.setenv('MIN_RETRY_PERIOD', '120')
+        scheduler = Scheduler(600, 300, 3600)
+        homework_module.reload_config(registry, {}, MemoryStore(), scheduler)
+        assert len(registry) == 1
+        assert homework_module.MIN_RETRY_PERIOD == 120
+        assert scheduler.min_period == 120
+
+    def isolate_settings(self, monkeypatch, homework_module):
+        for name in homework_module.RELOADABLE + ('HEADERS',):
+            monkeypatch.setattr(
+                homework_module, name, getattr(homework_module, name),
+            )
+
+    def test_bad_setting_keeps_old_values(self, monkeypatch, tmp_path,
+                                          homework_module):
+        path = tmp_path / 'tenants.json'
+        write_registry(path, [{'token': 'token-1', 'chat_id': 1}])
+        monkeypatch.setattr(homework_module, 'ENV_FILE', '')
+        monkeypatch.setattr(homework_module, 'TENANTS_FILE', str(path))
+        self.isolate_settings(monkeypatch, homework_module)
+        minimum = homework_module.MIN_RETRY_PERIOD
+        deadline = homework_module.POLL_DEADLINE
+        monkeypatch.setenv('MIN_RETRY_PERIOD', '120')
+        monkeypatch.setenv('POLL_DEADLINE', 'abc')
+        scheduler = Scheduler(600, 300, 3600)
+        registry = {}
+        homework_module.reload_config(registry, {}, MemoryStore(), scheduler)
+        assert homework_module.MIN_RETRY_PERIOD == minimum
+        assert homework_module.POLL_DEADLINE == deadline
+        assert scheduler.min_period == 300
+        assert len(registry) == 1
+
+    def test_environment_wins_over_env_file(self, monkeypatch, tmp_path,
+                                            homework_module):
+        env_file = tmp_path / '.env'
+        env_file.write_text('MIN_RETRY_PERIOD=60\nMAX_RETRY_PERIOD=900\n')
+        monkeypatch.setattr(homework_module, 'ENV_FILE', str(env_file))
+        monkeypatch.setattr(
+            homework_module, 'DEPLOYMENT_ENV', frozenset({'MIN_RETRY_PERIOD'}),
+        )
+        self.isolate_settings(monkeypatch, homework_module)
+        monkeypatch.setenv('MIN_RETRY_PERIOD', '120')
+        homework_module.reload_settings()
+        assert homework_module.MIN_RETRY_PERIOD == 120
+        assert homework_module.MAX_RETRY_PERIOD == 900
@@ -0,0 +1,68 @@
+import pytest
+
+from homework_bot.render import STATUS_TEMPLATES, Renderer, build_renderer
+from homework_bot.tenants import TenantState, make_tenant
+
+
+class TestRenderer:
+
+    def test_matches_format(self, homework_module):
+        renderer = Renderer(
+            STATUS_TEMPLATES['ru'], homework_module.HOMEWORK_VERDICTS,
+        )
+        for status, verdict in homework_module.HOMEWORK_VERDICTS.items():
+            expected = STATUS_TEMPLATES['ru'].format(
+                name='hw {name}', verdict=verdict,
+            )
+            assert renderer.render('hw {name}', status) == expected
+        with pytest.raises(KeyError):
+            renderer.render('hw', 'unknown')
+
+    def test_cache_bounded(self):
+        renderer = Renderer('{name}: {verdict}', {'a': 'A'}, cache_size=2)
+        for name in ('x', 'y', 'z', 'x'):
+            renderer.render(name, 'a')
+        info = renderer.render.cache_info()
+        assert info.currsize == 2 and info.misses == 4
+        renderer.render('x', 'a')
+        assert renderer.render.cache_info().hits == 1
+
+    def test_build_renderer_overrides_verdicts(self):
+        renderer = build_renderer(
+            'en', {'approved': 'Done!'}, {'approved': 'Готово'},
+        )
+        assert renderer.render('hw', 'approved').endswith(
+            '"hw" has changed. Done!',
+        )
+        assert renderer.render('hw', 'rejected').endswith('some remarks.')
+
+
+class TestTenantRenderer:
+
+    def test_tenant_locale_and_verdicts(self, homework_module):
+        default = make_tenant('token-1', 1)
+        english = make_tenant('token-2', 2, locale='en')
+        custom = make_tenant('token-3', 3, verdicts={'approved': 'Зачтено'})
+        assert homework_module.tenant_renderer(default) is (
+            homework_module.renderer
+        )
+        other = make_tenant('token-4', 4, locale='en')
+        assert homework_module.tenant_renderer(english) is (
+            homework_module.tenant_renderer(other)
+        )
+        response = {'homeworks': [
+            {'id': 1, 'homework_name': 'hw', 'status': 'approved'},
+        ], 'current_date': 10}
+        messages = [
+            homework_module.check_tenant(tenant, TenantState(), response)[0]
+            for tenant in (default, english, custom)
+        ]
+        assert messages[0] == homework_module.parse_status(
+            response['homeworks'][0],
+        )
+        assert messages[1].startswith('The review status of "hw"')
+        assert messages[2].endswith('"hw". Зачтено')
+
+    def test_unknown_locale_rejected(self):
+        with pytest.raises(ValueError):
+            make_tenant('token', 1, locale='xx')
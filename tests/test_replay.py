@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import utils
+from benchmarks.replay import run_replay
+from homework_bot.replay import RecordingSession, ReplaySession
+from homework_bot.tenants import TenantState, make_tenant
+
+
+def headers(token):
+    return {'Authorization': f'OAuth {token}'}
+
+
+def record(path, answers):
+    clock = utils.FakeClock()
+    session = RecordingSession(utils.MockAPISession(answers), path, clock=clock)
+    for token in ('secret-1', 'secret-2', 'secret-1'):
+        try:
+            session.get('url', headers=headers(token), params={'from_date': 0})
+        except ConnectionError:
+            pass
+        clock.now += 10
+    session.close()
+
+
+class TestRecordReplay:
+
+    def test_round_trip_without_tokens(self, tmp_path):
+        path = tmp_path / 'record.jsonl'
+        record(path, [
+            utils.MockJSONResponse({'homeworks': [], 'current_date': 1},
+                         headers={'ETag': '"v1"'}),
+            utils.MockJSONResponse({'detail': 'error'}, status_code=502),
+            ConnectionError('no network'),
+        ])
+        assert 'secret' not in path.read_text()
+        replay = ReplaySession(path, speed=0)
+        first = replay.get('url', headers=headers('secret-1'))
+        assert first.json() == {'homeworks': [], 'current_date': 1}
+        assert first.headers == {'ETag': '"v1"'}
+        second = replay.get('url', headers=headers('secret-2'))
+        assert second.status_code == 502
+        with pytest.raises(ConnectionError):
+            replay.get('url', headers=headers('secret-1'))
+        other = replay.get('url', headers=headers('unknown'))
+        assert other.json()['current_date'] == 1
+
+    def test_paced_by_speed(self, tmp_path):
+        path = tmp_path / 'record.jsonl'
+        record(path, [utils.MockJSONResponse({'homeworks': []})] * 3)
+        clock = utils.FakeClock()
+        replay = ReplaySession(path, speed=2, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            replay.get('url', headers=headers('unknown'))
+        assert clock.sleeps == [5, 5]
+
+    def test_empty_record(self, tmp_path):
+        path = tmp_path / 'record.jsonl'
+        path.write_text('')
+        with pytest.raises(ValueError):
+            ReplaySession(path)
+
+    def test_replayed_answers_checked(self, monkeypatch, tmp_path,
+                                      homework_module):
+        path = tmp_path / 'record.jsonl'
+        record(path, [utils.MockJSONResponse({
+            'homeworks': [{'id': 1, 'homework_name': 'hw',
+                           'status': 'approved'}],
+            'current_date': 100,
+        })] * 3)
+        monkeypatch.setattr(homework_module, 'API_REPLAY', str(path))
+        monkeypatch.setattr(homework_module, 'API_REPLAY_SPEED', 0)
+        monkeypatch.setattr(homework_module, 'api_session', None)
+        homework_module.open_api_traffic()
+        tenant = make_tenant('secret-2', 1)
+        state = TenantState()
+        response = homework_module.get_tenant_answer(tenant, state)
+        messages = homework_module.check_answer(tenant, state, response)
+        assert len(messages) == 1 and '"hw"' in messages[0]
+
+    def test_benchmark(self, tmp_path, homework_module):
+        path = tmp_path / 'record.jsonl'
+        record(path, [utils.MockJSONResponse({
+            'homeworks': [{'id': 1, 'homework_name': 'hw',
+                           'status': 'reviewing'}],
+            'current_date': 100,
+        })] * 3)
+        result = run_replay({'record': path, 'tenants': 4, 'cycles': 2})
+        assert result['check_count'] == 8
+        assert homework_module.api_session is None
@@ -0,0 +1,107 @@
+import random
+
+import utils
+from homework_bot.scheduler import Scheduler
+
+
+def make_scheduler(clock, jitter=0.0):
+    return Scheduler(
+        600, 300, 3600, backoff=2, jitter=jitter, clock=clock,
+        rng=random.Random(1),
+    )
+
+
+class TestScheduler:
+
+    def test_new_tenants_polled_right_away(self):
+        clock = utils.FakeClock()
+        scheduler = make_scheduler(clock)
+        scheduler.add('a')
+        scheduler.add('b')
+        assert sorted(scheduler.pop_due()) == ['a', 'b']
+        assert scheduler.pop_due() == []
+
+    def test_intervals_follow_statuses(self):
+        clock = utils.FakeClock()
+        scheduler = make_scheduler(clock)
+        scheduler.add('a')
+        scheduler.pop_due()
+        assert scheduler.reschedule('a', {'1': 'reviewing'}, True) == 300
+        assert scheduler.reschedule('a', {'1': 'approved'}, True) == 600
+        intervals = [
+            scheduler.reschedule('a', {'1': 'approved'}, False)
+            for _ in range(4)
+        ]
+        assert intervals == [1200, 2400, 3600, 3600]
+
+    def test_jitter_within_bounds(self):
+        clock = utils.FakeClock()
+        scheduler = make_scheduler(clock, jitter=0.2)
+        intervals = set()
+        for i in range(50):
+            scheduler.add(i)
+            intervals.add(scheduler.reschedule(i, {}, True))
+        assert len(intervals) > 1
+        assert all(600 <= interval <= 720 for interval in intervals)
+        assert scheduler.reschedule(0, {'1': 'reviewing'}, False) >= 300
+        for _ in range(5):
+            scheduler.reschedule(1, {}, False)
+        dormant = set()
+        for _ in range(20):
+            dormant.add(scheduler.reschedule(1, {}, False))
+        assert len(dormant) > 10
+        assert all(2880 <= interval <= 3600 for interval in dormant)
+
+    def test_first_polls_spread(self):
+        clock = utils.FakeClock()
+        scheduler = make_scheduler(clock, jitter=0.1)
+        for i in range(100):
+            scheduler.add(i)
+        assert scheduler.pop_due() == [0]
+        assert scheduler.unpolled == set(range(100))
+        scheduler.reschedule(0, {}, True)
+        assert 0 not in scheduler.unpolled
+        clock.now += 30
+        first_half = scheduler.pop_due()
+        assert 20 < len(first_half) < 80
+        clock.now += 30
+        assert len(first_half) + len(scheduler.pop_due()) == 99
+
+    def test_first_polls_not_spread(self):
+        scheduler = make_scheduler(utils.FakeClock(), jitter=0.1)
+        for tenant_id in range(10):
+            scheduler.add(tenant_id, spread=False)
+        assert scheduler.pop_due() == list(range(10))
+
+    def test_pause_until_next_due(self):
+        clock = utils.FakeClock()
+        scheduler = make_scheduler(clock)
+        assert scheduler.pause(600) == 600
+        scheduler.add('a')
+        assert scheduler.pause(600) == 0
+        scheduler.pop_due()
+        scheduler.reschedule('a', {'1': 'reviewing'}, False)
+        clock.now += 100.5
+        assert scheduler.pause(600) == 200
+        clock.now += 500
+        assert 'a' in scheduler.pop_due()
+
+    def test_removed_tenant_not_rescheduled(self):
+        scheduler = make_scheduler(utils.FakeClock())
+        scheduler.add('a')
+        scheduler.remove('a')
+        assert scheduler.reschedule('a', {}, True) is None
+        assert scheduler.pop_due() == []
+
+    def test_restored_tenant_keeps_its_turn(self):
+        clock = utils.FakeClock()
+        scheduler = make_scheduler(clock)
+        scheduler.add('a')
+        clock.now += 10
+        scheduler.add('b')
+        assert scheduler.pop_due() == ['a', 'b']
+        scheduler.reschedule('a', {}, True)
+        scheduler.restore('b')
+        clock.now += 10
+        scheduler.add('c')
+        assert scheduler.pop_due() == ['b', 'c']
@@ -0,0 +1,37 @@
+from homework_bot.session import build_session
+
+
+class TestSession:
+
+    def test_build_session(self):
+        session = build_session(pool_size=25, retries=2, backoff=0.1)
+        adapter = session.get_adapter('https://practicum.yandex.ru/')
+        assert adapter._pool_maxsize == 25
+        assert adapter.max_retries.total == 2
+        assert 503 in adapter.max_retries.status_forcelist
+        assert session.get_adapter('http://localhost/') is adapter
+
+    def test_pooled_session_used_with_timeout(self, monkeypatch,
+                                              homework_module):
+        calls = []
+
+        class MockSession:
+            def get(self, url, **kwargs):
+                calls.append(kwargs)
+                raise ConnectionError('no network')
+
+        monkeypatch.setattr(homework_module, 'api_session', MockSession())
+        try:
+            homework_module.get_api_answer(0)
+        except AssertionError:
+            pass
+        connect_timeout, read_timeout = calls[0]['timeout']
+        assert connect_timeout == homework_module.CONNECT_TIMEOUT
+        assert read_timeout == homework_module.READ_TIMEOUT
+
+    def test_open_api_session(self, monkeypatch, homework_module):
+        monkeypatch.setattr(homework_module, 'api_session', None)
+        monkeypatch.setattr(homework_module, 'POLL_CONCURRENCY', 40)
+        homework_module.open_api_session()
+        adapter = homework_module.api_session.get_adapter('https://')
+        assert adapter._pool_maxsize == 40
@@ -0,0 +1,133 @@
+import os
+import time
+
+import pytest
+
+from homework_bot.outbox import Outbox
+from homework_bot.sharding import HashRing
+from homework_bot.storage import MemoryStore
+from homework_bot.supervisor import Supervisor
+from homework_bot.tenants import make_tenant
+
+KEYS = [f'tenant-{index}' for index in range(10000)]
+
+
+def crash_once(shard, shards, directory):
+    marker = os.path.join(directory, shard)
+    with open(marker + '.shards', 'w') as file:
+        file.write(','.join(shards))
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(3)
+
+
+class TestHashRing:
+
+    def test_keys_spread_evenly(self):
+        ring = HashRing(['a', 'b', 'c', 'd'])
+        counts = {}
+        for key in KEYS:
+            node = ring.node_for(key)
+            counts[node] = counts.get(node, 0) + 1
+        assert len(ring) == 4
+        assert min(counts.values()) > len(KEYS) / 4 * 0.7
+
+    def test_adding_node_moves_its_share(self):
+        ring = HashRing(['a', 'b', 'c', 'd'])
+        before = {key: ring.node_for(key) for key in KEYS}
+        ring.add('e')
+        moved = [key for key in KEYS if ring.node_for(key) != before[key]]
+        assert all(ring.node_for(key) == 'e' for key in moved)
+        assert len(moved) < len(KEYS) / 5 * 1.4
+        ring.remove('e')
+        assert {key: ring.node_for(key) for key in KEYS} == before
+
+    def test_empty_ring(self):
+        with pytest.raises(LookupError):
+            HashRing().node_for('key')
+
+
+class TestSupervisor:
+
+    def test_crashed_worker_restarted_with_its_shard(self, tmp_path):
+        def target(shard, shards):
+            crash_once(shard, shards, str(tmp_path))
+
+        restarts = []
+        supervisor = Supervisor(['w0', 'w1'], target, backoff=0.05)
+        supervisor.run(
+            interval=0.05,
+            on_restart=lambda shard, code: restarts.append((shard, code)),
+        )
+        assert sorted(restarts) == [('w0', 3), ('w1', 3)]
+        assert (tmp_path / 'w1.shards').read_text() == 'w0,w1'
+        assert supervisor.processes == {}
+        assert supervisor.failed == {}
+
+    def test_crash_loop_backs_off_and_gives_up(self):
+        def target(shard, shards):
+            os._exit(2)
+
+        restarts = []
+        given_up = []
+        supervisor = Supervisor(
+            ['w0'], target, backoff=0.05, max_backoff=0.1, max_failures=3,
+        )
+        start = time.monotonic()
+        supervisor.run(
+            interval=0.01,
+            on_restart=lambda shard, code: restarts.append(time.monotonic()),
+            on_give_up=lambda shard, code: given_up.append((shard, code)),
+        )
+        assert len(restarts) == 3
+        assert given_up == [('w0', 2)]
+        assert supervisor.failed == {'w0': 2}
+        delays = [
+            later - earlier
+            for earlier, later in zip([start] + restarts, restarts)
+        ]
+        assert delays[1] >= 0.1 and delays[2] >= 0.1
+        assert supervisor.processes == {} and supervisor.waiting == {}
+
+
+class TestShardedRegistry:
+
+    def test_shared_chat_has_one_owner(self, monkeypatch, tmp_path,
+                                       homework_module):
+        tenants = [
+            make_tenant(f'token-{index}', index, subscribers=['mentor'])
+            for index in range(20)
+        ]
+        shards = ('worker-0', 'worker-1', 'worker-2')
+        monkeypatch.setattr(homework_module, 'SHARDS', shards)
+        monkeypatch.setattr(
+            homework_module, 'STATE_STORE', f'sqlite:///{tmp_path}/db',
+        )
+        owners = []
+        for shard in shards:
+            monkeypatch.setattr(homework_module, 'SHARD', shard)
+            outbox = Outbox(MemoryStore(), None)
+            homework_module.route_chats(outbox, tenants)
+            assert outbox.shared == {'mentor'}
+            owners.extend(outbox.chats)
+        assert owners == ['mentor']
+
+    def test_workers_split_tenants(self, monkeypatch, tmp_path,
+                                   homework_module):
+        path = tmp_path / 'tenants.json'
+        path.write_text('{"tenants": [%s]}' % ','.join(
+            '{"token": "token-%s", "chat_id": %s}' % (index, index)
+            for index in range(50)
+        ))
+        monkeypatch.setattr(homework_module, 'TENANTS_FILE', str(path))
+        shards = ('worker-0', 'worker-1', 'worker-2')
+        monkeypatch.setattr(homework_module, 'SHARDS', shards)
+        loaded = []
+        for shard in shards:
+            monkeypatch.setattr(homework_module, 'SHARD', shard)
+            loaded.append(homework_module.load_registry())
+        ids = sorted(tenant.id for tenants in loaded for tenant in tenants)
+        assert ids == sorted(
+            make_tenant(f'token-{index}', index).id for index in range(50)
+        )
+        assert all(loaded)
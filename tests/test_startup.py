@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import telegram
+
+from homework_bot.storage import open_store
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('telegram', 'requests', 'asyncio', 'http.server')
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import homework
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+''' % (HEAVY_MODULES,)
+
+
+class MockBot:
+
+    def __init__(self, token=None):
+        self.sent = []
+
+    def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+class TestStartup:
+
+    def test_import_is_light(self):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_SCRIPT],
+            cwd=ROOT_DIR, capture_output=True, check=True, text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        print('import homework: {:.3f} s'.format(result['seconds']))
+        assert result['loaded'] == []
+        assert result['seconds'] < 2
+
+    def test_once_option(self, homework_module):
+        assert homework_module.parse_args(['--once']).once
+        assert not homework_module.parse_args([]).once
+
+    def test_once_polls_saves_and_exits(self, monkeypatch, tmp_path,
+                                        homework_module):
+        bots = []
+        current_date = int(time.time()) + 100
+
+        def mock_bot(token=None):
+            bots.append(MockBot(token))
+            return bots[-1]
+
+        def mock_get_tenant_answer(tenant, state):
+            return {'homeworks': [
+                {'id': 1, 'homework_name': 'hw', 'status': 'approved'},
+            ], 'current_date': current_date}
+
+        def wait_forbidden(timeout):
+            raise AssertionError('--once must not sleep')
+
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps({'tenants': [
+            {'token': f'token{index}', 'chat_id': index}
+            for index in range(5)
+        ]}))
+        url = f'sqlite:///{tmp_path}/state.sqlite3'
+        monkeypatch.setattr(telegram, 'Bot', mock_bot)
+        monkeypatch.setattr(
+            homework_module.reload_signal, 'wait', wait_forbidden,
+        )
+        monkeypatch.setattr(
+            homework_module, 'get_tenant_answer', mock_get_tenant_answer,
+        )
+        for name, value in (
+            ('RUN_ONCE', True),
+            ('STATE_STORE', url),
+            ('TENANTS_FILE', str(path)),
+            ('RETRY_JITTER', 0.1),
+            ('api_session', None),
+            ('api_breaker', None),
+            ('TELEGRAM_TOKEN', '1234:abcdefg'),
+        ):
+            monkeypatch.setattr(homework_module, name, value)
+        start = time.perf_counter()
+        homework_module.main()
+        print('main --once: {:.3f} s'.format(time.perf_counter() - start))
+        assert sorted(chat_id for chat_id, _ in bots[0].sent) == [
+            '0', '1', '2', '3', '4',
+        ]
+        tenant = homework_module.make_tenant('token4', 4)
+        state = open_store(url).load([tenant.id])[tenant.id]
+        assert state.timestamp == current_date
+        assert state.statuses == {'1': 'approved'}
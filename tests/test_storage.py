@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+from homework_bot.storage import (
+    MemoryStore,
+    SQLiteStore,
+    StateStore,
+    open_store,
+)
+from homework_bot.tenants import TenantState
+
+
+class TestStorage:
+
+    def test_sqlite_survives_restart(self, tmp_path):
+        path = tmp_path / 'state.sqlite3'
+        store = SQLiteStore(path)
+        store.save({
+            'a': TenantState(100, {'1': 'approved', '2': 'reviewing'}),
+            'b': TenantState(200, {}, 'timeout'),
+        })
+        store.close()
+
+        store = SQLiteStore(path)
+        states = store.load(['a', 'c'])
+        assert list(states) == ['a']
+        assert states['a'].timestamp == 100
+        assert states['a'].statuses == {'1': 'approved', '2': 'reviewing'}
+        mode = store.connection.execute('PRAGMA journal_mode').fetchone()[0]
+        assert mode == 'wal'
+
+    def test_sqlite_adds_error_notice_columns(self, tmp_path):
+        path = tmp_path / 'state.sqlite3'
+        connection = sqlite3.connect(path)
+        connection.execute(
+            'CREATE TABLE tenants (id TEXT PRIMARY KEY, '
+            'timestamp INTEGER NOT NULL, error TEXT NOT NULL)',
+        )
+        connection.execute("INSERT INTO tenants VALUES ('a', 100, '')")
+        connection.commit()
+        connection.close()
+
+        store = SQLiteStore(path)
+        assert store.load(['a'])['a'].error_sent == 0
+        store.save({'a': TenantState(100, {}, 'TypeError: x', 1000.5, 3)})
+        store.close()
+        state = SQLiteStore(path).load(['a'])['a']
+        assert (state.error, state.error_sent, state.error_repeats) == (
+            'TypeError: x', 1000.5, 3,
+        )
+
+    def test_sqlite_writes_only_changed_states(self, tmp_path):
+        store = SQLiteStore(tmp_path / 'state.sqlite3')
+        states = {str(i): TenantState(i) for i in range(100)}
+        store.save(states)
+        changes = store.connection.total_changes
+        store.save(states)
+        assert store.connection.total_changes == changes
+        states['5'].timestamp = 500
+        store.save(states)
+        assert store.connection.total_changes == changes + 1
+        states['7'].statuses['hw'] = 'approved'
+        store.save(states)
+        assert store.connection.total_changes == changes + 3
+        states['7'].statuses['hw'] = 'rejected'
+        store.save(states)
+        assert store.connection.total_changes == changes + 5
+
+    def test_memory_store(self):
+        store = MemoryStore()
+        statuses = {'1': 'approved'}
+        store.save({'a': TenantState(1, statuses, 'error')})
+        statuses['1'] = 'rejected'
+        state = store.load(['a'])['a']
+        assert (state.timestamp, state.statuses, state.error) == (
+            1, {'1': 'approved'}, 'error',
+        )
+
+    def test_open_store(self, tmp_path):
+        assert isinstance(open_store('memory://'), MemoryStore)
+        store = open_store(f'sqlite:///{tmp_path}/state.sqlite3')
+        assert isinstance(store, SQLiteStore)
+        assert (tmp_path / 'state.sqlite3').exists()
+        assert isinstance(store, StateStore)
+        with pytest.raises(ValueError):
+            open_store('redis://localhost')
+
+    def test_states_restored_in_main_cycle(self, homework_module):
+        store = MemoryStore()
+        store.save({'known': TenantState(100, {'1': 'approved'})})
+        tenants = [
+            homework_module.make_tenant('token', 1, 'known'),
+            homework_module.make_tenant('token', 1, 'new'),
+        ]
+        states = homework_module.load_states(store, tenants)
+        assert states['known'].timestamp == 100
+        assert states['new'].timestamp > 100
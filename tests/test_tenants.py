@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+import utils
+from homework_bot.tenants import (
+    ChatMessage,
+    TenantState,
+    load_tenants,
+    make_tenant,
+    shared_chats,
+    tenant_chats,
+    tenant_id,
+)
+
+
+class TestTenants:
+
+    def test_load_tenants(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps({'tenants': [
+            {'token': 'token-1', 'chat_id': 1, 'name': 'ivanov'},
+            {'token': 'token-2', 'chat_id': '2', 'subscribers': [3, '2', 3]},
+        ]}))
+        first, second = load_tenants(path)
+        assert first == ('ivanov', 'token-1', '1', None, (), ())
+        assert second.id == tenant_id('token-2')
+        assert second.chat_id == '2'
+        assert second.subscribers == ('3',)
+
+    @pytest.mark.parametrize('data', [
+        {'tenants': [{'token': 'token-1'}]},
+        {'students': []},
+        {'tenants': [
+            {'token': 'token-1', 'chat_id': 1},
+            {'token': 'token-1', 'chat_id': 2},
+        ]},
+    ])
+    def test_load_invalid_tenants(self, tmp_path, data):
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps(data))
+        with pytest.raises(ValueError):
+            load_tenants(path)
+
+    def test_subscribers(self):
+        student = make_tenant('token-1', 1, subscribers=['mentor', 'cohort'])
+        other = make_tenant('token-2', 2, subscribers='mentor')
+        alone = make_tenant('token-3', 3)
+        assert tenant_chats(student) == ('1', 'mentor', 'cohort')
+        assert tenant_chats(alone) == ('3',)
+        assert shared_chats([student, other, alone]) == {'mentor'}
+
+    def test_tenant_id_hides_token(self):
+        tenant = make_tenant('secret-token', 1)
+        assert 'secret' not in tenant.id
+        assert tenant.id == make_tenant('secret-token', 2).id
+
+    def test_chat_message_is_str(self):
+        message = ChatMessage('text', '42')
+        assert message == 'text'
+        assert message.chat_id == '42'
+
+    def test_state_defaults(self):
+        state = TenantState()
+        assert (state.timestamp, state.statuses, state.error) == (0, {}, '')
+        assert TenantState().statuses is not state.statuses
+
+
+class TestPollTenants:
+
+    def test_each_tenant_notified_in_own_chat(self, monkeypatch,
+                                              homework_module):
+        tenants = [make_tenant('token-1', 1), make_tenant('token-2', 2)]
+        outbound = utils.MockOutboundQueue()
+
+        def mock_get_tenant_answer(tenant, state):
+            return {'homeworks': [
+                {'homework_name': tenant.token, 'status': 'approved'},
+            ]}
+
+        monkeypatch.setattr(
+            homework_module, 'get_tenant_answer', mock_get_tenant_answer,
+        )
+        for tenant in tenants:
+            homework_module.poll_tenant(outbound, tenant, TenantState())
+        sent = outbound.messages
+        assert [message.chat_id for message in sent] == ['1', '2']
+        assert 'token-2' in sent[1]
+
+    def test_change_rendered_once_for_all_subscribers(self, monkeypatch,
+                                                      homework_module):
+        tenant = make_tenant(
+            'token-1', 1, 'ivanov', subscribers=['mentor', 'cohort'],
+        )
+        rendered = []
+        render_status = homework_module.render_status
+
+        def counting_render_status(status_renderer, homework):
+            rendered.append(homework['homework_name'])
+            return render_status(status_renderer, homework)
+
+        monkeypatch.setattr(
+            homework_module, 'render_status', counting_render_status,
+        )
+        messages = homework_module.check_tenant(tenant, TenantState(), {
+            'homeworks': [
+                {'homework_name': 'hw1', 'status': 'approved'},
+                {'homework_name': 'hw2', 'status': 'rejected'},
+            ],
+        })
+        assert rendered == ['hw1', 'hw2']
+        assert [message.chat_id for message in messages] == [
+            '1', 'mentor', 'cohort', '1', 'mentor', 'cohort',
+        ]
+        assert len({message.key for message in messages}) == 6
+        assert messages[1] == f'{tenant.id}: {messages[0]}'
+
+    def test_cursor_follows_current_date(self, monkeypatch, homework_module):
+        tenant = make_tenant('token-1', 1)
+        state = TenantState(timestamp=100)
+        answers = iter([
+            {'homeworks': [], 'current_date': 200},
+            {'homeworks': [{'homework_name': 'hw', 'status': 'unknown'}],
+             'current_date': 300},
+            {'homeworks': [], 'current_date': 150},
+        ])
+        from_dates = []
+
+        def mock_get_tenant_answer(tenant, state):
+            from_dates.append(state.timestamp)
+            return next(answers)
+
+        monkeypatch.setattr(
+            homework_module, 'get_tenant_answer', mock_get_tenant_answer,
+        )
+        outbound = utils.MockOutboundQueue()
+        for _ in range(3):
+            homework_module.poll_tenant(outbound, tenant, state)
+        assert from_dates == [100, 200, 200]
+        assert state.timestamp == 200
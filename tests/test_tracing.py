@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import pytest
+import requests
+
+import utils
+from homework_bot.tenants import ChatMessage, TenantState, make_tenant
+from homework_bot.tracing import (
+    NOOP_SPAN,
+    JsonlExporter,
+    MemoryExporter,
+    Tracer,
+    open_exporter,
+)
+
+
+def answer(*args, **kwargs):
+    return utils.MockJSONResponse({
+        'homeworks': [{'homework_name': 'hw', 'status': 'approved'}],
+        'current_date': 1000,
+    })
+
+
+class TestTracer:
+
+    def test_sampling_decided_at_root(self):
+        exporter = MemoryExporter()
+        tracer = Tracer(exporter, 0.5, rng=lambda: 0.7)
+        with tracer.span('poll', root=True) as span:
+            assert span is NOOP_SPAN
+            assert tracer.span('check_response') is NOOP_SPAN
+        assert tracer.span('check_response') is NOOP_SPAN
+        sampled = Tracer(exporter, 0.5, rng=lambda: 0.2)
+        with sampled.span('poll', root=True):
+            pass
+        assert [record['name'] for record in exporter.records] == ['poll']
+
+    def test_children_inherit_trace_and_tenant(self):
+        exporter = MemoryExporter()
+        tracer = Tracer(exporter)
+        with tracer.span('poll', root=True, tenant='a') as root:
+            with tracer.span('get_api_answer') as child:
+                child.set(payload=10)
+        child_record, root_record = exporter.records
+        assert child_record['trace'] == root_record['trace']
+        assert child_record['parent'] == root.span_id
+        assert root_record['parent'] is None
+        assert child_record['tenant'] == 'a'
+        assert child_record['payload'] == 10
+        assert child_record['outcome'] == 'ok'
+        assert root_record['duration'] >= 0
+
+    def test_error_outcome(self):
+        exporter = MemoryExporter()
+        tracer = Tracer(exporter)
+        with pytest.raises(KeyError):
+            with tracer.span('poll', root=True):
+                raise KeyError('status')
+        with tracer.span('send_message', root=True) as span:
+            span.set(outcome='error', error='SendMessageError')
+        failed, reported = exporter.records
+        assert failed['outcome'] == 'error' and failed['error'] == 'KeyError'
+        assert reported['outcome'] == 'error'
+        assert reported['error'] == 'SendMessageError'
+
+    def test_jsonl_exporter(self, tmp_path):
+        path = tmp_path / 'traces.jsonl'
+        exporter = JsonlExporter(str(path), buffer_size=2)
+        tracer = Tracer(exporter)
+        for name in ('poll', 'send_message', 'poll'):
+            with tracer.span(name, root=True, tenant='a'):
+                pass
+        assert len(path.read_text().splitlines()) == 2
+        tracer.close()
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [record['name'] for record in records] == [
+            'poll', 'send_message', 'poll',
+        ]
+
+    def test_open_exporter(self, tmp_path):
+        path = tmp_path / 'traces.jsonl'
+        exporter = open_exporter(f'jsonl:///{path}')
+        assert isinstance(exporter, JsonlExporter)
+        exporter.close()
+        assert isinstance(open_exporter('memory://'), MemoryExporter)
+        with pytest.raises(ValueError):
+            open_exporter('zipkin://localhost')
+
+
+class TestPipelineTracing:
+
+    @pytest.fixture
+    def exporter(self, monkeypatch, homework_module):
+        exporter = MemoryExporter()
+        monkeypatch.setattr(homework_module, 'tracer', Tracer(exporter))
+        monkeypatch.setattr(requests, 'get', answer)
+        return exporter
+
+    def check_poll_trace(self, records, tenant):
+        by_name = {record['name']: record for record in records}
+        assert set(by_name) == {
+            'poll', 'get_api_answer', 'check_response', 'parse_status',
+        }
+        assert {record['trace'] for record in records} == {
+            by_name['poll']['trace'],
+        }
+        assert {record['tenant'] for record in records} == {tenant.id}
+        assert by_name['get_api_answer']['status'] == 200
+        assert by_name['get_api_answer']['payload'] > 0
+        assert by_name['check_response']['homeworks'] == 1
+        assert by_name['parse_status']['messages'] == 1
+        assert by_name['poll']['outcome'] == 'ok'
+
+    def test_poll_traced(self, homework_module, exporter):
+        tenant = make_tenant('token', 1)
+        outbound = utils.MockOutboundQueue()
+        homework_module.poll_tenant(outbound, tenant, TenantState())
+        assert len(outbound.messages) == 1
+        self.check_poll_trace(exporter.records, tenant)
+
+    def test_async_poll_traced(self, monkeypatch, homework_module, exporter):
+        tenant = make_tenant('token', 1)
+        outbound = utils.MockOutboundQueue()
+        monkeypatch.setattr(homework_module, 'POLL_CONCURRENCY', 2)
+        asyncio.run(homework_module.poll_tenant_async(
+            outbound, tenant, TenantState(),
+        ))
+        self.check_poll_trace(exporter.records, tenant)
+
+    def test_failed_poll_traced(self, monkeypatch, homework_module,
+                                exporter):
+        def mock_get(*args, **kwargs):
+            raise requests.ConnectionError('down')
+
+        monkeypatch.setattr(requests, 'get', mock_get)
+        homework_module.poll_tenant(
+            utils.MockOutboundQueue(), make_tenant('token', 1), TenantState(),
+        )
+        by_name = {record['name']: record for record in exporter.records}
+        assert by_name['get_api_answer']['outcome'] == 'error'
+        assert by_name['poll']['outcome'] == 'error'
+
+    def test_send_traced(self, homework_module, exporter):
+        message = ChatMessage('approved', 42, ('a', 42, 'hw', 'approved'))
+        homework_module.send_message(utils.MockTelegramBot(), message)
+        record, = exporter.records
+        assert record['name'] == 'send_message'
+        assert record['tenant'] == 'a'
+        assert record['chat'] == 42 and record['size'] == len('approved')
+
+    def test_tracing_off(self, homework_module):
+        assert homework_module.tracer is None
+        assert homework_module.trace('poll', root=True) is NOOP_SPAN
@@ -1,3 +1,4 @@
+import json
 import logging
 from collections import namedtuple
 from contextlib import contextmanager
@@ -91,6 +92,33 @@ class MockResponseGET:
         return data
 
 
+class MockJSONResponse:
+    def __init__(self, data, status_code=HTTPStatus.OK, headers=None):
+        self.content = json.dumps(data).encode()
+        self.status_code = status_code
+        self.reason = ''
+        self.text = self.content.decode()
+        self.headers = headers or {}
+        self.decoded = 0
+
+    def json(self):
+        self.decoded += 1
+        return json.loads(self.content)
+
+
+class MockAPISession:
+    def __init__(self, responses):
+        self.responses = iter(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        self.requests.append((dict(headers or {}), dict(params or {})))
+        response = next(self.responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
 class MockTelegramBot:
     def __init__(self, **kwargs):
         self._is_message_sent = False
@@ -103,3 +131,25 @@ class MockTelegramBot:
 
 class BreakInfiniteLoop(Exception):
     pass
+
+
+class FakeClock:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class MockOutboundQueue:
+    def __init__(self):
+        self.messages = []
+
+    def put(self, message, priority=0):
+        self.messages.append(message)